@@ -0,0 +1,400 @@
+import io
+import os
+import time
+import random
+import numpy as np
+import torch
+from dqn_agent import DQNAgent
+from dqn_network import export_policy, load_policy
+from evaluation import record_states, policy_agreement, policy_latency
+
+def fill_random_experience(agent, num_transitions=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(num_transitions):
+        state = rng.random(agent.state_size, dtype=np.float32)
+        next_state = rng.random(agent.state_size, dtype=np.float32)
+        action_idx = [int(rng.integers(0, 5)), int(rng.integers(0, 5))]
+        agent.remember(state, action_idx, float(rng.uniform(-5, 5)), next_state, bool(rng.random() < 0.01))
+
+def benchmark_learner(num_updates=500, state_size=24, warmup_updates=50, agent_kwargs=None, seed=0):
+    random.seed(seed)
+    torch.manual_seed(seed)
+
+    agent = DQNAgent(state_size, **(agent_kwargs or {}))
+    fill_random_experience(agent, seed=seed)
+
+    for _ in range(warmup_updates):
+        agent.replay()
+
+    start_steps = agent.training_steps
+    start_time = time.perf_counter()
+    while agent.training_steps - start_steps < num_updates:
+        agent.replay()
+    elapsed = time.perf_counter() - start_time
+
+    updates = agent.training_steps - start_steps
+    updates_per_sec = updates / elapsed
+    print(f"Learner: {updates_per_sec:.1f} updates/sec "
+          f"({elapsed / updates * 1000:.2f} ms/update, batch size {agent.batch_size}, "
+          f"{agent.updates_per_sample} updates per sample)")
+    return updates_per_sec
+
+def benchmark_target_update(num_updates=1000, state_size=24):
+    agent = DQNAgent(state_size)
+
+    start_time = time.perf_counter()
+    for _ in range(num_updates):
+        agent.update_target_network()
+    elapsed = time.perf_counter() - start_time
+
+    print(f"Soft target update: {elapsed / num_updates * 1e6:.1f} us/update")
+    return elapsed / num_updates
+
+def compare_learner_modes(num_updates=300, repeats=3):
+    modes = {
+        'soft update': {},
+        'hard update': {'target_update_interval': 1000},
+        'compiled': {'compile_network': True}
+    }
+    results = {}
+    for name, agent_kwargs in modes.items():
+        print(f"\n{name}:")
+        results[name] = max(benchmark_learner(num_updates, agent_kwargs=agent_kwargs)
+                            for _ in range(repeats))
+    return results
+
+PRECISION_MODES = {
+    'float32': {},
+    'bf16 autocast': {'mixed_precision': True},
+    'bf16 autocast + fp16 replay': {'mixed_precision': True, 'replay_state_dtype': np.float16}
+}
+
+def compare_precision_throughput(num_updates=300, repeats=3):
+    results = {}
+    for name, agent_kwargs in PRECISION_MODES.items():
+        print(f"\n{name}:")
+        results[name] = max(benchmark_learner(num_updates, agent_kwargs=agent_kwargs)
+                            for _ in range(repeats))
+        agent = DQNAgent(24, **agent_kwargs)
+        print(f"Replay observation storage: {agent.replay_storage.obs.nbytes / 1e6:.1f} MB")
+    return results
+
+N_STEP_MODES = {
+    '1-step': {'n_step': 1},
+    '3-step': {'n_step': 3},
+    '5-step': {'n_step': 5}
+}
+
+def compare_training_configs(modes, num_episodes=500, episodes_per_track=20, save_root='models/compare',
+                             target_success=0.5):
+    from training import train_multi_track
+    from evaluation import evaluate_model
+
+    results = {}
+    for name, agent_kwargs in modes.items():
+        print(f"\n=== Training with {name} ===")
+        save_dir = f"{save_root}/{name.replace(' ', '_').replace('+', 'and')}"
+        start_time = time.time()
+        train_multi_track(num_episodes=num_episodes, save_dir=save_dir, watch_mode="headless",
+                          agent_kwargs=agent_kwargs, keep_checkpoints=0)
+        train_time = time.time() - start_time
+
+        # Periodic checkpoints are written as training goes, so their mtimes
+        # give the wall-clock time at which each success rate was reached.
+        time_to_target = None
+        checkpoints = sorted((int(f[len('checkpoint_'):-len('.pt')]), f) for f in os.listdir(save_dir)
+                             if f.startswith('checkpoint_'))
+        for episode, filename in checkpoints:
+            path = f"{save_dir}/{filename}"
+            summary = evaluate_model(path, episodes_per_track=max(1, episodes_per_track // 4))
+            if summary and summary['all']['success_rate'] >= target_success:
+                time_to_target = os.path.getmtime(path) - start_time
+                break
+
+        summary = evaluate_model(f"{save_dir}/final_model.pt", episodes_per_track=episodes_per_track,
+                                 report_path=f"{save_dir}/evaluation.json")
+        results[name] = {'train_time': train_time, 'time_to_target': time_to_target, 'summary': summary}
+
+    print(f"\n{'Mode':<30}{'Train time':>12}{'To target':>12}{'Success':>10}{'Distance':>12}")
+    for name, result in results.items():
+        overall = result['summary']['all'] if result['summary'] else {'success_rate': 0, 'avg_distance': 0}
+        to_target = f"{result['time_to_target']:.0f}s" if result['time_to_target'] is not None else "-"
+        print(f"{name:<30}{result['train_time']:>11.0f}s{to_target:>12}"
+              f"{overall['success_rate'] * 100:>9.1f}%"
+              f"{overall['avg_distance']:>12.0f}")
+    return results
+
+def compare_precision_training(num_episodes=500, episodes_per_track=20, save_root='models/precision'):
+    return compare_training_configs(PRECISION_MODES, num_episodes, episodes_per_track, save_root)
+
+def compare_n_step(num_episodes=500, episodes_per_track=20, save_root='models/n_step', target_success=0.5):
+    return compare_training_configs(N_STEP_MODES, num_episodes, episodes_per_track, save_root, target_success)
+
+def serialized_size(network):
+    buffer = io.BytesIO()
+    torch.save(network.state_dict(), buffer)
+    return buffer.tell()
+
+def compare_quantized_policy(checkpoint_path='models/best_model.pt', output_path='models/policy_int8.pt',
+                             state_size=24, steps_per_track=500, seed=0):
+    if not os.path.exists(checkpoint_path):
+        print(f"Model file {checkpoint_path} not found")
+        return None
+
+    float_policy = load_policy(checkpoint_path, state_size)
+    export_policy(checkpoint_path, output_path, state_size)
+    int8_policy = load_policy(output_path)
+
+    states = record_states(float_policy, steps_per_track=steps_per_track, seed=seed)
+    agreement = policy_agreement(float_policy, int8_policy, states)
+    float_latency = policy_latency(float_policy, states)
+    int8_latency = policy_latency(int8_policy, states)
+
+    results = {
+        'states': len(states),
+        'agreement': agreement,
+        'float_latency': float_latency,
+        'int8_latency': int8_latency,
+        'checkpoint_bytes': os.path.getsize(checkpoint_path),
+        'float_bytes': serialized_size(float_policy),
+        'int8_bytes': os.path.getsize(output_path)
+    }
+
+    print(f"\nArgmax agreement on {len(states)} recorded states: "
+          f"steer {agreement['steer'] * 100:.2f}%, accel {agreement['accel'] * 100:.2f}%, "
+          f"both {agreement['both'] * 100:.2f}%")
+    print(f"Latency per act(): float32 {float_latency * 1e6:.0f} us, int8 {int8_latency * 1e6:.0f} us")
+    print(f"Size: training checkpoint {results['checkpoint_bytes'] / 1e6:.2f} MB, "
+          f"float32 policy {results['float_bytes'] / 1e6:.2f} MB, "
+          f"int8 policy {results['int8_bytes'] / 1e6:.2f} MB")
+    return results
+
+def sample_track_poses(track, num_poses=50, seed=0):
+    rng = random.Random(seed)
+    step = max(1, len(track.centerline) // num_poses)
+    return [(x, y, rng.uniform(0, 360)) for x, y in track.centerline[::step]]
+
+def time_sensor_casts(car, track, poses):
+    start_time = time.perf_counter()
+    for x, y, angle in poses:
+        car.x, car.y, car.angle = x, y, angle
+        car.cast_sensors(track)
+    return (time.perf_counter() - start_time) / len(poses)
+
+def compare_sensor_models(ray_counts=(15, 64, 180, 360), fov=180.0, sensor_range=200, loop_max_rays=64,
+                          track_type=None, seed=0):
+    from constants import TrackType
+    from car import Car
+    from track import Track
+
+    track = Track(track_type or TrackType.DOUBLE_LOOP, track_width=140)
+    poses = sample_track_poses(track, seed=seed)
+
+    results = []
+    print(f"{'Rays':>6}{'Python loop':>14}{'Incremental':>14}{'Vectorized':>14}")
+    for num_rays in ray_counts:
+        timings = {}
+        for mode in ('loop', 'incremental', 'vectorized'):
+            # The per-ray loops get too slow to be worth timing at high counts.
+            if mode != 'vectorized' and num_rays > loop_max_rays:
+                continue
+            car = Car(0, 0)
+            car.configure_sensors({'num_rays': num_rays, 'fov': fov, 'range': sensor_range,
+                                   'vectorized': mode == 'vectorized'})
+            car.incremental_sensing = mode == 'incremental'
+            timings[mode] = time_sensor_casts(car, track, poses)
+        results.append({'num_rays': num_rays, **timings})
+        print(f"{num_rays:>6}" + "".join(f"{timings[m] * 1000:>12.2f}ms" if m in timings else f"{'-':>14}"
+                                         for m in ('loop', 'incremental', 'vectorized')))
+    return results
+
+def compare_observation_throughput(batch_sizes=(1, 16, 64, 256), num_batches=20, track_types=None, seed=0):
+    from constants import TrackType
+    from environment import GameEnvironment, batch_occupancy
+
+    if track_types is None:
+        track_types = [TrackType.OVAL, TrackType.U_TRACK, TrackType.L_TRACK, TrackType.RECTANGLE]
+    random.seed(seed)
+    envs = {}
+    for mode in ('incremental', 'vectorized'):
+        envs[mode] = []
+        for track_type in track_types:
+            env = GameEnvironment([track_type], incremental_sensing=mode == 'incremental',
+                                  sensor_config={'vectorized': True} if mode == 'vectorized' else None)
+            env.reset(random_track=False)
+            env.get_occupancy()
+            envs[mode].append(env)
+
+    results = []
+    print(f"{'Cars':>6}{'Rays (incr.)':>16}{'Rays (vec.)':>16}{'Occupancy':>16}")
+    for batch_size in batch_sizes:
+        timings = {}
+        for mode in ('incremental', 'vectorized'):
+            group = [envs[mode][i % len(track_types)] for i in range(batch_size)]
+            start_time = time.perf_counter()
+            for _ in range(num_batches):
+                for env in group:
+                    env.car.cast_sensors(env.track)
+                    env.get_frame()
+            timings[mode] = (time.perf_counter() - start_time) / (num_batches * batch_size)
+
+        group = [envs['vectorized'][i % len(track_types)] for i in range(batch_size)]
+        start_time = time.perf_counter()
+        for _ in range(num_batches):
+            batch_occupancy(group)
+        timings['occupancy'] = (time.perf_counter() - start_time) / (num_batches * batch_size)
+
+        results.append({'batch_size': batch_size, **timings})
+        print(f"{batch_size:>6}" + "".join(f"{timings[m] * 1e6:>14.0f}us"
+                                           for m in ('incremental', 'vectorized', 'occupancy')))
+    return results
+
+def check_occupancy_masks(track_types=None, seed=0):
+    # Every centerline point and every collision-free spawn pose has to be
+    # drivable in the raster the occupancy crops are cut from.
+    from constants import TrackType
+    from track import Track
+    from car import Car
+
+    if track_types is None:
+        track_types = list(TrackType)
+    results = []
+    print(f"{'Track':>14}{'Centerline walls':>18}{'Spawn walls':>14}")
+    for track_type in track_types:
+        track = Track(track_type, track_width=140, seed=seed)
+        mask = track.get_occupancy_mask()
+        def drivable(x, y):
+            return bool(mask[min(max(int(y), 0), mask.shape[0] - 1), min(max(int(x), 0), mask.shape[1] - 1)])
+        centerline_walls = sum(not drivable(x, y) for x, y in track.centerline)
+        probe = Car(0, 0)
+        spawns = 0
+        spawn_walls = 0
+        for x, y, angle, _ in track.get_spawn_poses():
+            probe.reset(float(x), float(y), float(angle))
+            if track.check_collision(probe.get_corners()):
+                continue
+            spawns += 1
+            spawn_walls += not drivable(x, y)
+        results.append({'track': track_type.value, 'centerline_walls': centerline_walls,
+                        'centerline_points': len(track.centerline), 'spawn_walls': spawn_walls, 'spawns': spawns})
+        print(f"{track_type.value:>14}{centerline_walls:>11} / {len(track.centerline):<4}"
+              f"{spawn_walls:>7} / {spawns:<4}")
+    return results
+
+def compare_multi_car_scaling(car_counts=(1, 8, 16, 32, 44), num_steps=20, track_type=None, seed=0):
+    from constants import TrackType
+    from multi_car import MultiCarEnvironment
+
+    results = []
+    print(f"{'Cars':>6}{'Spatial hash':>16}{'All pairs':>16}")
+    for num_cars in car_counts:
+        timings = {}
+        for use_spatial_hash in (True, False):
+            random.seed(seed)
+            env = MultiCarEnvironment(num_cars, [track_type or TrackType.RECTANGLE],
+                                      sensor_config={'vectorized': True}, use_spatial_hash=use_spatial_hash)
+            env.render_mode = "headless"
+            env.reset()
+            # Only the car-car phase is timed, at the spawn positions so both
+            # variants see every car each step; wall sensing is the same for both.
+            active = list(range(num_cars))
+            start_time = time.perf_counter()
+            for _ in range(num_steps):
+                env.interact_cars(active)
+            timings['hash' if use_spatial_hash else 'all_pairs'] = \
+                (time.perf_counter() - start_time) / (num_steps * num_cars)
+        results.append({'num_cars': num_cars, **timings})
+        print(f"{num_cars:>6}{timings['hash'] * 1e6:>14.0f}us{timings['all_pairs'] * 1e6:>14.0f}us")
+    return results
+
+def time_collision_checks(car, track, poses):
+    start_time = time.perf_counter()
+    for x, y, angle in poses:
+        car.x, car.y, car.angle = x, y, angle
+        track.check_collision(car.get_corners())
+    return (time.perf_counter() - start_time) / len(poses)
+
+def compare_track_simplification(max_error=None, track_types=None, seed=0):
+    from constants import TrackType, TRACK_MAX_ERROR
+    from car import Car
+    from track import Track
+
+    if max_error is None:
+        max_error = TRACK_MAX_ERROR
+    if track_types is None:
+        track_types = [track_type for track_type in TrackType]
+
+    results = []
+    print(f"{'Track':>14}{'Segments':>14}{'Max dev':>10}{'Collision':>12}{'Rays':>10}{'Incr. rays':>12}")
+    for track_type in track_types:
+        raw = Track(track_type, track_width=140, seed=seed, max_error=None)
+        simplified = Track(track_type, track_width=140, seed=seed, max_error=max_error)
+        poses = sample_track_poses(raw, seed=seed)
+
+        timings = {}
+        for name, track in (('raw', raw), ('simplified', simplified)):
+            car = Car(0, 0)
+            timings[name] = {'collision': time_collision_checks(car, track, poses),
+                             'rays': time_sensor_casts(car, track, poses)}
+            car = Car(0, 0)
+            car.incremental_sensing = True
+            timings[name]['incremental'] = time_sensor_casts(car, track, poses)
+        speedups = {key: timings['raw'][key] / timings['simplified'][key] for key in timings['raw']}
+
+        report = simplified.simplification
+        results.append({'track': track_type.value, **report, 'speedup': speedups})
+        print(f"{track_type.value:>14}{report['segments_before']:>7} -> {report['segments_after']:<4}"
+              f"{report['max_deviation']:>8.2f}px"
+              f"{speedups['collision']:>11.1f}x{speedups['rays']:>9.1f}x{speedups['incremental']:>11.1f}x")
+    return results
+
+def compare_analytic_tracks(track_types=None, seed=0):
+    from track import Track, ANALYTIC_TRACK_TYPES
+    from car import Car
+
+    if track_types is None:
+        track_types = ANALYTIC_TRACK_TYPES
+
+    results = []
+    print(f"{'Track':>12}{'Pieces':>14}{'Collision':>20}{'Rays (vec.)':>20}{'Rays (incr.)':>14}{'Max diff':>10}")
+    for track_type in track_types:
+        analytic = Track(track_type, track_width=140, seed=seed, analytic=True)
+        # The same track with the pieces dropped, so the polyline paths run
+        # on their tessellation.
+        tessellated = Track(track_type, track_width=140, seed=seed, analytic=True)
+        tessellated.boundary_primitives = None
+        tessellated.primitive_arrays = None
+        poses = sample_track_poses(analytic, seed=seed)
+
+        car = Car(0, 0)
+        timings = {'collision': time_collision_checks(car, tessellated, poses),
+                   'analytic_collision': time_collision_checks(car, analytic, poses),
+                   'analytic': time_sensor_casts(car, analytic, poses)}
+        car.vectorized_sensing = True
+        timings['vectorized'] = time_sensor_casts(car, tessellated, poses)
+        car = Car(0, 0)
+        car.incremental_sensing = True
+        timings['incremental'] = time_sensor_casts(car, tessellated, poses)
+
+        exact_car = Car(0, 0)
+        polyline_car = Car(0, 0)
+        polyline_car.vectorized_sensing = True
+        max_diff = 0.0
+        for x, y, angle in poses:
+            for car, track in ((exact_car, analytic), (polyline_car, tessellated)):
+                car.x, car.y, car.angle = x, y, angle
+                car.cast_sensors(track)
+            diff = np.abs(np.array(exact_car.sensor_readings) - polyline_car.sensor_readings).max()
+            max_diff = max(max_diff, float(diff) * exact_car.sensor_length)
+
+        num_segments = len(tessellated.inner_points) + len(tessellated.outer_points)
+        results.append({'track': track_type.value, 'primitives': len(analytic.boundary_primitives),
+                        'segments': num_segments, 'max_reading_diff': max_diff, **timings})
+        print(f"{track_type.value:>12}{len(analytic.boundary_primitives):>6} vs {num_segments:<4}"
+              f"{timings['collision'] * 1e6:>9.0f} -> {timings['analytic_collision'] * 1e6:<4.0f}us"
+              f"{timings['vectorized'] * 1e6:>9.0f} -> {timings['analytic'] * 1e6:<4.0f}us"
+              f"{timings['incremental'] * 1e6:>12.0f}us{max_diff:>8.2f}px")
+    return results
+
+if __name__ == "__main__":
+    benchmark_learner()
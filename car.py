@@ -1,241 +1,472 @@
-import pygame
-import math
-from collections import deque
-from constants import *
-from utils import line_intersection
-
-class Car:
-    def __init__(self, x, y, angle=0):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = 0
-        self.max_speed = 7.0
-        self.min_speed = -2.0
-        self.acceleration = 0.3
-        self.brake_deceleration = 0.5
-        self.rotation_speed = 4.0
-        self.friction = 0.1
-        self.direction = pygame.Vector2(0, -1)
-        self.velocity = pygame.Vector2(0, 0)
-        self.orig_image = pygame.Surface(CAR_SIZE, pygame.SRCALPHA)
-        pygame.draw.rect(self.orig_image, RED, (0, 0, CAR_SIZE[0], CAR_SIZE[1]))
-        pygame.draw.rect(self.orig_image, BLACK, (0, 0, CAR_SIZE[0], CAR_SIZE[1]), 2)
-        pygame.draw.rect(self.orig_image, WHITE, (5, 0, 10, 8))
-        self.image = self.orig_image
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        self.collided = False
-        self.sensor_angles = [-90, -75, -60, -45, -30, -20, -10, 0, 10, 20, 30, 45, 60, 75, 90]
-        self.sensor_length = 120
-        self.sensor_readings = [0] * len(self.sensor_angles)
-        self.distance_traveled = 0
-        self.time_alive = 0
-        self.last_position = (x, y)
-        self.stuck_counter = 0
-        self.avg_speed = 0
-        self.speed_samples = deque(maxlen=30)
-        
-        self.lap_times = []
-        self.best_lap_time = float('inf')
-        self.current_lap_time = 0
-        self.lap_start_time = 0
-        self.max_distance_this_session = 0
-        
-        self.prev_velocity = pygame.Vector2(0, 0)
-        self.acceleration_vector = pygame.Vector2(0, 0)
-        self.angular_velocity = 0
-        self.prev_angle = angle
-        self.g_force = 0
-        self.turning_radius = float('inf')
-        self.distance_from_center = 0
-        
-    def get_corners(self):
-        cos_val = math.cos(math.radians(self.angle))
-        sin_val = math.sin(math.radians(self.angle))
-        half_width = CAR_SIZE[0] / 2
-        half_height = CAR_SIZE[1] / 2
-        corners_local = [
-            (-half_width, -half_height),
-            (half_width, -half_height),
-            (half_width, half_height),
-            (-half_width, half_height)
-        ]
-        
-        corners_world = []
-        for corner_x, corner_y in corners_local:
-            rotated_x = corner_x * cos_val - corner_y * sin_val
-            rotated_y = corner_x * sin_val + corner_y * cos_val
-            world_x = rotated_x + self.x
-            world_y = rotated_y + self.y
-            corners_world.append((world_x, world_y))
-            
-        return corners_world
-        
-    def update(self, action=None, keys_pressed=None):
-        self.direction = pygame.Vector2(
-            math.sin(math.radians(self.angle)),
-            -math.cos(math.radians(self.angle))
-        )
-        
-        if action is not None:
-            steer = action.get('steer', 0)
-            accelerate = action.get('accelerate', 0)
-            
-            if accelerate > 0:
-                self.speed += self.acceleration * accelerate
-            else:
-                self.speed += self.brake_deceleration * accelerate
-            
-            if abs(self.speed) > 0.5:
-                steer_effectiveness = 1.0 - min(0.5, abs(self.speed) / 10.0)
-                self.angle += self.rotation_speed * steer * steer_effectiveness
-        
-        elif keys_pressed is not None:
-            if keys_pressed[pygame.K_UP] or keys_pressed[pygame.K_w]:
-                self.speed += self.acceleration
-            if keys_pressed[pygame.K_DOWN] or keys_pressed[pygame.K_s]:
-                self.speed -= self.brake_deceleration
-                
-            if abs(self.speed) > 0.5:
-                if keys_pressed[pygame.K_LEFT] or keys_pressed[pygame.K_a]:
-                    self.angle -= self.rotation_speed
-                if keys_pressed[pygame.K_RIGHT] or keys_pressed[pygame.K_d]:
-                    self.angle += self.rotation_speed
-        
-        if self.speed > 0:
-            self.speed = max(0, self.speed - self.friction)
-        elif self.speed < 0:
-            self.speed = min(0, self.speed + self.friction)
-            
-        self.speed = max(self.min_speed, min(self.max_speed, self.speed))
-        
-        movement = self.direction * self.speed
-        self.velocity = movement
-        
-        prev_pos = (self.x, self.y)
-        self.x += self.velocity.x
-        self.y += self.velocity.y
-        
-        dist = math.sqrt((self.x - prev_pos[0])**2 + (self.y - prev_pos[1])**2)
-        self.distance_traveled += dist
-        self.max_distance_this_session = max(self.max_distance_this_session, self.distance_traveled)
-        
-        self.acceleration_vector = self.velocity - self.prev_velocity
-        self.prev_velocity = self.velocity.copy()
-        
-        angle_diff = self.angle - self.prev_angle
-        
-        if angle_diff > 180:
-            angle_diff -= 360
-        elif angle_diff < -180:
-            angle_diff += 360
-        self.angular_velocity = angle_diff
-        self.prev_angle = self.angle
-        
-        self.g_force = self.acceleration_vector.magnitude()
-        
-        if abs(self.angular_velocity) > 0.1 and abs(self.speed) > 0.1:
-            angular_vel_rad = math.radians(abs(self.angular_velocity))
-            self.turning_radius = abs(self.speed) / angular_vel_rad
-        else:
-            self.turning_radius = float('inf')
-        
-        self.speed_samples.append(abs(self.speed))
-        self.avg_speed = sum(self.speed_samples) / len(self.speed_samples) if self.speed_samples else 0
-        
-        if dist < 0.1 and abs(self.speed) < 0.5:
-            self.stuck_counter += 1
-        else:
-            self.stuck_counter = max(0, self.stuck_counter - 2)
-            
-        self.last_position = (self.x, self.y)
-        self.time_alive += 1
-        self.current_lap_time += 1
-        
-        self.image = pygame.transform.rotate(self.orig_image, -self.angle)
-        self.rect = self.image.get_rect(center=(self.x, self.y))
-        
-    def cast_sensors(self, track):
-        sensor_lines = []
-        self.sensor_readings = []
-        
-        for angle_offset in self.sensor_angles:
-            sensor_angle = self.angle + angle_offset
-            rad_angle = math.radians(sensor_angle)
-            
-            end_x = self.x + self.sensor_length * math.sin(rad_angle)
-            end_y = self.y - self.sensor_length * math.cos(rad_angle)
-            
-            sensor_line = [(self.x, self.y), (end_x, end_y)]
-            sensor_lines.append(sensor_line)
-            
-            min_distance = self.sensor_length
-            
-            for i in range(len(track.inner_points)):
-                inner_segment = [
-                    track.inner_points[i],
-                    track.inner_points[(i + 1) % len(track.inner_points)]
-                ]
-                outer_segment = [
-                    track.outer_points[i],
-                    track.outer_points[(i + 1) % len(track.outer_points)]
-                ]
-                
-                for segment in [inner_segment, outer_segment]:
-                    intersection = line_intersection(sensor_line, segment)
-                    if intersection:
-                        distance = math.sqrt((intersection[0] - self.x)**2 + 
-                                           (intersection[1] - self.y)**2)
-                        min_distance = min(min_distance, distance)
-            
-            normalized_reading = min_distance / self.sensor_length
-            self.sensor_readings.append(normalized_reading)
-        
-        if track.centerline:
-            min_center_dist = float('inf')
-            for center_point in track.centerline:
-                dist_to_center = math.sqrt((self.x - center_point[0])**2 + (self.y - center_point[1])**2)
-                min_center_dist = min(min_center_dist, dist_to_center)
-            self.distance_from_center = min_center_dist
-            
-        return sensor_lines
-        
-    def draw(self, surface, sensor_lines=None, show_sensors=True):
-        surface.blit(self.image, self.rect)
-        
-        if sensor_lines and show_sensors:
-            for i, line in enumerate(sensor_lines):
-                reading = self.sensor_readings[i]
-                if reading < 0.3:
-                    color = RED
-                elif reading < 0.6:
-                    color = YELLOW
-                else:
-                    color = GREEN
-                    
-                if i % 3 == 0 or show_sensors: 
-                    pygame.draw.line(surface, color, line[0], line[1], 1)
-                
-    def reset(self, x, y, angle):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = 0
-        self.velocity = pygame.Vector2(0, 0)
-        self.collided = False
-        self.distance_traveled = 0
-        self.time_alive = 0
-        self.stuck_counter = 0
-        self.last_position = (x, y)
-        self.avg_speed = 0
-        self.speed_samples.clear()
-        self.current_lap_time = 0
-        self.lap_start_time = pygame.time.get_ticks()
-        
-        self.prev_velocity = pygame.Vector2(0, 0)
-        self.acceleration_vector = pygame.Vector2(0, 0)
-        self.angular_velocity = 0
-        self.prev_angle = angle
-        self.g_force = 0
-        self.turning_radius = float('inf')
+import pygame
+import math
+import numpy as np
+from collections import deque
+from constants import *
+from utils import line_intersection, point_segment_distance, ray_segment_fractions
+from sensors import sensor_angles, sensor_range
+from primitives import nearest_hits
+
+class Car:
+    def __init__(self, x, y, angle=0):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.speed = 0
+        self.max_speed = 7.0
+        self.min_speed = -2.0
+        self.acceleration = 0.3
+        self.brake_deceleration = 0.5
+        self.rotation_speed = 4.0
+        self.friction = 0.1
+        self.direction = pygame.Vector2(0, -1)
+        self.velocity = pygame.Vector2(0, 0)
+        self.orig_image = pygame.Surface(CAR_SIZE, pygame.SRCALPHA)
+        pygame.draw.rect(self.orig_image, RED, (0, 0, CAR_SIZE[0], CAR_SIZE[1]))
+        pygame.draw.rect(self.orig_image, BLACK, (0, 0, CAR_SIZE[0], CAR_SIZE[1]), 2)
+        pygame.draw.rect(self.orig_image, WHITE, (5, 0, 10, 8))
+        self.image = self.orig_image
+        self.rect = self.image.get_rect(center=(self.x, self.y))
+        self.collided = False
+        self.incremental_sensing = False
+        self.vectorized_sensing = False
+        self.sensor_window = 3
+        self.sensor_cache_slack = 20.0
+        self.configure_sensors()
+        self.distance_traveled = 0
+        self.time_alive = 0
+        self.last_position = (x, y)
+        self.stuck_counter = 0
+        self.avg_speed = 0
+        self.speed_samples = deque(maxlen=30)
+        
+        self.lap_times = []
+        self.best_lap_time = float('inf')
+        self.current_lap_time = 0
+        self.lap_start_time = 0
+        self.max_distance_this_session = 0
+        
+        self.prev_velocity = pygame.Vector2(0, 0)
+        self.acceleration_vector = pygame.Vector2(0, 0)
+        self.angular_velocity = 0
+        self.prev_angle = angle
+        self.g_force = 0
+        self.turning_radius = float('inf')
+        self.distance_from_center = 0
+        
+    def get_corners(self):
+        cos_val = math.cos(math.radians(self.angle))
+        sin_val = math.sin(math.radians(self.angle))
+        half_width = CAR_SIZE[0] / 2
+        half_height = CAR_SIZE[1] / 2
+        corners_local = [
+            (-half_width, -half_height),
+            (half_width, -half_height),
+            (half_width, half_height),
+            (-half_width, half_height)
+        ]
+        
+        corners_world = []
+        for corner_x, corner_y in corners_local:
+            rotated_x = corner_x * cos_val - corner_y * sin_val
+            rotated_y = corner_x * sin_val + corner_y * cos_val
+            world_x = rotated_x + self.x
+            world_y = rotated_y + self.y
+            corners_world.append((world_x, world_y))
+            
+        return corners_world
+        
+    def update(self, action=None, keys_pressed=None):
+        self.direction = pygame.Vector2(
+            math.sin(math.radians(self.angle)),
+            -math.cos(math.radians(self.angle))
+        )
+        
+        if action is not None:
+            steer = action.get('steer', 0)
+            accelerate = action.get('accelerate', 0)
+            
+            if accelerate > 0:
+                self.speed += self.acceleration * accelerate
+            else:
+                self.speed += self.brake_deceleration * accelerate
+            
+            if abs(self.speed) > 0.5:
+                steer_effectiveness = 1.0 - min(0.5, abs(self.speed) / 10.0)
+                self.angle += self.rotation_speed * steer * steer_effectiveness
+        
+        elif keys_pressed is not None:
+            if keys_pressed[pygame.K_UP] or keys_pressed[pygame.K_w]:
+                self.speed += self.acceleration
+            if keys_pressed[pygame.K_DOWN] or keys_pressed[pygame.K_s]:
+                self.speed -= self.brake_deceleration
+                
+            if abs(self.speed) > 0.5:
+                if keys_pressed[pygame.K_LEFT] or keys_pressed[pygame.K_a]:
+                    self.angle -= self.rotation_speed
+                if keys_pressed[pygame.K_RIGHT] or keys_pressed[pygame.K_d]:
+                    self.angle += self.rotation_speed
+        
+        if self.speed > 0:
+            self.speed = max(0, self.speed - self.friction)
+        elif self.speed < 0:
+            self.speed = min(0, self.speed + self.friction)
+            
+        self.speed = max(self.min_speed, min(self.max_speed, self.speed))
+        
+        movement = self.direction * self.speed
+        self.velocity = movement
+        
+        prev_pos = (self.x, self.y)
+        self.x += self.velocity.x
+        self.y += self.velocity.y
+        
+        dist = math.sqrt((self.x - prev_pos[0])**2 + (self.y - prev_pos[1])**2)
+        self.distance_traveled += dist
+        self.max_distance_this_session = max(self.max_distance_this_session, self.distance_traveled)
+        
+        self.acceleration_vector = self.velocity - self.prev_velocity
+        self.prev_velocity = self.velocity.copy()
+        
+        angle_diff = self.angle - self.prev_angle
+        
+        if angle_diff > 180:
+            angle_diff -= 360
+        elif angle_diff < -180:
+            angle_diff += 360
+        self.angular_velocity = angle_diff
+        self.prev_angle = self.angle
+        
+        self.g_force = self.acceleration_vector.magnitude()
+        
+        if abs(self.angular_velocity) > 0.1 and abs(self.speed) > 0.1:
+            angular_vel_rad = math.radians(abs(self.angular_velocity))
+            self.turning_radius = abs(self.speed) / angular_vel_rad
+        else:
+            self.turning_radius = float('inf')
+        
+        self.speed_samples.append(abs(self.speed))
+        self.avg_speed = sum(self.speed_samples) / len(self.speed_samples) if self.speed_samples else 0
+        
+        if dist < 0.1 and abs(self.speed) < 0.5:
+            self.stuck_counter += 1
+        else:
+            self.stuck_counter = max(0, self.stuck_counter - 2)
+            
+        self.last_position = (self.x, self.y)
+        self.time_alive += 1
+        self.current_lap_time += 1
+        
+        self.image = pygame.transform.rotate(self.orig_image, -self.angle)
+        self.rect = self.image.get_rect(center=(self.x, self.y))
+        
+    def configure_sensors(self, sensor_config=None):
+        self.sensor_angles = sensor_angles(sensor_config)
+        self.sensor_length = sensor_range(sensor_config)
+        self.sensor_readings = [0] * len(self.sensor_angles)
+        self.sensor_cache = None
+        if sensor_config:
+            self.vectorized_sensing = sensor_config.get('vectorized', True)
+        self.sensor_offsets = np.radians(np.asarray(self.sensor_angles, dtype=np.float64))
+        
+    def cast_sensors(self, track):
+        if track.boundary_primitives is not None:
+            return self.cast_sensors_analytic(track)
+        if self.vectorized_sensing:
+            return self.cast_sensors_vectorized(track)
+        if self.incremental_sensing:
+            return self.cast_sensors_incremental(track)
+            
+        sensor_lines = []
+        self.sensor_readings = []
+        
+        for angle_offset in self.sensor_angles:
+            sensor_angle = self.angle + angle_offset
+            rad_angle = math.radians(sensor_angle)
+            
+            end_x = self.x + self.sensor_length * math.sin(rad_angle)
+            end_y = self.y - self.sensor_length * math.cos(rad_angle)
+            
+            sensor_line = [(self.x, self.y), (end_x, end_y)]
+            sensor_lines.append(sensor_line)
+            
+            min_distance = self.sensor_length
+            
+            for points in (track.inner_points, track.outer_points):
+                for i in range(len(points)):
+                    segment = [points[i], points[(i + 1) % len(points)]]
+                    intersection = line_intersection(sensor_line, segment)
+                    if intersection:
+                        distance = math.sqrt((intersection[0] - self.x)**2 + 
+                                           (intersection[1] - self.y)**2)
+                        min_distance = min(min_distance, distance)
+            
+            normalized_reading = min_distance / self.sensor_length
+            self.sensor_readings.append(normalized_reading)
+        
+        self.update_center_distance(track)
+            
+        return sensor_lines
+        
+    def build_sensor_cache(self, track):
+        boundaries = (track.inner_points, track.outer_points)
+        search_radius = self.sensor_length + self.sensor_cache_slack
+        
+        near_segments = []
+        for boundary_idx, points in enumerate(boundaries):
+            for i in range(len(points)):
+                distance = point_segment_distance((self.x, self.y), points[i], points[(i + 1) % len(points)])
+                if distance <= search_radius:
+                    near_segments.append((distance, boundary_idx, i))
+        near_segments.sort()
+        
+        self.sensor_cache = {
+            'track': track,
+            'anchor': (self.x, self.y),
+            'boundaries': boundaries,
+            'near_segments': near_segments,
+            'last_hits': [None] * len(self.sensor_angles)
+        }
+        return self.sensor_cache
+        
+    def cast_sensors_incremental(self, track):
+        cache = self.sensor_cache
+        if cache is None or cache['track'] is not track or len(cache['last_hits']) != len(self.sensor_angles):
+            cache = self.build_sensor_cache(track)
+            
+        drift = math.sqrt((self.x - cache['anchor'][0])**2 + (self.y - cache['anchor'][1])**2)
+        if drift > self.sensor_cache_slack:
+            cache = self.build_sensor_cache(track)
+            drift = 0.0
+            
+        boundaries = cache['boundaries']
+        near_segments = cache['near_segments']
+        last_hits = cache['last_hits']
+        
+        sensor_lines = []
+        self.sensor_readings = []
+        
+        for ray_idx, angle_offset in enumerate(self.sensor_angles):
+            sensor_angle = self.angle + angle_offset
+            rad_angle = math.radians(sensor_angle)
+            
+            end_x = self.x + self.sensor_length * math.sin(rad_angle)
+            end_y = self.y - self.sensor_length * math.cos(rad_angle)
+            
+            sensor_line = [(self.x, self.y), (end_x, end_y)]
+            sensor_lines.append(sensor_line)
+            
+            min_distance = self.sensor_length
+            hit = None
+            
+            # Segments around last step's hit usually give a tight bound right away.
+            if last_hits[ray_idx] is not None:
+                boundary_idx, hit_idx = last_hits[ray_idx]
+                points = boundaries[boundary_idx]
+                for i in range(hit_idx - self.sensor_window, hit_idx + self.sensor_window + 1):
+                    i %= len(points)
+                    segment = [points[i], points[(i + 1) % len(points)]]
+                    intersection = line_intersection(sensor_line, segment)
+                    if intersection:
+                        distance = math.sqrt((intersection[0] - self.x)**2 + 
+                                           (intersection[1] - self.y)**2)
+                        if distance < min_distance:
+                            min_distance = distance
+                            hit = (boundary_idx, i)
+                            
+            # Any segment the ray can still hit closer is no further than
+            # min_distance from the car, which bounds its distance to the anchor.
+            for anchor_distance, boundary_idx, i in near_segments:
+                if anchor_distance - drift >= min_distance:
+                    break
+                points = boundaries[boundary_idx]
+                segment = [points[i], points[(i + 1) % len(points)]]
+                intersection = line_intersection(sensor_line, segment)
+                if intersection:
+                    distance = math.sqrt((intersection[0] - self.x)**2 + 
+                                       (intersection[1] - self.y)**2)
+                    if distance < min_distance:
+                        min_distance = distance
+                        hit = (boundary_idx, i)
+                        
+            last_hits[ray_idx] = hit
+            
+            normalized_reading = min_distance / self.sensor_length
+            self.sensor_readings.append(normalized_reading)
+            
+        self.update_center_distance(track)
+        
+        return sensor_lines
+        
+    def cast_sensors_vectorized(self, track):
+        offsets = self.sensor_offsets
+        heading = math.radians(self.angle)
+        
+        # Only segments whose bounding box reaches the sensor range can be hit.
+        segments, lows, highs = track.get_boundary_segments()
+        reach = self.sensor_length
+        near = ((lows[:, 0] <= self.x + reach) & (highs[:, 0] >= self.x - reach) &
+                (lows[:, 1] <= self.y + reach) & (highs[:, 1] >= self.y - reach))
+        x3, y3, x4, y4 = segments[near].T
+        
+        # Each segment can only be hit by the rays inside the angle it spans
+        # as seen from the car, so only those (ray, segment) pairs are tested.
+        # Far segments span few rays, which keeps the work well below
+        # rays x segments as the ray count grows.
+        start_angle = np.arctan2(x3 - self.x, self.y - y3) - heading
+        end_angle = np.arctan2(x4 - self.x, self.y - y4) - heading
+        span = (end_angle - start_angle + math.pi) % (2 * math.pi) - math.pi
+        low = (np.minimum(start_angle, start_angle + span) + math.pi) % (2 * math.pi) - math.pi
+        high = low + np.abs(span)
+        pad = 1e-9
+        starts = []
+        counts = []
+        for shift in (-2 * math.pi, 0.0, 2 * math.pi):
+            first = np.searchsorted(offsets, low + shift - pad, side='left')
+            last = np.searchsorted(offsets, high + shift + pad, side='right')
+            starts.append(first)
+            counts.append(np.maximum(last - first, 0))
+        starts = np.concatenate(starts)
+        counts = np.concatenate(counts)
+        pair_seg = np.repeat(np.tile(np.arange(len(x3)), 3), counts)
+        pair_ray = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - starts, counts)
+        
+        # ua is the hit distance as a fraction of the sensor length.
+        angles = heading + offsets
+        ray_dx = self.sensor_length * np.sin(angles)
+        ray_dy = -self.sensor_length * np.cos(angles)
+        ua = ray_segment_fractions(self.x, self.y, ray_dx[pair_ray], ray_dy[pair_ray],
+                                   x3[pair_seg], y3[pair_seg], x4[pair_seg], y4[pair_seg])
+        hit = np.isfinite(ua)
+        readings = np.ones(len(offsets))
+        np.minimum.at(readings, pair_ray[hit], ua[hit])
+        self.sensor_readings = readings.tolist()
+        
+        ends = np.column_stack([self.x + ray_dx, self.y + ray_dy])
+        sensor_lines = [((self.x, self.y), end) for end in ends.tolist()]
+        
+        centerline = track.get_centerline_array()
+        if len(centerline):
+            self.distance_from_center = float(np.sqrt(((centerline - (self.x, self.y)) ** 2).sum(axis=1)).min())
+            
+        return sensor_lines
+        
+    def cast_sensors_analytic(self, track):
+        # Exact hits against the track's lines and arcs, all rays at once.
+        angles = math.radians(self.angle) + self.sensor_offsets
+        ray_dx = self.sensor_length * np.sin(angles)
+        ray_dy = -self.sensor_length * np.cos(angles)
+        readings = nearest_hits(track.primitive_arrays, self.x, self.y, ray_dx, ray_dy)
+        self.sensor_readings = readings.tolist()
+        
+        ends = np.column_stack([self.x + ray_dx, self.y + ray_dy])
+        sensor_lines = [((self.x, self.y), end) for end in ends.tolist()]
+        
+        centerline = track.get_centerline_array()
+        if len(centerline):
+            self.distance_from_center = float(np.sqrt(((centerline - (self.x, self.y)) ** 2).sum(axis=1)).min())
+            
+        return sensor_lines
+        
+    def update_center_distance(self, track):
+        if track.centerline:
+            min_center_dist = float('inf')
+            for center_point in track.centerline:
+                dist_to_center = math.sqrt((self.x - center_point[0])**2 + (self.y - center_point[1])**2)
+                min_center_dist = min(min_center_dist, dist_to_center)
+            self.distance_from_center = min_center_dist
+        
+    def draw(self, surface, sensor_lines=None, show_sensors=True):
+        surface.blit(self.image, self.rect)
+        
+        if sensor_lines and show_sensors:
+            for i, line in enumerate(sensor_lines):
+                reading = self.sensor_readings[i]
+                if reading < 0.3:
+                    color = RED
+                elif reading < 0.6:
+                    color = YELLOW
+                else:
+                    color = GREEN
+                    
+                if i % 3 == 0 or show_sensors: 
+                    pygame.draw.line(surface, color, line[0], line[1], 1)
+                
+    def get_snapshot(self):
+        return {
+            'x': self.x,
+            'y': self.y,
+            'angle': self.angle,
+            'speed': self.speed,
+            'direction': (self.direction.x, self.direction.y),
+            'velocity': (self.velocity.x, self.velocity.y),
+            'collided': self.collided,
+            'sensor_readings': list(self.sensor_readings),
+            'distance_traveled': self.distance_traveled,
+            'time_alive': self.time_alive,
+            'last_position': self.last_position,
+            'stuck_counter': self.stuck_counter,
+            'avg_speed': self.avg_speed,
+            'speed_samples': tuple(self.speed_samples),
+            'current_lap_time': self.current_lap_time,
+            'max_distance_this_session': self.max_distance_this_session,
+            'prev_velocity': (self.prev_velocity.x, self.prev_velocity.y),
+            'acceleration_vector': (self.acceleration_vector.x, self.acceleration_vector.y),
+            'angular_velocity': self.angular_velocity,
+            'prev_angle': self.prev_angle,
+            'g_force': self.g_force,
+            'turning_radius': self.turning_radius,
+            'distance_from_center': self.distance_from_center
+        }
+        
+    def restore_snapshot(self, snapshot):
+        self.x = snapshot['x']
+        self.y = snapshot['y']
+        self.angle = snapshot['angle']
+        self.speed = snapshot['speed']
+        self.direction = pygame.Vector2(snapshot['direction'])
+        self.velocity = pygame.Vector2(snapshot['velocity'])
+        self.collided = snapshot['collided']
+        self.sensor_readings = list(snapshot['sensor_readings'])
+        self.distance_traveled = snapshot['distance_traveled']
+        self.time_alive = snapshot['time_alive']
+        self.last_position = snapshot['last_position']
+        self.stuck_counter = snapshot['stuck_counter']
+        self.avg_speed = snapshot['avg_speed']
+        self.speed_samples.clear()
+        self.speed_samples.extend(snapshot['speed_samples'])
+        self.current_lap_time = snapshot['current_lap_time']
+        self.max_distance_this_session = snapshot['max_distance_this_session']
+        self.prev_velocity = pygame.Vector2(snapshot['prev_velocity'])
+        self.acceleration_vector = pygame.Vector2(snapshot['acceleration_vector'])
+        self.angular_velocity = snapshot['angular_velocity']
+        self.prev_angle = snapshot['prev_angle']
+        self.g_force = snapshot['g_force']
+        self.turning_radius = snapshot['turning_radius']
+        self.distance_from_center = snapshot['distance_from_center']
+        self.image = pygame.transform.rotate(self.orig_image, -self.angle)
+        self.rect = self.image.get_rect(center=(self.x, self.y))
+        
+    def reset(self, x, y, angle):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.speed = 0
+        self.velocity = pygame.Vector2(0, 0)
+        self.collided = False
+        self.distance_traveled = 0
+        self.time_alive = 0
+        self.stuck_counter = 0
+        self.last_position = (x, y)
+        self.avg_speed = 0
+        self.speed_samples.clear()
+        self.current_lap_time = 0
+        self.lap_start_time = pygame.time.get_ticks()
+        
+        self.prev_velocity = pygame.Vector2(0, 0)
+        self.acceleration_vector = pygame.Vector2(0, 0)
+        self.angular_velocity = 0
+        self.prev_angle = angle
+        self.g_force = 0
+        self.turning_radius = float('inf')
         self.distance_from_center = 0
\ No newline at end of file
@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict
+import torch
+
+def snapshot(obj):
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((k, snapshot(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(v) for v in obj)
+    return obj
+
+def atomic_save(state, filepath):
+    directory = os.path.dirname(filepath) or '.'
+    tmp_path = os.path.join(directory, f".{os.path.basename(filepath)}.tmp")
+    with open(tmp_path, 'wb') as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+class CheckpointWriter:
+    def __init__(self, keep_last=3):
+        self.keep_last = keep_last
+        self.pending = OrderedDict()
+        self.periodic_paths = []
+        self.writing = False
+        self.closed = False
+        self.writes = 0
+        self.errors = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, filepath, state, periodic=False):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("CheckpointWriter is closed")
+            # A newer snapshot for the same file supersedes one still waiting.
+            self.pending.pop(filepath, None)
+            self.pending[filepath] = (state, periodic)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                filepath, (state, periodic) = self.pending.popitem(last=False)
+                self.writing = True
+
+            try:
+                atomic_save(state, filepath)
+                self.writes += 1
+                if periodic:
+                    self._rotate(filepath)
+            except Exception as e:
+                self.errors += 1
+                print(f"Failed to write checkpoint {filepath}: {e}")
+
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+    def _rotate(self, filepath):
+        if filepath in self.periodic_paths:
+            self.periodic_paths.remove(filepath)
+        self.periodic_paths.append(filepath)
+        while self.keep_last and len(self.periodic_paths) > self.keep_last:
+            old_path = self.periodic_paths.pop(0)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    def flush(self):
+        with self.condition:
+            while self.pending or self.writing:
+                self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
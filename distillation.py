@@ -0,0 +1,139 @@
+import os
+import time
+import random
+import numpy as np
+import torch
+import torch.nn.functional as F
+from constants import device
+from dqn_network import StudentNetwork, load_policy, save_policy
+from evaluation import evaluate_model, record_states, policy_agreement, policy_latency
+
+STUDENT_CONFIGS = [
+    {'hidden_dim': 32, 'num_layers': 2},
+    {'hidden_dim': 64, 'num_layers': 2},
+    {'hidden_dim': 128, 'num_layers': 2}
+]
+
+def replay_states(agent):
+    return np.asarray(agent.memory.states(), dtype=np.float32)
+
+def teacher_targets(teacher, states, batch_size=4096):
+    teacher.eval()
+    steer_targets = []
+    accel_targets = []
+    with torch.no_grad():
+        for start in range(0, len(states), batch_size):
+            batch = torch.from_numpy(states[start:start + batch_size]).to(teacher.device)
+            steer_q, accel_q = teacher(batch)
+            steer_targets.append(steer_q.float().cpu())
+            accel_targets.append(accel_q.float().cpu())
+    return torch.cat(steer_targets), torch.cat(accel_targets)
+
+def train_student(student, states, steer_targets, accel_targets, epochs=30, batch_size=256, lr=0.001):
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr)
+    states = torch.from_numpy(states)
+    student.train()
+
+    for epoch in range(epochs):
+        order = torch.randperm(len(states))
+        total_loss = 0
+        for start in range(0, len(states), batch_size):
+            idx = order[start:start + batch_size]
+            steer_q, accel_q = student(states[idx].to(device))
+            loss = F.mse_loss(steer_q, steer_targets[idx].to(device)) + \
+                   F.mse_loss(accel_q, accel_targets[idx].to(device))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(idx)
+
+        if (epoch + 1) % 10 == 0:
+            print(f"  Epoch {epoch + 1}/{epochs}, loss: {total_loss / len(states):.4f}")
+
+    return student.eval()
+
+def distill_student(teacher, states, hidden_dim=64, num_layers=2, epochs=30, dagger_rounds=1,
+                    steps_per_track=500, seed=0):
+    torch.manual_seed(seed)
+    student = StudentNetwork(teacher.input_dim, hidden_dim, teacher.output_dim, num_layers, teacher.frame_dim,
+                             teacher.sensor_config)
+    steer_targets, accel_targets = teacher_targets(teacher, states)
+    train_student(student, states, steer_targets, accel_targets, epochs)
+
+    # The student drifts into states the teacher rarely visits; label those
+    # with the teacher too and keep training on the union.
+    for round_idx in range(dagger_rounds):
+        student_states = record_states(student, steps_per_track=steps_per_track,
+                                       epsilon=0.0, seed=seed + round_idx + 1)
+        states = np.concatenate([states, student_states])
+        steer_targets, accel_targets = teacher_targets(teacher, states)
+        train_student(student, states, steer_targets, accel_targets, epochs)
+
+    return student, states
+
+def distill_policy(teacher_path='models/best_model.pt', output_dir='models/students', configs=None,
+                   states=None, success_bar=0.85, episodes_per_track=20, steps_per_track=2000,
+                   epochs=30, dagger_rounds=1, num_workers=None, seed=0):
+    if not os.path.exists(teacher_path):
+        print(f"Model file {teacher_path} not found")
+        return None
+
+    if configs is None:
+        configs = STUDENT_CONFIGS
+    os.makedirs(output_dir, exist_ok=True)
+    random.seed(seed)
+
+    teacher = load_policy(teacher_path)
+    if states is None:
+        print("Recording teacher rollouts...")
+        states = record_states(teacher, steps_per_track=steps_per_track, epsilon=0.1, seed=seed)
+    print(f"Distilling on {len(states)} states")
+    # Agreement is measured on teacher rollouts none of the students train
+    # on; the seed is past the ones the DAgger rounds use.
+    holdout_states = record_states(teacher, steps_per_track=steps_per_track // 4, epsilon=0.1,
+                                   seed=seed + dagger_rounds + 1)
+
+    teacher_latency = policy_latency(teacher, states)
+    results = []
+    for config in configs:
+        name = f"student_{config['num_layers']}x{config['hidden_dim']}"
+        print(f"\nTraining {name}...")
+        start_time = time.time()
+        student, _ = distill_student(teacher, states, config['hidden_dim'], config['num_layers'],
+                                     epochs, dagger_rounds, steps_per_track // 4, seed)
+        train_time = time.time() - start_time
+
+        path = f"{output_dir}/{name}.pt"
+        save_policy(student, path)
+        summary = evaluate_model(path, episodes_per_track=episodes_per_track,
+                                 num_workers=num_workers, seed=seed,
+                                 report_path=f"{output_dir}/{name}_evaluation.json")
+        results.append({
+            'name': name,
+            'path': path,
+            'config': config,
+            'train_time': train_time,
+            'agreement': policy_agreement(teacher, student, holdout_states),
+            'latency': policy_latency(student, states),
+            'success_rate': summary['all']['success_rate'],
+            'avg_distance': summary['all']['avg_distance']
+        })
+
+    print(f"\nTeacher latency: {teacher_latency * 1e6:.0f} us/act")
+    print(f"{'Student':<16}{'Agreement':>11}{'Latency':>11}{'Success':>10}{'Distance':>12}")
+    for result in results:
+        print(f"{result['name']:<16}{result['agreement']['both'] * 100:>10.1f}%"
+              f"{result['latency'] * 1e6:>9.0f}us"
+              f"{result['success_rate'] * 100:>9.1f}%"
+              f"{result['avg_distance']:>12.0f}")
+
+    passing = [r for r in results if r['success_rate'] >= success_bar]
+    best = min(passing, key=lambda r: r['latency']) if passing else None
+    if best:
+        print(f"\nFastest student meeting {success_bar * 100:.0f}% success: {best['name']} ({best['path']})")
+    else:
+        print(f"\nNo student reached {success_bar * 100:.0f}% success")
+    return best, results
+
+if __name__ == "__main__":
+    distill_policy()
@@ -1,136 +1,232 @@
-import torch
-import torch.nn.functional as F
-import torch.optim as optim
-import numpy as np
-import random
-import os
-from collections import deque
-from constants import device
-from dqn_network import DQNetwork
-
-class DQNAgent:
-    def __init__(self, state_size, action_size=9, lr=0.0001, gamma=0.99, tau=0.001):
-        self.state_size = state_size
-        self.action_size = action_size
-        self.gamma = gamma
-        self.tau = tau
-        self.q_network = DQNetwork(state_size, output_dim=action_size*2)
-        self.target_network = DQNetwork(state_size, output_dim=action_size*2)
-        self.update_target_network(tau=1.0) 
-        self.optimizer = optim.Adam(self.q_network.parameters(), lr=lr, weight_decay=1e-5)
-        self.memory = deque(maxlen=50000)
-        self.priority_memory = deque(maxlen=10000)
-        self.batch_size = 64
-        self.epsilon = 1.0
-        self.epsilon_min = 0.1 
-        self.epsilon_decay = 0.999 
-        self.loss_history = deque(maxlen=100)
-        self.training_steps = 0
-        
-    def update_target_network(self, tau=None):
-        if tau is None:
-            tau = self.tau
-            
-        for target_param, param in zip(self.target_network.parameters(),
-                                     self.q_network.parameters()):
-            target_param.data.copy_(tau * param.data + (1-tau) * target_param.data)
-            
-    def remember(self, state, action_idx, reward, next_state, done):
-        experience = (state, action_idx, reward, next_state, done)
-        self.memory.append(experience)
-        
-        if abs(reward) > 2.0 or done:
-            self.priority_memory.append(experience)
-        
-    def act(self, state):
-        return self.q_network.act(state, self.epsilon)
-        
-    def replay(self):
-        if len(self.memory) < self.batch_size * 2:
-            return 0
-            
-        regular_size = int(self.batch_size * 0.7)
-        priority_size = self.batch_size - regular_size
-        
-        batch = []
-        if len(self.memory) >= regular_size:
-            batch.extend(random.sample(self.memory, regular_size))
-        if len(self.priority_memory) >= priority_size:
-            batch.extend(random.sample(self.priority_memory, priority_size))
-        else:
-            batch.extend(random.sample(self.memory, self.batch_size - len(batch)))
-            
-        states = np.array([e[0] for e in batch])
-        actions_steer = np.array([e[1][0] for e in batch])
-        actions_accel = np.array([e[1][1] for e in batch])
-        rewards = np.array([e[2] for e in batch])
-        next_states = np.array([e[3] for e in batch])
-        dones = np.array([e[4] for e in batch])
-        
-        states = torch.FloatTensor(states).to(device)
-        actions_steer = torch.LongTensor(actions_steer).to(device)
-        actions_accel = torch.LongTensor(actions_accel).to(device)
-        rewards = torch.FloatTensor(rewards).to(device)
-        next_states = torch.FloatTensor(next_states).to(device)
-        dones = torch.FloatTensor(dones).to(device)
-        
-        current_steer_q, current_accel_q = self.q_network(states)
-        steer_q = current_steer_q.gather(1, actions_steer.unsqueeze(1)).squeeze(1)
-        accel_q = current_accel_q.gather(1, actions_accel.unsqueeze(1)).squeeze(1)
-        
-        with torch.no_grad():
-            online_next_steer_q, online_next_accel_q = self.q_network(next_states)
-            best_steer_actions = online_next_steer_q.argmax(1)
-            best_accel_actions = online_next_accel_q.argmax(1)
-            
-            target_next_steer_q, target_next_accel_q = self.target_network(next_states)
-            max_next_steer_q = target_next_steer_q.gather(1, best_steer_actions.unsqueeze(1)).squeeze(1)
-            max_next_accel_q = target_next_accel_q.gather(1, best_accel_actions.unsqueeze(1)).squeeze(1)
-            
-            target_steer = rewards + (1 - dones) * self.gamma * max_next_steer_q
-            target_accel = rewards + (1 - dones) * self.gamma * max_next_accel_q
-            
-        loss_steer = F.smooth_l1_loss(steer_q, target_steer)
-        loss_accel = F.smooth_l1_loss(accel_q, target_accel)
-        loss = loss_steer + loss_accel
-        
-        self.optimizer.zero_grad()
-        loss.backward()
-        torch.nn.utils.clip_grad_norm_(self.q_network.parameters(), 1.0)
-        self.optimizer.step()
-        
-        self.update_target_network()
-        
-        if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
-            
-        self.loss_history.append(loss.item())
-        self.training_steps += 1
-            
-        return loss.item()
-        
-    def save(self, filepath):
-        torch.save({
-            'q_network': self.q_network.state_dict(),
-            'target_network': self.target_network.state_dict(),
-            'optimizer': self.optimizer.state_dict(),
-            'epsilon': self.epsilon,
-            'memory_size': len(self.memory),
-            'loss_history': list(self.loss_history),
-            'training_steps': self.training_steps
-        }, filepath)
-        
-    def load(self, filepath):
-        if not os.path.exists(filepath):
-            print(f"Model file {filepath} not found")
-            return False
-            
-        checkpoint = torch.load(filepath, map_location=device)
-        self.q_network.load_state_dict(checkpoint['q_network'])
-        self.target_network.load_state_dict(checkpoint['target_network'])
-        self.optimizer.load_state_dict(checkpoint['optimizer'])
-        self.epsilon = checkpoint.get('epsilon', 0.05)
-        self.training_steps = checkpoint.get('training_steps', 0)
-        
-        print(f"Model loaded from {filepath}")
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+import numpy as np
+import os
+from collections import deque
+from constants import device
+from dqn_network import DQNetwork
+from replay_buffer import ReplayStorage, ReplayBuffer, ReplayBatch, NStepBuilder
+from checkpointing import snapshot, atomic_save
+
+class DQNAgent:
+    def __init__(self, state_size, action_size=9, lr=0.0001, gamma=0.99, tau=0.001,
+                 replay_ratio=0.25, updates_per_sample=1, target_update_interval=None,
+                 compile_network=False, mixed_precision=False, replay_state_dtype=np.float32,
+                 n_step=1, frame_stack=1, sensor_config=None):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.gamma = gamma
+        self.tau = tau
+        self.frame_stack = frame_stack
+        self.target_update_interval = target_update_interval
+        self.build_networks({'input_dim': state_size, 'output_dim': action_size*2,
+                             'frame_dim': state_size // frame_stack, 'sensor_config': sensor_config}, lr)
+        self.mixed_precision = mixed_precision
+        self.n_step = n_step
+        self.build_replay(replay_state_dtype)
+        self.n_step_builder = NStepBuilder(n_step, gamma)
+        self.batch_size = 64
+        self.batch = None
+        self.replay_ratio = replay_ratio
+        self.updates_per_sample = updates_per_sample
+        self.epsilon = 1.0
+        self.epsilon_min = 0.1 
+        self.epsilon_decay = 0.999 
+        self.loss_history = deque(maxlen=100)
+        self.training_steps = 0
+        if compile_network:
+            self.compile_network()
+        
+    def build_networks(self, network_config, lr):
+        self.q_network = DQNetwork(**network_config)
+        self.target_network = DQNetwork(**network_config)
+        self.online_params = list(self.q_network.parameters())
+        self.target_params = list(self.target_network.parameters())
+        self.update_target_network(tau=1.0)
+        self.train_network = self.q_network
+        self.optimizer = optim.Adam(self.q_network.parameters(), lr=lr, weight_decay=1e-5)
+
+    def build_replay(self, state_dtype):
+        # Regular transitions share frames with their neighbours, so a small
+        # margin covers episode starts; priority transitions are sparse and
+        # need a full stack each, plus the frames their bootstrap state is
+        # ahead of it, n_step of them at most.
+        frame_stack = self.frame_stack
+        memory_obs = 50000 + 50000 // 8 + 2 * frame_stack
+        priority_obs = (frame_stack + min(self.n_step, frame_stack)) * 10000
+        self.replay_storage = ReplayStorage(50000 + 10000, self.state_size, state_dtype,
+                                            memory_obs + priority_obs, frame_stack)
+        self.memory = ReplayBuffer(50000, self.state_size, self.replay_storage, 0, memory_obs, 0)
+        self.priority_memory = ReplayBuffer(10000, self.state_size, self.replay_storage, 50000,
+                                            priority_obs, memory_obs)
+
+    def update_target_network(self, tau=None):
+        if tau is None:
+            tau = self.tau
+            
+        with torch.no_grad():
+            if tau >= 1.0:
+                torch._foreach_copy_(self.target_params, self.online_params)
+            else:
+                torch._foreach_lerp_(self.target_params, self.online_params, tau)
+                
+    def compile_network(self):
+        if not hasattr(torch, 'compile'):
+            print("torch.compile is not available, using eager network")
+            return False
+            
+        try:
+            compiled = torch.compile(self.q_network)
+            # Compilation is lazy, so run one training-shaped forward and
+            # backward now; otherwise a failure would only surface in learn().
+            states = torch.zeros(self.batch_size, self.state_size, device=device)
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=self.mixed_precision):
+                steer_q, accel_q = compiled(states)
+            (steer_q.float().sum() + accel_q.float().sum()).backward()
+            self.q_network.zero_grad(set_to_none=True)
+            self.train_network = compiled
+        except Exception as e:
+            print(f"Could not compile network ({e}), using eager network")
+            self.train_network = self.q_network
+            return False
+        return True
+            
+    def remember(self, state, action_idx, reward, next_state, done, truncated=False):
+        state_id = self.memory.add_observation(state)
+        next_id = self.memory.add_observation(next_state)
+        
+        # The step's own reward rides along with the state so priority
+        # selection still looks at single-step impact, not the n-step sum.
+        self.store_transitions(self.n_step_builder.push((state, state_id, reward), action_idx, reward,
+                                                        (next_state, next_id), done, truncated))
+        
+    def end_episode(self):
+        self.store_transitions(self.n_step_builder.flush())
+        
+    def store_transitions(self, transitions):
+        for (state, state_id, step_reward), action_idx, n_step_reward, (next_state, next_id), \
+                terminal, discount in transitions:
+            self.memory.add_transition(state_id, action_idx, n_step_reward, next_id, terminal, discount)
+            
+            if abs(step_reward) > 2.0 or terminal:
+                self.priority_memory.add(state, action_idx, n_step_reward, next_state, terminal, discount)
+        
+    def act(self, state):
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=self.mixed_precision):
+            return self.q_network.act(state, self.epsilon)
+        
+    def replay(self, num_updates=None):
+        if len(self.memory) < self.batch_size * 2:
+            return 0
+            
+        if num_updates is None:
+            num_updates = self.updates_per_sample
+            
+        regular_size = int(self.batch_size * 0.7)
+        
+        if self.batch is None or self.batch.batch_size != self.batch_size or \
+           self.batch.num_minibatches != num_updates:
+            self.batch = ReplayBatch(self.batch_size, self.replay_storage, regular_size, num_updates)
+        batch = self.batch
+        
+        batch.sample(self.replay_storage, self.memory, self.priority_memory)
+        batch.transfer()
+        
+        total_loss = 0
+        for minibatch in batch.minibatches:
+            total_loss += self.learn(minibatch)
+            
+        return total_loss / num_updates
+        
+    def learn(self, minibatch):
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=self.mixed_precision):
+            loss = self.compute_loss(minibatch)
+        
+        self.optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.q_network.parameters(), 1.0)
+        self.optimizer.step()
+        
+        if self.target_update_interval:
+            if (self.training_steps + 1) % self.target_update_interval == 0:
+                self.update_target_network(tau=1.0)
+        else:
+            self.update_target_network()
+        
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+            
+        self.loss_history.append(loss.item())
+        self.training_steps += 1
+            
+        return loss.item()
+        
+    def compute_loss(self, minibatch):
+        states = minibatch['states']
+        rewards = minibatch['rewards']
+        next_states = minibatch['next_states']
+        dones = minibatch['dones']
+        discounts = minibatch['discounts']
+        
+        current_steer_q, current_accel_q = self.train_network(states)
+        steer_q = current_steer_q.gather(1, minibatch['steer_actions']).squeeze(1)
+        accel_q = current_accel_q.gather(1, minibatch['accel_actions']).squeeze(1)
+        
+        with torch.no_grad():
+            online_next_steer_q, online_next_accel_q = self.train_network(next_states)
+            best_steer_actions = online_next_steer_q.argmax(1)
+            best_accel_actions = online_next_accel_q.argmax(1)
+            
+            target_next_steer_q, target_next_accel_q = self.target_network(next_states)
+            max_next_steer_q = target_next_steer_q.gather(1, best_steer_actions.unsqueeze(1)).squeeze(1)
+            max_next_accel_q = target_next_accel_q.gather(1, best_accel_actions.unsqueeze(1)).squeeze(1)
+            
+            target_steer = rewards + (1 - dones) * discounts * max_next_steer_q
+            target_accel = rewards + (1 - dones) * discounts * max_next_accel_q
+            
+        loss_steer = F.smooth_l1_loss(steer_q, target_steer)
+        loss_accel = F.smooth_l1_loss(accel_q, target_accel)
+        return loss_steer + loss_accel
+        
+    def checkpoint_state(self):
+        return snapshot({
+            'q_network': self.q_network.state_dict(),
+            'network_config': self.q_network.config(),
+            'target_network': self.target_network.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'epsilon': self.epsilon,
+            'memory_size': len(self.memory),
+            'loss_history': list(self.loss_history),
+            'training_steps': self.training_steps
+        })
+        
+    def save(self, filepath):
+        atomic_save(self.checkpoint_state(), filepath)
+        
+    def load(self, filepath):
+        if not os.path.exists(filepath):
+            print(f"Model file {filepath} not found")
+            return False
+            
+        checkpoint = torch.load(filepath, map_location=device)
+        # The checkpoint may come from a different observation setup (frame
+        # stacking, sensor layout), so the networks follow its config.
+        config = checkpoint.get('network_config')
+        if config is not None and config != self.q_network.config():
+            compiled = self.train_network is not self.q_network
+            self.build_networks(config, self.optimizer.param_groups[0]['lr'])
+            self.state_size = config['input_dim']
+            self.action_size = config['output_dim'] // 2
+            self.frame_stack = config['input_dim'] // config['frame_dim']
+            self.build_replay(self.replay_storage.state_dtype)
+            if compiled:
+                self.compile_network()
+        self.q_network.load_state_dict(checkpoint['q_network'])
+        self.target_network.load_state_dict(checkpoint['target_network'])
+        self.optimizer.load_state_dict(checkpoint['optimizer'])
+        self.epsilon = checkpoint.get('epsilon', 0.05)
+        self.training_steps = checkpoint.get('training_steps', 0)
+        
+        print(f"Model loaded from {filepath}")
         return True
\ No newline at end of file
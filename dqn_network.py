@@ -1,113 +1,253 @@
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import random
-from constants import device
-
-class DQNetwork(nn.Module):
-    def __init__(self, input_dim, hidden_dim=256, output_dim=10):
-        super(DQNetwork, self).__init__()
-        self.fc1 = nn.Linear(input_dim, hidden_dim)
-        self.fc2 = nn.Linear(hidden_dim, hidden_dim)
-        self.fc3 = nn.Linear(hidden_dim, hidden_dim)
-        self.ln1 = nn.LayerNorm(hidden_dim)
-        self.ln2 = nn.LayerNorm(hidden_dim)
-        self.ln3 = nn.LayerNorm(hidden_dim)
-        self.dropout = nn.Dropout(0.1)
-
-        self.value_head = nn.Sequential(
-            nn.Linear(hidden_dim, hidden_dim // 2),
-            nn.ReLU(),
-            nn.Linear(hidden_dim // 2, 1)
-        )
-        
-        self.steer_head = nn.Sequential(
-            nn.Linear(hidden_dim, hidden_dim // 2),
-            nn.ReLU(),
-            nn.Linear(hidden_dim // 2, output_dim // 2)
-        )
-        
-        self.accel_head = nn.Sequential(
-            nn.Linear(hidden_dim, hidden_dim // 2),
-            nn.ReLU(),
-            nn.Linear(hidden_dim // 2, output_dim // 2)
-        )
-        
-        self.apply(self._init_weights)
-        self.to(device)
-        
-    def _init_weights(self, module):
-        if isinstance(module, nn.Linear):
-            nn.init.xavier_uniform_(module.weight)
-            if module.bias is not None:
-                nn.init.constant_(module.bias, 0)
-                
-    def forward(self, x):
-        if len(x.shape) == 1:
-            x = x.unsqueeze(0)
-            single_input = True
-        else:
-            single_input = False
-        
-        h1 = F.relu(self.ln1(self.fc1(x)))
-        h2 = F.relu(self.ln2(self.fc2(h1)))
-        h2 = self.dropout(h2)
-        h3 = F.relu(self.ln3(self.fc3(h2) + h1)) 
-        value = self.value_head(h3)
-        steer_adv = self.steer_head(h3)
-        accel_adv = self.accel_head(h3)
-        steer_q = value + (steer_adv - steer_adv.mean(dim=1, keepdim=True))
-        accel_q = value + (accel_adv - accel_adv.mean(dim=1, keepdim=True))
-
-        if single_input:
-            steer_q = steer_q.squeeze(0)
-            accel_q = accel_q.squeeze(0)
-            
-        return steer_q, accel_q
-        
-    def act(self, state, epsilon=0.0):
-        if random.random() < epsilon:
-            steer_idx = random.randint(0, 4)
-            accel_idx = random.randint(1, 4) 
-            if len(state) > 7:
-                front_sensor = state[7] 
-                if front_sensor < 0.3:
-                    accel_idx = random.randint(0, 1) 
-                    left_sensor = state[5]
-                    right_sensor = state[9]
-                    if left_sensor > right_sensor:
-                        steer_idx = random.randint(0, 1) 
-                    else:
-                        steer_idx = random.randint(3, 4) 
-        else:
-            self.eval()  
-            with torch.no_grad():
-                state_tensor = torch.FloatTensor(state).to(device)
-                steer_q, accel_q = self.forward(state_tensor)
-                steer_idx = torch.argmax(steer_q).item()
-                accel_idx = torch.argmax(accel_q).item()
-            self.train()  
-                
-        steer = (steer_idx - 2) / 2.0  
-        accel = (accel_idx - 2) / 2.0  
-        
-        if len(state) > 7:
-            front_sensor = state[7]
-            if front_sensor < 0.2:
-                left_space = state[5]
-                right_space = state[9]
-                
-                if left_space > right_space:
-                    steer = -1.0 
-                else:
-                    steer = 1.0  
-                accel = -0.5     
-                
-            elif front_sensor < 0.4:
-                if state[20] > 0: 
-                    steer = max(-1.0, steer - 0.3)
-                else:
-                    steer = min(1.0, steer + 0.3)
-                accel = min(0.0, accel) 
-                
-        return {'steer': steer, 'accelerate': accel}, [steer_idx, accel_idx]
\ No newline at end of file
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import random
+from constants import device
+from sensors import observation_layout
+
+class PolicyNetwork(nn.Module):
+    def act(self, state, epsilon=0.0):
+        # With stacked frames the safety rules look at the newest frame only.
+        frame = state[-self.frame_dim:]
+        
+        if random.random() < epsilon:
+            steer_idx, accel_idx = self.explore(frame)
+        else:
+            self.eval()  
+            with torch.no_grad():
+                steer_q, accel_q = self.forward(self.input_tensor(state))
+                steer_idx = torch.argmax(steer_q).item()
+                accel_idx = torch.argmax(accel_q).item()
+            self.train()  
+                
+        return self.apply_safety(frame, steer_idx, accel_idx)
+        
+    def act_batch(self, states, epsilons=None):
+        states = torch.as_tensor(states, dtype=torch.float32)
+        self.eval()
+        with torch.no_grad():
+            steer_q, accel_q = self.forward(states.to(self.device))
+            steer_idx = steer_q.argmax(1).tolist()
+            accel_idx = accel_q.argmax(1).tolist()
+        self.train()
+        
+        frames = states[:, -self.frame_dim:].numpy()
+        results = []
+        for i, frame in enumerate(frames):
+            if epsilons is not None and random.random() < epsilons[i]:
+                results.append(self.apply_safety(frame, *self.explore(frame)))
+            else:
+                results.append(self.apply_safety(frame, steer_idx[i], accel_idx[i]))
+        return results
+        
+    def explore(self, frame):
+        layout = self.obs_layout
+        steer_idx = random.randint(0, 4)
+        accel_idx = random.randint(1, 4) 
+        if len(frame) > layout['front']:
+            front_sensor = frame[layout['front']] 
+            if front_sensor < 0.3:
+                accel_idx = random.randint(0, 1) 
+                left_sensor = frame[layout['left_probe']]
+                right_sensor = frame[layout['right_probe']]
+                if left_sensor > right_sensor:
+                    steer_idx = random.randint(0, 1) 
+                else:
+                    steer_idx = random.randint(3, 4) 
+        return steer_idx, accel_idx
+        
+    def apply_safety(self, frame, steer_idx, accel_idx):
+        layout = self.obs_layout
+        steer = (steer_idx - 2) / 2.0  
+        accel = (accel_idx - 2) / 2.0  
+        
+        if len(frame) > layout['front']:
+            front_sensor = frame[layout['front']]
+            if front_sensor < 0.2:
+                left_space = frame[layout['left_probe']]
+                right_space = frame[layout['right_probe']]
+                
+                if left_space > right_space:
+                    steer = -1.0 
+                else:
+                    steer = 1.0  
+                accel = -0.5     
+                
+            elif front_sensor < 0.4:
+                if frame[layout['balance']] > 0: 
+                    steer = max(-1.0, steer - 0.3)
+                else:
+                    steer = min(1.0, steer + 0.3)
+                accel = min(0.0, accel) 
+                
+        return {'steer': steer, 'accelerate': accel}, [steer_idx, accel_idx]
+        
+    @property
+    def frame_stack(self):
+        return self.input_dim // self.frame_dim
+        
+    def input_tensor(self, state):
+        state_buffer = getattr(self, 'state_buffer', None)
+        if state_buffer is None or state_buffer.device != self.device:
+            state_buffer = torch.zeros(self.input_dim, device=self.device)
+            self.state_buffer = state_buffer
+        state_buffer.copy_(torch.as_tensor(state))
+        return state_buffer
+
+class DQNetwork(PolicyNetwork):
+    policy_type = 'dqn'
+    
+    def __init__(self, input_dim, hidden_dim=256, output_dim=10, frame_dim=None, sensor_config=None):
+        super(DQNetwork, self).__init__()
+        self.input_dim = input_dim
+        self.hidden_dim = hidden_dim
+        self.output_dim = output_dim
+        self.frame_dim = frame_dim or input_dim
+        self.sensor_config = sensor_config
+        self.obs_layout = observation_layout(sensor_config)
+        self.device = device
+        self.fc1 = nn.Linear(input_dim, hidden_dim)
+        self.fc2 = nn.Linear(hidden_dim, hidden_dim)
+        self.fc3 = nn.Linear(hidden_dim, hidden_dim)
+        self.ln1 = nn.LayerNorm(hidden_dim)
+        self.ln2 = nn.LayerNorm(hidden_dim)
+        self.ln3 = nn.LayerNorm(hidden_dim)
+        self.dropout = nn.Dropout(0.1)
+
+        self.value_head = nn.Sequential(
+            nn.Linear(hidden_dim, hidden_dim // 2),
+            nn.ReLU(),
+            nn.Linear(hidden_dim // 2, 1)
+        )
+        
+        self.steer_head = nn.Sequential(
+            nn.Linear(hidden_dim, hidden_dim // 2),
+            nn.ReLU(),
+            nn.Linear(hidden_dim // 2, output_dim // 2)
+        )
+        
+        self.accel_head = nn.Sequential(
+            nn.Linear(hidden_dim, hidden_dim // 2),
+            nn.ReLU(),
+            nn.Linear(hidden_dim // 2, output_dim // 2)
+        )
+        
+        self.apply(self._init_weights)
+        self.to(device)
+        
+    def config(self):
+        return {'input_dim': self.input_dim, 'hidden_dim': self.hidden_dim,
+                'output_dim': self.output_dim, 'frame_dim': self.frame_dim,
+                'sensor_config': self.sensor_config}
+        
+    def _init_weights(self, module):
+        if isinstance(module, nn.Linear):
+            nn.init.xavier_uniform_(module.weight)
+            if module.bias is not None:
+                nn.init.constant_(module.bias, 0)
+                
+    def forward(self, x):
+        if len(x.shape) == 1:
+            x = x.unsqueeze(0)
+            single_input = True
+        else:
+            single_input = False
+        
+        h1 = F.relu(self.ln1(self.fc1(x)))
+        h2 = F.relu(self.ln2(self.fc2(h1)))
+        h2 = self.dropout(h2)
+        h3 = F.relu(self.ln3(self.fc3(h2) + h1)) 
+        value = self.value_head(h3)
+        steer_adv = self.steer_head(h3)
+        accel_adv = self.accel_head(h3)
+        steer_q = value + (steer_adv - steer_adv.mean(dim=1, keepdim=True))
+        accel_q = value + (accel_adv - accel_adv.mean(dim=1, keepdim=True))
+
+        if single_input:
+            steer_q = steer_q.squeeze(0)
+            accel_q = accel_q.squeeze(0)
+            
+        return steer_q, accel_q
+
+class StudentNetwork(PolicyNetwork):
+    policy_type = 'student'
+    
+    def __init__(self, input_dim, hidden_dim=64, output_dim=10, num_layers=2, frame_dim=None,
+                 sensor_config=None):
+        super(StudentNetwork, self).__init__()
+        self.input_dim = input_dim
+        self.hidden_dim = hidden_dim
+        self.output_dim = output_dim
+        self.num_layers = num_layers
+        self.frame_dim = frame_dim or input_dim
+        self.sensor_config = sensor_config
+        self.obs_layout = observation_layout(sensor_config)
+        self.device = device
+        
+        layers = []
+        in_dim = input_dim
+        for _ in range(num_layers):
+            layers.append(nn.Linear(in_dim, hidden_dim))
+            layers.append(nn.ReLU())
+            in_dim = hidden_dim
+        layers.append(nn.Linear(hidden_dim, output_dim))
+        self.layers = nn.Sequential(*layers)
+        self.to(device)
+        
+    def config(self):
+        return {'input_dim': self.input_dim, 'hidden_dim': self.hidden_dim,
+                'output_dim': self.output_dim, 'num_layers': self.num_layers,
+                'frame_dim': self.frame_dim, 'sensor_config': self.sensor_config}
+        
+    def forward(self, x):
+        q = self.layers(x)
+        return q[..., :self.output_dim // 2], q[..., self.output_dim // 2:]
+
+POLICY_CLASSES = {
+    DQNetwork.policy_type: DQNetwork,
+    StudentNetwork.policy_type: StudentNetwork
+}
+
+def quantize_policy(network):
+    network = network.to('cpu').eval()
+    network.device = torch.device('cpu')
+    return torch.ao.quantization.quantize_dynamic(network, {nn.Linear}, dtype=torch.qint8)
+
+def save_policy(network, output_path, quantized=False):
+    torch.save({
+        'policy_type': network.policy_type + ('_int8' if quantized else ''),
+        'config': network.config(),
+        'policy': network.state_dict()
+    }, output_path)
+    print(f"Policy exported to {output_path}")
+
+def export_policy(checkpoint_path, output_path, state_size=24, action_size=9, quantize=True):
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    config = checkpoint.get('network_config', {'input_dim': state_size, 'output_dim': action_size*2})
+    network = DQNetwork(**config)
+    network.load_state_dict(checkpoint['q_network'])
+    if quantize:
+        network = quantize_policy(network)
+    save_policy(network, output_path, quantized=quantize)
+    return network
+
+def load_policy(filepath, state_size=24, action_size=9):
+    checkpoint = torch.load(filepath, map_location='cpu' if device.type == 'cpu' else device)
+    policy_type = checkpoint.get('policy_type')
+    
+    if policy_type is None:
+        config = checkpoint.get('network_config', {'input_dim': state_size, 'output_dim': action_size*2})
+        network = DQNetwork(**config)
+        network.load_state_dict(checkpoint['q_network'])
+        return network.eval()
+        
+    quantized = policy_type.endswith('_int8')
+    base_type = policy_type[:-len('_int8')] if quantized else policy_type
+    if base_type not in POLICY_CLASSES:
+        raise ValueError(f"Unknown policy type: {policy_type}")
+        
+    network = POLICY_CLASSES[base_type](**checkpoint['config'])
+    if quantized:
+        network = quantize_policy(network)
+    network.load_state_dict(checkpoint['policy'])
+    return network.eval()
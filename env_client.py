@@ -0,0 +1,126 @@
+import json
+import struct
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from framing import FramedClient
+
+# Only numpy and the standard library are used here so trainers in other
+# processes can drive the simulation without pygame or torch.
+
+OP_OPEN = 1
+OP_RESET = 2
+OP_STEP = 3
+OP_SNAPSHOT = 4
+OP_RESTORE = 5
+OP_DROP_SNAPSHOT = 6
+OP_CLOSE = 7
+OP_SHUTDOWN = 8
+ENV_INDEX = struct.Struct('<I')
+SNAPSHOT_REF = struct.Struct('<II')
+
+def session_layout(num_envs, state_size):
+    fields = [
+        ('actions', (num_envs, 2), np.float32),
+        ('obs', (num_envs, state_size), np.float32),
+        ('final_obs', (num_envs, state_size), np.float32),
+        ('rewards', (num_envs,), np.float32),
+        ('dones', (num_envs,), np.uint8),
+        ('truncated', (num_envs,), np.uint8)
+    ]
+    layout = {}
+    offset = 0
+    for name, shape, dtype in fields:
+        layout[name] = (offset, shape, dtype)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset = (offset + 63) // 64 * 64
+    return layout, offset
+
+def map_session(buffer, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()}
+
+def attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block with this process's
+        # resource tracker, which would unlink it when the client exits.
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class EnvClient(FramedClient):
+    server_name = "Environment server"
+    default_port = 5556
+
+    def __init__(self, socket_path=None, host='127.0.0.1', port=None):
+        super().__init__(socket_path, host, port)
+        self.shm = None
+        self.arrays = None
+
+    def _session_arrays(self):
+        if self.arrays is None:
+            raise RuntimeError("No session open; call open() first")
+        return self.arrays
+
+    def open(self, num_envs=1, track_types=None, frame_stack=1, random_spawn=False, auto_reset=True,
+             max_steps=2000, seed=None, sensor_config=None):
+        config = {'num_envs': num_envs, 'track_types': track_types, 'frame_stack': frame_stack,
+                  'random_spawn': random_spawn, 'auto_reset': auto_reset, 'max_steps': max_steps,
+                  'seed': seed, 'sensor_config': sensor_config}
+        self.info = json.loads(self._request(OP_OPEN, json.dumps(config).encode()).decode())
+        self.num_envs = self.info['num_envs']
+        self.state_size = self.info['state_size']
+        layout, _ = session_layout(self.num_envs, self.state_size)
+        self.shm = attach_shared_memory(self.info['shm_name'])
+        self.arrays = map_session(self.shm.buf, layout)
+        return self.info
+
+    def reset(self, indices=None):
+        arrays = self._session_arrays()
+        if indices is None:
+            payload = b''
+        else:
+            payload = np.asarray(indices, dtype=np.uint32).tobytes()
+        self._request(OP_RESET, payload)
+        return arrays['obs'].copy()
+
+    def step(self, actions):
+        # actions: (num_envs, 2) steer, accelerate in [-1, 1]
+        arrays = self._session_arrays()
+        arrays['actions'][:] = actions
+        self._request(OP_STEP)
+        return (arrays['obs'].copy(), arrays['rewards'].copy(),
+                arrays['dones'].astype(bool), arrays['truncated'].astype(bool))
+
+    @property
+    def final_obs(self):
+        # With auto_reset, rows of obs for finished envs already hold the next
+        # episode's first state; the state they ended in is kept here.
+        return self._session_arrays()['final_obs'].copy()
+
+    def snapshot(self, index=0):
+        snapshot_id, = ENV_INDEX.unpack(self._request(OP_SNAPSHOT, ENV_INDEX.pack(index)))
+        return snapshot_id
+
+    def restore(self, snapshot_id, index=0):
+        arrays = self._session_arrays()
+        self._request(OP_RESTORE, SNAPSHOT_REF.pack(index, snapshot_id))
+        return arrays['obs'][index].copy()
+
+    def drop_snapshot(self, snapshot_id):
+        self._request(OP_DROP_SNAPSHOT, ENV_INDEX.pack(snapshot_id))
+
+    def close(self):
+        if self.shm is not None:
+            self.arrays = None
+            self.shm.close()
+            self.shm = None
+        try:
+            self._request(OP_CLOSE)
+        except (ConnectionError, OSError):
+            pass
+        self.sock.close()
+
+    def shutdown_server(self):
+        self._request(OP_SHUTDOWN)
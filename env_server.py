@@ -0,0 +1,175 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import json
+import time
+import random
+import asyncio
+import numpy as np
+from multiprocessing import shared_memory
+from constants import *
+from environment import GameEnvironment
+from framing import HEADER, OP_ERROR, FramedServer
+from env_client import (OP_OPEN, OP_RESET, OP_STEP, OP_SNAPSHOT, OP_RESTORE, OP_DROP_SNAPSHOT, OP_CLOSE,
+                        OP_SHUTDOWN, ENV_INDEX, SNAPSHOT_REF, session_layout, map_session)
+
+class EnvSession:
+    def __init__(self, num_envs=1, track_types=None, frame_stack=1, random_spawn=False, auto_reset=True,
+                 max_steps=2000, seed=None, sensor_config=None):
+        # Each session draws from its own generator, so seeding one neither
+        # touches the others nor the global random module.
+        self.rng = random.Random(seed)
+        if track_types is not None:
+            track_types = [TrackType(value) for value in track_types]
+        self.envs = []
+        for _ in range(num_envs):
+            env = GameEnvironment(track_types, incremental_sensing=True, frame_stack=frame_stack,
+                                  random_spawn=random_spawn, sensor_config=sensor_config, rng=self.rng)
+            env.render_mode = "headless"
+            env.max_steps = max_steps
+            self.envs.append(env)
+        self.num_envs = num_envs
+        self.state_size = self.envs[0].state_size
+        self.auto_reset = auto_reset
+
+        layout, size = session_layout(num_envs, self.state_size)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.arrays = map_session(self.shm.buf, layout)
+        self.snapshots = {}
+        self.next_snapshot_id = 0
+        self.steps = 0
+        self.step_time = 0.0
+
+    def info(self):
+        return {'num_envs': self.num_envs, 'state_size': self.state_size,
+                'shm_name': self.shm.name, 'auto_reset': self.auto_reset,
+                'track_types': [track_type.value for track_type in self.envs[0].track_types]}
+
+    def reset(self, indices=None):
+        if indices is None:
+            indices = range(self.num_envs)
+        obs = self.arrays['obs']
+        for i in indices:
+            obs[i] = self.envs[i].reset()
+        self.arrays['dones'][list(indices)] = 0
+        self.arrays['truncated'][list(indices)] = 0
+
+    def step(self):
+        start_time = time.perf_counter()
+        arrays = self.arrays
+        actions = arrays['actions']
+        obs = arrays['obs']
+        for i, env in enumerate(self.envs):
+            if env.done:
+                # Without auto_reset a finished env stays put until reset.
+                arrays['rewards'][i] = 0.0
+                continue
+            state, reward, done = env.step({'steer': float(actions[i, 0]),
+                                            'accelerate': float(actions[i, 1])})
+            arrays['rewards'][i] = reward
+            arrays['dones'][i] = done
+            arrays['truncated'][i] = env.truncated
+            obs[i] = state
+            if done and self.auto_reset:
+                arrays['final_obs'][i] = state
+                obs[i] = env.reset()
+        self.steps += 1
+        self.step_time += time.perf_counter() - start_time
+
+    def snapshot(self, index):
+        snapshot_id = self.next_snapshot_id
+        self.next_snapshot_id += 1
+        self.snapshots[snapshot_id] = self.envs[index].get_snapshot()
+        return snapshot_id
+
+    def restore(self, index, snapshot_id):
+        env = self.envs[index]
+        self.arrays['obs'][index] = env.restore_snapshot(self.snapshots[snapshot_id])
+        self.arrays['dones'][index] = env.done
+        self.arrays['truncated'][index] = env.truncated
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.arrays = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+class EnvServer(FramedServer):
+    server_name = "Environment server"
+    default_port = 5556
+
+    def __init__(self):
+        super().__init__()
+        self.sessions = set()
+
+    async def _handle_client(self, reader, writer):
+        session = None
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                length, op, request_id = HEADER.unpack(header)
+                payload = await reader.readexactly(length) if length else b''
+
+                try:
+                    reply = b''
+                    if op == OP_STEP:
+                        session.step()
+                    elif op == OP_OPEN:
+                        if session is not None:
+                            raise ValueError("Session already open on this connection")
+                        session = EnvSession(**json.loads(payload.decode()))
+                        self.sessions.add(session)
+                        reply = json.dumps(session.info()).encode()
+                    elif op == OP_RESET:
+                        indices = np.frombuffer(payload, dtype=np.uint32).tolist() if payload else None
+                        session.reset(indices)
+                    elif op == OP_SNAPSHOT:
+                        index, = ENV_INDEX.unpack(payload)
+                        reply = ENV_INDEX.pack(session.snapshot(index))
+                    elif op == OP_RESTORE:
+                        index, snapshot_id = SNAPSHOT_REF.unpack(payload)
+                        session.restore(index, snapshot_id)
+                    elif op == OP_DROP_SNAPSHOT:
+                        snapshot_id, = ENV_INDEX.unpack(payload)
+                        session.snapshots.pop(snapshot_id, None)
+                    elif op == OP_CLOSE:
+                        self._send(writer, op, request_id)
+                        await writer.drain()
+                        break
+                    elif op == OP_SHUTDOWN:
+                        self._send(writer, op, request_id)
+                        await writer.drain()
+                        self.stopped.set()
+                        break
+                    else:
+                        raise ValueError(f"Unknown op {op}")
+                    self._send(writer, op, request_id, reply)
+                except Exception as e:
+                    if session is None and op != OP_OPEN:
+                        e = ValueError("No session open on this connection")
+                    self._send(writer, OP_ERROR, request_id, f"{type(e).__name__}: {e}".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                self.sessions.discard(session)
+                if session.steps:
+                    print(f"Session closed after {session.steps} batched steps "
+                          f"({session.step_time / session.steps * 1000:.2f} ms/step)")
+                session.close()
+            writer.close()
+
+def serve_environments(socket_path=None, host='127.0.0.1', port=5556):
+    server = EnvServer()
+    try:
+        asyncio.run(server.serve_forever(socket_path, host, port))
+    finally:
+        for session in list(server.sessions):
+            session.close()
+
+if __name__ == "__main__":
+    import sys
+    serve_environments(sys.argv[1] if len(sys.argv) > 1 else None)
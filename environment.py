@@ -1,202 +1,345 @@
-import pygame
-import random
-import numpy as np
-import math
-from constants import *
-from car import Car
-from track import Track
-
-class GameEnvironment:
-    def __init__(self, track_types=None):
-        if track_types is None:
-            track_types = [TrackType.OVAL, TrackType.RECTANGLE, 
-                          TrackType.L_TRACK, TrackType.U_TRACK]
-        
-        self.track_types = track_types
-        self.current_track_idx = 0
-        self.tracks = [Track(track_type, track_width=140) for track_type in track_types]
-        self.track = self.tracks[0]
-        
-        self.car = Car(self.track.start_position[0], 
-                      self.track.start_position[1],
-                      self.track.start_angle)
-        
-        self.episode_steps = 0
-        self.max_steps = 2000
-        self.done = False
-        self.render_mode = "human"
-        
-        self.best_lap_distance = {}
-        
-        self.total_episodes = 0
-        
-    def reset(self, random_track=True):
-        self.total_episodes += 1
-        
-        if random_track and len(self.tracks) > 1:
-            self.current_track_idx = random.randint(0, len(self.tracks) - 1)
-        
-        self.track = self.tracks[self.current_track_idx]
-        
-        start_x = self.track.start_position[0] + random.uniform(-10, 10)
-        start_y = self.track.start_position[1] + random.uniform(-10, 10)
-        start_angle = self.track.start_angle + random.uniform(-10, 10)
-        
-        self.car.reset(start_x, start_y, start_angle)
-        self.episode_steps = 0
-        self.done = False
-        
-        self.car.cast_sensors(self.track)
-        
-        safety_attempts = 0
-        while self.track.check_collision(self.car.get_corners()) and safety_attempts < 10:
-            self.car.x = self.track.start_position[0]
-            self.car.y = self.track.start_position[1]
-            self.car.angle = self.track.start_angle
-            self.car.cast_sensors(self.track)
-            safety_attempts += 1
-            
-        return self.get_state()
-        
-    def step(self, action):
-        self.episode_steps += 1
-        
-        prev_distance = self.car.distance_traveled
-        prev_avg_speed = self.car.avg_speed
-        
-        self.car.update(action=action)
-        
-        sensor_lines = self.car.cast_sensors(self.track)
-        
-        self.car.collided = self.track.check_collision(self.car.get_corners())
-        
-        reward = self.calculate_reward(prev_distance, prev_avg_speed)
-        
-        if self.car.collided:
-            self.done = True
-            
-        if self.car.stuck_counter > 50:
-            self.done = True
-            reward -= 5
-            
-        if self.episode_steps >= self.max_steps:
-            self.done = True
-            reward += 10
-            
-        return self.get_state(), reward, self.done
-        
-    def calculate_reward(self, prev_distance, prev_avg_speed):
-        reward = 0
-        
-        min_sensor = min(self.car.sensor_readings)
-        if min_sensor > 0.3:  
-            distance_delta = self.car.distance_traveled - prev_distance
-            reward += distance_delta * 0.5
-        
-        if min_sensor < 0.2:
-            reward -= 5.0
-        elif min_sensor < 0.4:
-            reward -= 1.0
-        else:
-            reward += 0.5  
-        
-        if min_sensor < 0.5 and self.car.speed > 3.0:
-            reward -= 2.0
-        
-        if self.car.collided:
-            reward -= 50  
-            
-        return reward
-        
-    def get_state(self):
-        state = []
-        
-        state.extend(self.car.sensor_readings)
-        
-        state.append(self.car.speed / self.car.max_speed)
-        
-        state.append(self.car.avg_speed / self.car.max_speed)
-        
-        angle_rad = math.radians(self.car.angle)
-        state.append(math.sin(angle_rad))
-        state.append(math.cos(angle_rad))
-        
-        front_sensors = self.car.sensor_readings[6:9]
-        state.append(sum(front_sensors) / len(front_sensors))
-        
-        left_avg = sum(self.car.sensor_readings[:5]) / 5
-        right_avg = sum(self.car.sensor_readings[-5:]) / 5
-        state.append(left_avg - right_avg)  
-        
-        state.append(1.0 if min(self.car.sensor_readings) < 0.2 else 0.0)
-        state.append(1.0 if self.car.sensor_readings[7] < 0.3 else 0.0)  
-        
-        state.append(min(1.0, self.car.stuck_counter / 20.0))
-        
-        return np.array(state, dtype=np.float32)
-        
-    def render(self, mode=None):
-        if mode is not None:
-            self.render_mode = mode
-            
-        if self.render_mode == "headless":
-            return True
-            
-        screen.fill(BLACK)
-        
-        self.track.draw(screen)
-        
-        sensor_lines = self.car.cast_sensors(self.track)
-        show_all_sensors = self.episode_steps < 60  
-        self.car.draw(screen, sensor_lines, show_all_sensors)
-        
-        font = pygame.font.SysFont(None, 24)
-        
-        track_text = font.render(f"Track: {self.track.track_type.value}", True, WHITE)
-        screen.blit(track_text, (10, 10))
-        
-        speed_text = font.render(f"Speed: {self.car.speed:.1f} / Avg: {self.car.avg_speed:.1f}", True, WHITE)
-        screen.blit(speed_text, (10, 40))
-        
-        dist_text = font.render(f"Distance: {self.car.distance_traveled:.0f}", True, WHITE)
-        screen.blit(dist_text, (10, 70))
-        
-        steps_text = font.render(f"Steps: {self.episode_steps}", True, WHITE)
-        screen.blit(steps_text, (10, 100))
-        
-        min_sensor = min(self.car.sensor_readings)
-        if min_sensor < 0.3:
-            warning_text = font.render(f"WARNING: Wall proximity {min_sensor:.2f}", True, ORANGE)
-            screen.blit(warning_text, (10, 130))
-        
-        if self.car.collided:
-            collision_text = font.render("COLLISION!", True, RED)
-            screen.blit(collision_text, (WIDTH//2 - 50, HEIGHT//2))
-            
-        if self.car.stuck_counter > 20:
-            stuck_text = font.render(f"STUCK: {self.car.stuck_counter}", True, YELLOW)
-            screen.blit(stuck_text, (10, 160))
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                return False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    return False
-                elif event.key == pygame.K_SPACE:
-                    paused = True
-                    while paused:
-                        for event in pygame.event.get():
-                            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                                paused = False
-                            elif event.type == pygame.QUIT:
-                                pygame.quit()
-                                return False
-                        clock.tick(30)
-                    
-        pygame.display.flip()
-        clock.tick(FPS)
-        
-        return True
\ No newline at end of file
+import pygame
+import random
+import numpy as np
+import math
+import time
+import weakref
+from constants import *
+from car import Car
+from track import Track
+from sensors import observation_layout
+from utils import crop_grid, egocentric_crops
+
+class GameEnvironment:
+    def __init__(self, track_types=None, incremental_sensing=False, track_pool=None, frame_stack=1,
+                 random_spawn=False, sensor_config=None, analytic_tracks=False, rng=None):
+        if track_types is None:
+            track_types = [TrackType.OVAL, TrackType.RECTANGLE, 
+                          TrackType.L_TRACK, TrackType.U_TRACK]
+        
+        self.track_types = track_types
+        self.current_track_idx = 0
+        self.tracks = [Track(track_type, track_width=140, analytic=analytic_tracks)
+                       for track_type in track_types]
+        self.track = self.tracks[0]
+        self.track_pool = track_pool
+        
+        self.car = Car(self.track.start_position[0], 
+                      self.track.start_position[1],
+                      self.track.start_angle)
+        self.car.incremental_sensing = incremental_sensing
+        self.sensor_config = sensor_config
+        self.car.configure_sensors(sensor_config)
+        self.observation_layout = observation_layout(sensor_config)
+        
+        self.episode_steps = 0
+        self.max_steps = 2000
+        self.done = False
+        self.truncated = False
+        self.render_mode = "human"
+        self.render_fps = FPS
+        self.last_render_time = 0.0
+        
+        self.best_lap_distance = {}
+        
+        self.total_episodes = 0
+        
+        self.frame_size = self.observation_layout['frame_size']
+        self.frame_stack = frame_stack
+        self.state_size = self.frame_size * frame_stack
+        self.frames = np.zeros((frame_stack, self.frame_size), dtype=np.float32)
+        
+        self.random_spawn = random_spawn
+        # Track, spawn and start jitter draws; the global random module
+        # unless the owner needs its own reproducible stream.
+        self.rng = random if rng is None else rng
+        self.spawn_spacing = 25.0
+        self.spawn_min_clearance = 0.2
+        self.spawn_tables = weakref.WeakKeyDictionary()
+        
+        self.occupancy_size = 64
+        self.occupancy_scale = 2.0
+        self.occupancy_grid = None
+        
+    def get_snapshot(self):
+        return {
+            'track': self.track,
+            'car': self.car.get_snapshot(),
+            'episode_steps': self.episode_steps,
+            'done': self.done,
+            'truncated': self.truncated,
+            'frames': self.frames.copy()
+        }
+        
+    def set_track(self, track):
+        # Keep the index in step so reset(random_track=False) stays on this
+        # track; pool-sampled tracks are not in the list and leave it alone.
+        self.track = track
+        if track in self.tracks:
+            self.current_track_idx = self.tracks.index(track)
+
+    def restore_snapshot(self, snapshot):
+        self.set_track(snapshot['track'])
+        self.car.restore_snapshot(snapshot['car'])
+        self.episode_steps = snapshot['episode_steps']
+        self.done = snapshot['done']
+        self.truncated = snapshot['truncated']
+        self.frames[:] = snapshot['frames']
+        return self.get_state()
+        
+    def get_spawn_table(self, track=None):
+        if track is None:
+            track = self.track
+        if track in self.spawn_tables:
+            return self.spawn_tables[track]
+            
+        saved = self.get_snapshot()
+        table = []
+        for x, y, angle, _ in track.get_spawn_poses(self.spawn_spacing):
+            self.track = track
+            self.car.reset(float(x), float(y), float(angle))
+            if track.check_collision(self.car.get_corners()):
+                continue
+            self.car.cast_sensors(track)
+            if min(self.car.sensor_readings) < self.spawn_min_clearance:
+                continue
+            self.episode_steps = 0
+            self.done = False
+            self.truncated = False
+            self.frames[:] = self.get_frame()
+            table.append(self.get_snapshot())
+        self.restore_snapshot(saved)
+        
+        self.spawn_tables[track] = table
+        return table
+        
+    def reset(self, random_track=True, spawn_index=None):
+        self.total_episodes += 1
+        
+        if self.track_pool is not None:
+            if random_track:
+                self.track = self.track_pool.sample()
+        else:
+            if random_track and len(self.tracks) > 1:
+                self.current_track_idx = self.rng.randint(0, len(self.tracks) - 1)
+            
+            self.track = self.tracks[self.current_track_idx]
+        
+        if spawn_index is not None or self.random_spawn:
+            table = self.get_spawn_table(self.track)
+            if table:
+                if spawn_index is None:
+                    spawn_index = self.rng.randrange(len(table))
+                state = self.restore_snapshot(table[spawn_index % len(table)])
+                self.car.lap_start_time = pygame.time.get_ticks()
+                return state
+        
+        start_x = self.track.start_position[0] + self.rng.uniform(-10, 10)
+        start_y = self.track.start_position[1] + self.rng.uniform(-10, 10)
+        start_angle = self.track.start_angle + self.rng.uniform(-10, 10)
+        
+        self.car.reset(start_x, start_y, start_angle)
+        self.episode_steps = 0
+        self.done = False
+        self.truncated = False
+        
+        self.car.cast_sensors(self.track)
+        
+        safety_attempts = 0
+        while self.track.check_collision(self.car.get_corners()) and safety_attempts < 10:
+            self.car.x = self.track.start_position[0]
+            self.car.y = self.track.start_position[1]
+            self.car.angle = self.track.start_angle
+            self.car.cast_sensors(self.track)
+            safety_attempts += 1
+            
+        self.frames[:] = self.get_frame()
+        return self.get_state()
+        
+    def step(self, action):
+        self.episode_steps += 1
+        
+        prev_distance = self.car.distance_traveled
+        prev_avg_speed = self.car.avg_speed
+        
+        self.car.update(action=action)
+        
+        sensor_lines = self.car.cast_sensors(self.track)
+        
+        self.car.collided = self.track.check_collision(self.car.get_corners())
+        
+        reward = self.calculate_reward(prev_distance, prev_avg_speed)
+        
+        if self.car.collided:
+            self.done = True
+            
+        if self.car.stuck_counter > 50:
+            self.done = True
+            reward -= 5
+            
+        if self.episode_steps >= self.max_steps:
+            self.truncated = not self.done
+            self.done = True
+            reward += 10
+            
+        self.frames[:-1] = self.frames[1:]
+        self.frames[-1] = self.get_frame()
+        return self.get_state(), reward, self.done
+        
+    def calculate_reward(self, prev_distance, prev_avg_speed, car=None):
+        if car is None:
+            car = self.car
+        reward = 0
+        
+        min_sensor = min(car.sensor_readings)
+        if min_sensor > 0.3:  
+            distance_delta = car.distance_traveled - prev_distance
+            reward += distance_delta * 0.5
+        
+        if min_sensor < 0.2:
+            reward -= 5.0
+        elif min_sensor < 0.4:
+            reward -= 1.0
+        else:
+            reward += 0.5  
+        
+        if min_sensor < 0.5 and car.speed > 3.0:
+            reward -= 2.0
+        
+        if car.collided:
+            reward -= 50  
+            
+        return reward
+        
+    def get_state(self):
+        if self.frame_stack == 1:
+            return self.frames[0].copy()
+        return self.frames.reshape(-1).copy()
+        
+    def get_occupancy(self):
+        return batch_occupancy([self])[0]
+        
+    def get_frame(self, car=None):
+        if car is None:
+            car = self.car
+        state = []
+        
+        state.extend(car.sensor_readings)
+        
+        state.append(car.speed / car.max_speed)
+        
+        state.append(car.avg_speed / car.max_speed)
+        
+        angle_rad = math.radians(car.angle)
+        state.append(math.sin(angle_rad))
+        state.append(math.cos(angle_rad))
+        
+        readings = car.sensor_readings
+        layout = self.observation_layout
+        front_sensors = [readings[i] for i in layout['front_window']]
+        state.append(sum(front_sensors) / len(front_sensors))
+        
+        left_avg = sum(readings[i] for i in layout['left_rays']) / len(layout['left_rays'])
+        right_avg = sum(readings[i] for i in layout['right_rays']) / len(layout['right_rays'])
+        state.append(left_avg - right_avg)  
+        
+        state.append(1.0 if min(readings) < 0.2 else 0.0)
+        state.append(1.0 if readings[layout['front']] < 0.3 else 0.0)  
+        
+        state.append(min(1.0, car.stuck_counter / 20.0))
+        
+        return np.array(state, dtype=np.float32)
+        
+    def render(self, mode=None):
+        if mode is not None:
+            self.render_mode = mode
+            
+        if self.render_mode == "headless":
+            return True
+            
+        if self.render_mode == "sampled":
+            now = time.perf_counter()
+            if now - self.last_render_time < 1.0 / self.render_fps:
+                return True
+            self.last_render_time = now
+            
+        self.draw(screen)
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    pygame.quit()
+                    return False
+                elif event.key == pygame.K_SPACE:
+                    paused = True
+                    while paused:
+                        for event in pygame.event.get():
+                            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                                paused = False
+                            elif event.type == pygame.QUIT:
+                                pygame.quit()
+                                return False
+                        clock.tick(30)
+                    
+        pygame.display.flip()
+        if self.render_mode == "human":
+            clock.tick(FPS)
+        
+        return True
+
+    def draw(self, surface):
+        surface.fill(BLACK)
+        
+        self.track.draw(surface)
+        
+        sensor_lines = self.car.cast_sensors(self.track)
+        show_all_sensors = self.episode_steps < 60  
+        self.car.draw(surface, sensor_lines, show_all_sensors)
+        
+        font = pygame.font.SysFont(None, 24)
+        
+        track_text = font.render(f"Track: {self.track.track_type.value}", True, WHITE)
+        surface.blit(track_text, (10, 10))
+        
+        speed_text = font.render(f"Speed: {self.car.speed:.1f} / Avg: {self.car.avg_speed:.1f}", True, WHITE)
+        surface.blit(speed_text, (10, 40))
+        
+        dist_text = font.render(f"Distance: {self.car.distance_traveled:.0f}", True, WHITE)
+        surface.blit(dist_text, (10, 70))
+        
+        steps_text = font.render(f"Steps: {self.episode_steps}", True, WHITE)
+        surface.blit(steps_text, (10, 100))
+        
+        min_sensor = min(self.car.sensor_readings)
+        if min_sensor < 0.3:
+            warning_text = font.render(f"WARNING: Wall proximity {min_sensor:.2f}", True, ORANGE)
+            surface.blit(warning_text, (10, 130))
+        
+        if self.car.collided:
+            collision_text = font.render("COLLISION!", True, RED)
+            surface.blit(collision_text, (WIDTH//2 - 50, HEIGHT//2))
+            
+        if self.car.stuck_counter > 20:
+            stuck_text = font.render(f"STUCK: {self.car.stuck_counter}", True, YELLOW)
+            surface.blit(stuck_text, (10, 160))
+
+def batch_occupancy(envs):
+    # Egocentric drivable-area crops for many cars; cars on the same track
+    # share one vectorized sampling pass over its raster.
+    env = envs[0]
+    if env.occupancy_grid is None or env.occupancy_grid[0] != (env.occupancy_size, env.occupancy_scale):
+        env.occupancy_grid = ((env.occupancy_size, env.occupancy_scale),
+                              crop_grid(env.occupancy_size, env.occupancy_scale))
+    grid = env.occupancy_grid[1]
+    
+    crops = np.zeros((len(envs), env.occupancy_size, env.occupancy_size), dtype=np.uint8)
+    by_track = {}
+    for i, other in enumerate(envs):
+        by_track.setdefault(other.track, []).append(i)
+    for track, indices in by_track.items():
+        poses = [(envs[i].car.x, envs[i].car.y, envs[i].car.angle) for i in indices]
+        crops[indices] = egocentric_crops(track.get_occupancy_mask(), poses, grid=grid)
+    return crops
\ No newline at end of file
@@ -0,0 +1,233 @@
+import os
+import json
+import multiprocessing as mp
+import numpy as np
+import pygame
+from constants import *
+from environment import GameEnvironment
+from track import Track
+
+class EpisodeRecorder:
+    def __init__(self, max_steps=2000):
+        self.max_steps = max_steps
+        # steer | accelerate, and the resulting x | y | angle for checking
+        # replays. float64 like the simulation, so replays are bit-exact.
+        self.actions = np.zeros((max_steps, 2), dtype=np.float64)
+        self.poses = np.zeros((max_steps, 3), dtype=np.float64)
+        self.steps = 0
+        self.meta = None
+        self.initial_frames = None
+
+    def start(self, env, seed=None):
+        track = env.track
+        self.meta = {
+            'version': 2,
+            'seed': seed,
+            'track_type': track.track_type.value,
+            'track_seed': track.seed,
+            'track_width': track.track_width,
+            'track_max_error': track.max_error,
+            'track_analytic': track.analytic,
+            'frame_stack': env.frame_stack,
+            'sensor_config': env.sensor_config,
+            'max_steps': env.max_steps,
+            'car': env.car.get_snapshot()
+        }
+        self.initial_frames = env.frames.copy()
+        self.steps = 0
+
+    def record(self, action, car):
+        if self.steps == self.max_steps:
+            return
+        i = self.steps
+        self.actions[i, 0] = action.get('steer', 0)
+        self.actions[i, 1] = action.get('accelerate', 0)
+        self.poses[i, 0] = car.x
+        self.poses[i, 1] = car.y
+        self.poses[i, 2] = car.angle
+        self.steps += 1
+
+    def save(self, filepath, **info):
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = dict(self.meta, steps=self.steps, **info)
+        np.savez_compressed(filepath, meta=np.array(json.dumps(meta)),
+                            frames=self.initial_frames,
+                            actions=self.actions[:self.steps],
+                            poses=self.poses[:self.steps])
+
+def load_episode(filepath):
+    with np.load(filepath) as data:
+        meta = json.loads(str(data['meta']))
+        return meta, data['frames'], data['actions'], data['poses']
+
+class EpisodePlayer:
+    def __init__(self, filepath, keyframe_interval=50):
+        self.filepath = filepath
+        self.meta, self.initial_frames, self.actions, self.poses = load_episode(filepath)
+        self.num_steps = len(self.actions)
+        self.keyframe_interval = keyframe_interval
+
+        track_type = TrackType(self.meta['track_type'])
+        # Recordings from before boundary simplification replay on the raw geometry.
+        track = Track(track_type, track_width=self.meta['track_width'], seed=self.meta['track_seed'],
+                      max_error=self.meta.get('track_max_error'),
+                      analytic=self.meta.get('track_analytic', False))
+        self.env = GameEnvironment([track_type], incremental_sensing=True,
+                                   frame_stack=self.meta['frame_stack'],
+                                   sensor_config=self.meta.get('sensor_config'))
+        self.env.tracks[0] = track
+        self.env.track = track
+        self.env.max_steps = self.meta['max_steps']
+        self.env.render_mode = "headless"
+        self.initial_snapshot = {
+            'track': track,
+            'car': self.meta['car'],
+            'episode_steps': 0,
+            'done': False,
+            'truncated': False,
+            'frames': self.initial_frames
+        }
+
+        # One headless pass rebuilds the episode and leaves snapshots behind
+        # so seeking never replays more than keyframe_interval steps.
+        self.keyframes = []
+        self.max_drift = 0.0
+        self.env.restore_snapshot(self.initial_snapshot)
+        for step in range(self.num_steps):
+            if step % keyframe_interval == 0:
+                self.keyframes.append(self.env.get_snapshot())
+            self._apply(step)
+            car = self.env.car
+            self.max_drift = max(self.max_drift, float(np.abs((car.x, car.y, car.angle) - self.poses[step]).max()))
+        # Version 1 recordings rounded actions and poses to float32, so only
+        # later ones are expected to replay exactly.
+        if self.max_drift > (1e-2 if self.meta.get('version', 1) < 2 else 0.0):
+            print(f"Warning: replay of {filepath} drifts {self.max_drift:.3g} from the recording")
+        self.step_index = self.num_steps
+
+    def _apply(self, step):
+        steer, accelerate = self.actions[step]
+        self.env.step({'steer': float(steer), 'accelerate': float(accelerate)})
+
+    def seek(self, step):
+        step = max(0, min(self.num_steps, step))
+        keyframe_idx = min(step // self.keyframe_interval, len(self.keyframes) - 1)
+        if keyframe_idx < 0:
+            self.env.restore_snapshot(self.initial_snapshot)
+            keyframe_step = 0
+        else:
+            self.env.restore_snapshot(self.keyframes[keyframe_idx])
+            keyframe_step = keyframe_idx * self.keyframe_interval
+        for i in range(keyframe_step, step):
+            self._apply(i)
+        self.step_index = step
+        return step
+
+    def advance(self, num_steps=1):
+        end = min(self.num_steps, self.step_index + num_steps)
+        for i in range(self.step_index, end):
+            self._apply(i)
+        self.step_index = end
+        return end < self.num_steps
+
+    def draw(self, surface):
+        self.env.draw(surface)
+        font = pygame.font.SysFont(None, 24)
+        replay_text = font.render(f"Replay: {self.step_index}/{self.num_steps}", True, LIGHT_BLUE)
+        surface.blit(replay_text, (WIDTH - 180, 10))
+
+    def play(self, speed=1.0, start=0):
+        self.seek(start)
+        paused = False
+        step_credit = 0.0
+        print("Replay controls: SPACE pause, LEFT/RIGHT seek, UP/DOWN speed, HOME restart, ESC exit")
+
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        return
+                    elif event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key == pygame.K_LEFT:
+                        self.seek(self.step_index - FPS)
+                    elif event.key == pygame.K_RIGHT:
+                        self.seek(self.step_index + FPS)
+                    elif event.key == pygame.K_UP:
+                        speed = min(speed * 2, 64.0)
+                    elif event.key == pygame.K_DOWN:
+                        speed = max(speed / 2, 0.125)
+                    elif event.key == pygame.K_HOME:
+                        self.seek(0)
+
+            if not paused and self.step_index < self.num_steps:
+                step_credit += speed
+                num_steps = int(step_credit)
+                step_credit -= num_steps
+                self.advance(num_steps)
+
+            self.draw(screen)
+            pygame.display.flip()
+            clock.tick(FPS)
+
+    def export_frames(self, output_dir, start=0, end=None, every=1):
+        os.makedirs(output_dir, exist_ok=True)
+        if end is None:
+            end = self.num_steps
+        surface = pygame.Surface((WIDTH, HEIGHT))
+        self.seek(start)
+        paths = []
+        while True:
+            self.draw(surface)
+            path = os.path.join(output_dir, f"frame_{self.step_index:05d}.png")
+            pygame.image.save(surface, path)
+            paths.append(path)
+            if self.step_index + every > end:
+                break
+            self.advance(every)
+        return paths
+
+def _export_task(task):
+    filepath, output_dir, start, end, every = task
+    player = EpisodePlayer(filepath)
+    return player.export_frames(output_dir, start, end, every)
+
+def export_episode_frames(filepaths, output_root, start=0, end=None, every=1, num_workers=None):
+    if isinstance(filepaths, str):
+        filepaths = [filepaths]
+    if num_workers is None:
+        num_workers = min(len(filepaths), os.cpu_count() or 1)
+
+    tasks = []
+    for filepath in filepaths:
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        tasks.append((filepath, os.path.join(output_root, name), start, end, every))
+
+    # Frames are drawn on offscreen surfaces, so workers never need a window.
+    prev_driver = os.environ.get("SDL_VIDEODRIVER")
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    try:
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(num_workers) as pool:
+            results = pool.map(_export_task, tasks)
+            # SDL swallows SIGTERM in the workers; see evaluate_model.
+            pool.close()
+            pool.join()
+    finally:
+        if prev_driver is None:
+            os.environ.pop("SDL_VIDEODRIVER", None)
+        else:
+            os.environ["SDL_VIDEODRIVER"] = prev_driver
+
+    print(f"Exported {sum(len(paths) for paths in results)} frames from {len(filepaths)} episodes "
+          f"to {output_root}")
+    return results
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        EpisodePlayer(sys.argv[1]).play()
@@ -0,0 +1,174 @@
+import os
+import json
+import random
+import time
+import multiprocessing as mp
+import numpy as np
+import torch
+from constants import *
+from environment import GameEnvironment
+from dqn_network import load_policy
+
+_worker_policy = None
+_worker_envs = {}
+
+def _init_worker(model_path, state_size):
+    global _worker_policy
+    torch.set_num_threads(1)
+    _worker_policy = load_policy(model_path, state_size)
+
+def _get_env(track_value):
+    if track_value not in _worker_envs:
+        env = GameEnvironment([TrackType(track_value)], incremental_sensing=True,
+                              frame_stack=_worker_policy.frame_stack,
+                              sensor_config=_worker_policy.sensor_config)
+        env.render_mode = "headless"
+        _worker_envs[track_value] = env
+    return _worker_envs[track_value]
+
+def _run_episode(task):
+    track_value, episode_idx, seed = task
+    random.seed(seed)
+    np.random.seed(seed % (2**32))
+    torch.manual_seed(seed)
+
+    env = _get_env(track_value)
+    state = env.reset(random_track=False)
+    total_reward = 0
+
+    while not env.done:
+        action, _ = _worker_policy.act(state)
+        state, reward, done = env.step(action)
+        total_reward += reward
+
+    return {
+        'track': track_value,
+        'episode': episode_idx,
+        'seed': seed,
+        'reward': total_reward,
+        'distance': env.car.distance_traveled,
+        'steps': env.episode_steps,
+        'completed': not env.car.collided
+    }
+
+def summarize_results(results):
+    summary = {}
+    by_track = {}
+    for result in results:
+        by_track.setdefault(result['track'], []).append(result)
+    by_track['all'] = list(results)
+
+    for track_value, track_results in by_track.items():
+        if not track_results:
+            continue
+        summary[track_value] = {
+            'episodes': len(track_results),
+            'success_rate': float(np.mean([r['completed'] for r in track_results])),
+            'avg_distance': float(np.mean([r['distance'] for r in track_results])),
+            'std_distance': float(np.std([r['distance'] for r in track_results])),
+            'avg_reward': float(np.mean([r['reward'] for r in track_results])),
+            'avg_steps': float(np.mean([r['steps'] for r in track_results]))
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"\n{'Track':<14}{'Episodes':>10}{'Success':>10}{'Distance':>12}{'Reward':>12}{'Steps':>10}")
+    for track_value, stats in summary.items():
+        print(f"{track_value:<14}{stats['episodes']:>10}"
+              f"{stats['success_rate'] * 100:>9.1f}%"
+              f"{stats['avg_distance']:>12.0f}"
+              f"{stats['avg_reward']:>12.2f}"
+              f"{stats['avg_steps']:>10.0f}")
+
+def evaluate_model(model_path='models/best_model.pt', track_types=None, episodes_per_track=100,
+                   num_workers=None, seed=0, state_size=24, report_path=None):
+    if not os.path.exists(model_path):
+        print(f"Model file {model_path} not found")
+        return None
+
+    if track_types is None:
+        track_types = list(TrackType)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    tasks = []
+    for track_idx, track_type in enumerate(track_types):
+        for episode_idx in range(episodes_per_track):
+            tasks.append((track_type.value, episode_idx, seed + track_idx * 100003 + episode_idx))
+
+    print(f"Evaluating {model_path} on {len(track_types)} tracks x {episodes_per_track} episodes "
+          f"with {num_workers} workers...")
+    start_time = time.time()
+
+    # Workers inherit the environment, so they never open a real window.
+    prev_driver = os.environ.get("SDL_VIDEODRIVER")
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    try:
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(num_workers, initializer=_init_worker,
+                      initargs=(model_path, state_size)) as pool:
+            chunksize = max(1, len(tasks) // (num_workers * 8))
+            results = list(pool.imap_unordered(_run_episode, tasks, chunksize=chunksize))
+            # SDL swallows SIGTERM in the workers, so let them exit on their own
+            # instead of relying on terminate() when the pool context closes.
+            pool.close()
+            pool.join()
+    finally:
+        if prev_driver is None:
+            os.environ.pop("SDL_VIDEODRIVER", None)
+        else:
+            os.environ["SDL_VIDEODRIVER"] = prev_driver
+
+    results.sort(key=lambda r: (r['track'], r['episode']))
+    summary = summarize_results(results)
+
+    print_summary(summary)
+    print(f"\nEvaluation finished in {time.time() - start_time:.1f}s")
+
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump({'model_path': model_path, 'seed': seed,
+                       'summary': summary, 'episodes': results}, f, indent=2)
+        print(f"Report saved to {report_path}")
+
+    return summary
+
+def record_states(policy, track_types=None, steps_per_track=500, epsilon=0.1, seed=0):
+    if track_types is None:
+        track_types = list(TrackType)
+    random.seed(seed)
+
+    states = []
+    for track_type in track_types:
+        env = GameEnvironment([track_type], incremental_sensing=True, frame_stack=policy.frame_stack,
+                              sensor_config=policy.sensor_config)
+        env.render_mode = "headless"
+        state = env.reset(random_track=False)
+        for _ in range(steps_per_track):
+            states.append(state)
+            action, _ = policy.act(state, epsilon)
+            state, _, done = env.step(action)
+            if done:
+                state = env.reset(random_track=False)
+    return np.array(states, dtype=np.float32)
+
+def policy_agreement(reference, policy, states):
+    with torch.no_grad():
+        ref_steer, ref_accel = reference(torch.from_numpy(states).to(reference.device))
+        steer, accel = policy(torch.from_numpy(states).to(policy.device))
+    steer_match = (ref_steer.argmax(1).cpu() == steer.argmax(1).cpu()).float()
+    accel_match = (ref_accel.argmax(1).cpu() == accel.argmax(1).cpu()).float()
+    return {
+        'steer': steer_match.mean().item(),
+        'accel': accel_match.mean().item(),
+        'both': (steer_match * accel_match).mean().item()
+    }
+
+def policy_latency(policy, states, num_calls=2000):
+    start_time = time.perf_counter()
+    for i in range(num_calls):
+        policy.act(states[i % len(states)])
+    return (time.perf_counter() - start_time) / num_calls
+
+if __name__ == "__main__":
+    evaluate_model()
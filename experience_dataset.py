@@ -0,0 +1,203 @@
+import os
+import json
+import shutil
+import random
+import numpy as np
+import torch
+from constants import TrackType, device
+
+COLUMN_DTYPES = {
+    'obs': None,
+    'next_obs': None,
+    'steer_idx': np.int8,
+    'accel_idx': np.int8,
+    'reward': np.float32,
+    'done': np.bool_,
+    'truncated': np.bool_,
+    'track': np.int16,
+    'episode': np.int64
+}
+
+TRACK_CODES = {track_type.value: code for code, track_type in enumerate(TrackType)}
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class ExperienceWriter:
+    def __init__(self, root, state_size=24, chunk_size=10000, obs_dtype=np.float32):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        os.makedirs(root, exist_ok=True)
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest['state_size'] != state_size:
+                raise ValueError(f"Dataset {root} stores state size {self.manifest['state_size']}, "
+                                 f"not {state_size}")
+        else:
+            self.manifest = {
+                'version': 1,
+                'state_size': state_size,
+                'obs_dtype': np.dtype(obs_dtype).name,
+                'track_codes': TRACK_CODES,
+                'next_episode': 0,
+                'num_transitions': 0,
+                'chunks': []
+            }
+            _write_json(self.manifest_path, self.manifest)
+
+        obs_dtype = np.dtype(self.manifest['obs_dtype'])
+        self.columns = {}
+        for name, dtype in COLUMN_DTYPES.items():
+            if dtype is None:
+                self.columns[name] = np.zeros((chunk_size, state_size), dtype=obs_dtype)
+            else:
+                self.columns[name] = np.zeros(chunk_size, dtype=dtype)
+        self.count = 0
+
+    def new_episode(self):
+        episode_id = self.manifest['next_episode']
+        self.manifest['next_episode'] += 1
+        return episode_id
+
+    def append(self, state, action_idx, reward, next_state, done, track_type, episode_id, truncated=False):
+        i = self.count
+        columns = self.columns
+        columns['obs'][i] = state
+        columns['next_obs'][i] = next_state
+        columns['steer_idx'][i] = action_idx[0]
+        columns['accel_idx'][i] = action_idx[1]
+        columns['reward'][i] = reward
+        columns['done'][i] = done
+        columns['truncated'][i] = truncated
+        columns['track'][i] = TRACK_CODES[TrackType(track_type).value]
+        columns['episode'][i] = episode_id
+        self.count += 1
+
+        if self.count == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+
+        # Chunks are written under a temporary name and renamed into place
+        # before the manifest lists them, so readers never see partial data.
+        chunk_name = f"chunk_{len(self.manifest['chunks']):06d}"
+        tmp_dir = os.path.join(self.root, f".{chunk_name}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), column[:self.count])
+        chunk_dir = os.path.join(self.root, chunk_name)
+        if os.path.exists(chunk_dir):
+            # Left behind by a writer that died before updating the manifest.
+            shutil.rmtree(chunk_dir)
+        os.replace(tmp_dir, chunk_dir)
+
+        self.manifest['chunks'].append({'name': chunk_name, 'rows': self.count})
+        self.manifest['num_transitions'] += self.count
+        _write_json(self.manifest_path, self.manifest)
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        _write_json(self.manifest_path, self.manifest)
+
+class ExperienceReader:
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.state_size = self.manifest['state_size']
+        self.track_types = {code: TrackType(value) for value, code in self.manifest['track_codes'].items()}
+
+    def __len__(self):
+        return self.manifest['num_transitions']
+
+    def load_chunk(self, chunk, columns=None):
+        if columns is None:
+            columns = COLUMN_DTYPES.keys()
+        chunk_dir = os.path.join(self.root, chunk['name'])
+        return {name: np.load(os.path.join(chunk_dir, f"{name}.npy"), mmap_mode='r') for name in columns}
+
+    def iter_chunks(self, columns=None, shuffle=False, seed=None):
+        chunks = list(self.manifest['chunks'])
+        if shuffle:
+            random.Random(seed).shuffle(chunks)
+        for chunk in chunks:
+            yield self.load_chunk(chunk, columns)
+
+    def fill_replay_buffer(self, agent, max_transitions=None):
+        # Episodes can end without a done flag, so the n-step window is
+        # flushed whenever the episode id changes rather than left to carry
+        # into the next episode.
+        added = 0
+        episode = None
+        for chunk in self.iter_chunks():
+            obs = chunk['obs']
+            next_obs = chunk['next_obs']
+            for i in range(len(obs)):
+                if max_transitions is not None and added >= max_transitions:
+                    agent.end_episode()
+                    return added
+                if chunk['episode'][i] != episode:
+                    agent.end_episode()
+                    episode = chunk['episode'][i]
+                agent.remember(np.asarray(obs[i], dtype=np.float32),
+                               [int(chunk['steer_idx'][i]), int(chunk['accel_idx'][i])],
+                               float(chunk['reward'][i]),
+                               np.asarray(next_obs[i], dtype=np.float32),
+                               bool(chunk['done'][i]), bool(chunk['truncated'][i]))
+                added += 1
+        agent.end_episode()
+        return added
+
+    def iter_batches(self, batch_size=64, gamma=0.99, shuffle=True, seed=None, drop_last=True):
+        rng = np.random.default_rng(seed)
+        for chunk in self.iter_chunks(shuffle=shuffle, seed=seed):
+            # One chunk in memory at a time; shuffling happens within it.
+            chunk = {name: np.asarray(column) for name, column in chunk.items()}
+            rows = len(chunk['reward'])
+            order = rng.permutation(rows) if shuffle else np.arange(rows)
+            for start in range(0, rows, batch_size):
+                idx = order[start:start + batch_size]
+                if drop_last and len(idx) < batch_size:
+                    break
+                # Time-limit ends still bootstrap, matching the replay buffer.
+                dones = chunk['done'][idx] & ~chunk['truncated'][idx]
+                yield {
+                    'states': torch.from_numpy(chunk['obs'][idx].astype(np.float32)).to(device),
+                    'next_states': torch.from_numpy(chunk['next_obs'][idx].astype(np.float32)).to(device),
+                    'rewards': torch.from_numpy(chunk['reward'][idx]).to(device),
+                    'dones': torch.from_numpy(dones.astype(np.float32)).to(device),
+                    'discounts': torch.full((len(idx),), gamma, device=device),
+                    'steer_actions': torch.from_numpy(chunk['steer_idx'][idx].astype(np.int64)).unsqueeze(1).to(device),
+                    'accel_actions': torch.from_numpy(chunk['accel_idx'][idx].astype(np.int64)).unsqueeze(1).to(device)
+                }
+
+def pretrain_agent(agent, dataset_dir, num_epochs=1, batch_size=None, seed=0):
+    reader = ExperienceReader(dataset_dir)
+    if reader.state_size != agent.state_size:
+        print(f"Dataset state size {reader.state_size} does not match agent state size {agent.state_size}")
+        return 0
+
+    batch_size = batch_size or agent.batch_size
+    # learn() decays epsilon per update; offline updates should not eat
+    # into the exploration schedule.
+    epsilon = agent.epsilon
+    updates = 0
+    for epoch in range(num_epochs):
+        losses = []
+        for minibatch in reader.iter_batches(batch_size, agent.gamma, seed=seed + epoch):
+            losses.append(agent.learn(minibatch))
+            updates += 1
+        if losses:
+            print(f"Pretrain epoch {epoch + 1}/{num_epochs} - {len(losses)} updates - "
+                  f"loss: {np.mean(losses):.4f}")
+    agent.epsilon = epsilon
+    return updates
@@ -0,0 +1,102 @@
+import os
+import signal
+import socket
+import struct
+import asyncio
+
+# Shared by the policy and environment servers. Only the standard library
+# is used so clients stay importable without pygame or torch.
+
+# Every message is: payload length | op | request id, followed by the payload.
+HEADER = struct.Struct('<IBI')
+OP_ERROR = 255
+
+class FramedClient:
+    server_name = "Server"
+    default_port = None
+
+    def __init__(self, socket_path=None, host='127.0.0.1', port=None):
+        if port is None:
+            port = self.default_port
+        if socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.next_id = 0
+
+    def _recv_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError(f"{self.server_name} closed the connection")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _request(self, op, payload=b''):
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) % 2**32
+        self.sock.sendall(HEADER.pack(len(payload), op, request_id) + payload)
+        length, reply_op, _ = HEADER.unpack(self._recv_exactly(HEADER.size))
+        reply = self._recv_exactly(length) if length else b''
+        if reply_op == OP_ERROR:
+            raise RuntimeError(reply.decode())
+        return reply
+
+class FramedServer:
+    server_name = "Server"
+    default_port = None
+
+    def __init__(self):
+        self.server = None
+        self.stopped = None
+        self.clients = {}
+
+    async def start(self, socket_path=None, host='127.0.0.1', port=None):
+        if port is None:
+            port = self.default_port
+        self.stopped = asyncio.Event()
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self.server = await asyncio.start_unix_server(self._serve_client, path=socket_path)
+            print(f"{self.server_name} listening on {socket_path}")
+        else:
+            self.server = await asyncio.start_server(self._serve_client, host, port)
+            print(f"{self.server_name} listening on {host}:{port}")
+        return self.server
+
+    async def serve_forever(self, socket_path=None, host='127.0.0.1', port=None):
+        await self.start(socket_path, host, port)
+        # pygame installs SDL's own SIGTERM handler, which swallows the
+        # signal, so both signals are routed to a clean stop here.
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopped.set)
+        try:
+            await self.stopped.wait()
+        finally:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.remove_signal_handler(sig)
+            await self.close()
+
+    async def close(self):
+        self.server.close()
+        # Closing a client's writer ends its handler at the next read.
+        for writer in self.clients.values():
+            writer.close()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _serve_client(self, reader, writer):
+        self.clients[asyncio.current_task()] = writer
+        try:
+            await self._handle_client(reader, writer)
+        finally:
+            self.clients.pop(asyncio.current_task(), None)
+
+    def _send(self, writer, op, request_id, payload=b''):
+        if not writer.is_closing():
+            writer.write(HEADER.pack(len(payload), op, request_id) + payload)
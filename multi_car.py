@@ -0,0 +1,291 @@
+import math
+import random
+import pygame
+import numpy as np
+from constants import *
+from car import Car
+from environment import GameEnvironment
+from utils import ray_segment_hits, convex_polygons_overlap
+
+# present, forward, lateral, sin and cos of the relative heading, speed
+NEIGHBOR_FEATURES = 6
+
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def rebuild(self, indices, positions):
+        self.cells = {}
+        inv_size = 1.0 / self.cell_size
+        for i, (x, y) in zip(indices, positions):
+            self.cells.setdefault((math.floor(x * inv_size), math.floor(y * inv_size)), []).append(i)
+
+    def query(self, x, y, radius):
+        inv_size = 1.0 / self.cell_size
+        x0, x1 = math.floor((x - radius) * inv_size), math.floor((x + radius) * inv_size)
+        y0, y1 = math.floor((y - radius) * inv_size), math.floor((y + radius) * inv_size)
+        found = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                found.extend(self.cells.get((cx, cy), ()))
+        return found
+
+class MultiCarEnvironment(GameEnvironment):
+    def __init__(self, num_cars=8, track_types=None, incremental_sensing=False, track_pool=None, frame_stack=1,
+                 sensor_config=None, neighbor_slots=3, lanes=2, use_spatial_hash=True, analytic_tracks=False):
+        super().__init__(track_types, incremental_sensing, track_pool, frame_stack, sensor_config=sensor_config,
+                         analytic_tracks=analytic_tracks)
+        self.num_cars = num_cars
+        self.cars = [self.car]
+        for _ in range(num_cars - 1):
+            car = Car(self.track.start_position[0], self.track.start_position[1], self.track.start_angle)
+            car.incremental_sensing = incremental_sensing
+            car.configure_sensors(sensor_config)
+            self.cars.append(car)
+
+        self.neighbor_slots = neighbor_slots
+        self.lanes = lanes
+        self.car_radius = math.hypot(*CAR_SIZE) / 2
+        # Anything a ray can touch lies within this radius, so one hash with
+        # this cell size answers both the sensing and the collision queries
+        # from the 3x3 block of cells around a car.
+        self.sensing_radius = self.car.sensor_length + self.car_radius
+        self.spatial_hash = SpatialHash(self.sensing_radius)
+        self.use_spatial_hash = use_spatial_hash
+
+        self.frame_size = self.observation_layout['frame_size'] + NEIGHBOR_FEATURES * neighbor_slots
+        self.state_size = self.frame_size * frame_stack
+        self.frames = np.zeros((num_cars, frame_stack, self.frame_size), dtype=np.float32)
+        self.dones = np.zeros(num_cars, dtype=bool)
+        self.truncated = np.zeros(num_cars, dtype=bool)
+        self.neighbors = [[] for _ in range(num_cars)]
+        self.car_collisions = 0
+
+    def get_snapshot(self):
+        return {
+            'track': self.track,
+            'cars': [car.get_snapshot() for car in self.cars],
+            'episode_steps': self.episode_steps,
+            'done': self.done,
+            'dones': self.dones.copy(),
+            'truncated': self.truncated.copy(),
+            'neighbors': [list(nearby) for nearby in self.neighbors],
+            'frames': self.frames.copy()
+        }
+
+    def restore_snapshot(self, snapshot):
+        self.set_track(snapshot['track'])
+        for car, car_snapshot in zip(self.cars, snapshot['cars']):
+            car.restore_snapshot(car_snapshot)
+        self.episode_steps = snapshot['episode_steps']
+        self.done = snapshot['done']
+        self.dones[:] = snapshot['dones']
+        self.truncated[:] = snapshot['truncated']
+        self.neighbors = [list(nearby) for nearby in snapshot['neighbors']]
+        self.frames[:] = snapshot['frames']
+        return self.get_state()
+
+    def get_spawn_table(self, track=None):
+        # Start slots in every lane along the centerline; unlike the
+        # single-car table only poses are kept since cars are placed together.
+        if track is None:
+            track = self.track
+        if track in self.spawn_tables:
+            return self.spawn_tables[track]
+
+        probe = Car(0, 0)
+        probe.configure_sensors(self.sensor_config)
+        lane_offsets = (np.arange(self.lanes) - (self.lanes - 1) / 2) * track.track_width / (self.lanes + 1)
+        table = []
+        for x, y, angle, _ in track.get_spawn_poses(self.spawn_spacing):
+            rad_angle = math.radians(angle)
+            for offset in lane_offsets:
+                lane_x = float(x + offset * math.cos(rad_angle))
+                lane_y = float(y + offset * math.sin(rad_angle))
+                probe.reset(lane_x, lane_y, float(angle))
+                if track.check_collision(probe.get_corners()):
+                    continue
+                probe.cast_sensors(track)
+                if min(probe.sensor_readings) < self.spawn_min_clearance:
+                    continue
+                table.append((lane_x, lane_y, float(angle)))
+
+        self.spawn_tables[track] = table
+        return table
+
+    def reset(self, random_track=True):
+        self.total_episodes += 1
+
+        if self.track_pool is not None:
+            if random_track:
+                self.track = self.track_pool.sample()
+        else:
+            if random_track and len(self.tracks) > 1:
+                self.current_track_idx = random.randint(0, len(self.tracks) - 1)
+            self.track = self.tracks[self.current_track_idx]
+
+        # Spread the cars evenly around the lap, then fill any gaps from the
+        # remaining slots, never letting two cars start overlapping.
+        table = self.get_spawn_table(self.track)
+        offset = random.randrange(len(table)) if table else 0
+        preferred = [(offset + int(k * len(table) / self.num_cars)) % len(table) for k in range(self.num_cars)]
+        order = preferred + [(offset + k) % len(table) for k in range(len(table))]
+        placed = []
+        taken = set()
+        min_gap = 2 * self.car_radius
+        for slot in order:
+            if len(placed) == self.num_cars:
+                break
+            if slot in taken:
+                continue
+            x, y, _ = table[slot]
+            if all(math.hypot(x - px, y - py) > min_gap for px, py, _ in placed):
+                placed.append(table[slot])
+                taken.add(slot)
+        if len(placed) < self.num_cars:
+            raise ValueError(f"Track {self.track.track_type.value} only has room for {len(placed)} cars, "
+                             f"{self.num_cars} requested")
+
+        lap_start_time = pygame.time.get_ticks()
+        for car, (x, y, angle) in zip(self.cars, placed):
+            car.reset(x, y, angle)
+            car.lap_start_time = lap_start_time
+        self.episode_steps = 0
+        self.done = False
+        self.dones[:] = False
+        self.truncated[:] = False
+
+        active = list(range(self.num_cars))
+        self.sense(active)
+        for i in active:
+            self.frames[i] = self.get_car_frame(i)
+        return self.get_state()
+
+    def sense(self, indices):
+        cars = self.cars
+        for i in indices:
+            cars[i].cast_sensors(self.track)
+            cars[i].collided = self.track.check_collision(cars[i].get_corners())
+        self.interact_cars(indices)
+
+    def interact_cars(self, indices):
+        cars = self.cars
+        self.spatial_hash.rebuild(indices, [(cars[i].x, cars[i].y) for i in indices])
+        corners = {i: np.array(cars[i].get_corners()) for i in indices}
+        contact_distance = 2 * self.car_radius
+        for i in indices:
+            car = cars[i]
+            if self.use_spatial_hash:
+                candidates = self.spatial_hash.query(car.x, car.y, self.sensing_radius)
+            else:
+                candidates = indices
+            nearby = []
+            for j in candidates:
+                if j == i:
+                    continue
+                other = cars[j]
+                distance = math.hypot(other.x - car.x, other.y - car.y)
+                if distance > self.sensing_radius:
+                    continue
+                nearby.append((distance, j))
+                # Each pair is tested once, from its lower index.
+                if j > i and distance < contact_distance and convex_polygons_overlap(corners[i], corners[j]):
+                    car.collided = True
+                    other.collided = True
+                    self.car_collisions += 1
+            nearby.sort()
+            self.neighbors[i] = [j for _, j in nearby]
+            if nearby:
+                self.sense_cars(car, [corners[j] for _, j in nearby])
+
+    def sense_cars(self, car, corner_sets):
+        # Other cars block the rays like walls do.
+        edges = []
+        for points in corner_sets:
+            edges.append(np.hstack([points, np.roll(points, -1, axis=0)]))
+        angles = math.radians(car.angle) + car.sensor_offsets
+        hits = ray_segment_hits(car.x, car.y, car.sensor_length * np.sin(angles),
+                                -car.sensor_length * np.cos(angles), np.concatenate(edges))
+        car.sensor_readings = np.minimum(car.sensor_readings, hits).tolist()
+
+    def get_neighbor_features(self, i):
+        car = self.cars[i]
+        rad_angle = math.radians(car.angle)
+        forward = (math.sin(rad_angle), -math.cos(rad_angle))
+        right = (math.cos(rad_angle), math.sin(rad_angle))
+        features = np.zeros((self.neighbor_slots, NEIGHBOR_FEATURES), dtype=np.float32)
+        for slot, j in enumerate(self.neighbors[i][:self.neighbor_slots]):
+            other = self.cars[j]
+            dx = other.x - car.x
+            dy = other.y - car.y
+            relative_angle = math.radians(other.angle - car.angle)
+            features[slot] = (1.0,
+                              (dx * forward[0] + dy * forward[1]) / self.sensing_radius,
+                              (dx * right[0] + dy * right[1]) / self.sensing_radius,
+                              math.sin(relative_angle),
+                              math.cos(relative_angle),
+                              other.speed / other.max_speed)
+        return features.reshape(-1)
+
+    def get_car_frame(self, i):
+        return np.concatenate([self.get_frame(self.cars[i]), self.get_neighbor_features(i)])
+
+    def step(self, actions):
+        self.episode_steps += 1
+        active = np.flatnonzero(~self.dones).tolist()
+
+        previous = {}
+        for i in active:
+            car = self.cars[i]
+            previous[i] = (car.distance_traveled, car.avg_speed)
+            car.update(action=actions[i])
+
+        self.sense(active)
+
+        rewards = np.zeros(self.num_cars, dtype=np.float32)
+        for i in active:
+            car = self.cars[i]
+            reward = self.calculate_reward(*previous[i], car=car)
+            done = car.collided
+            if car.stuck_counter > 50:
+                done = True
+                reward -= 5
+            if self.episode_steps >= self.max_steps:
+                self.truncated[i] = not done
+                done = True
+                reward += 10
+            rewards[i] = reward
+            self.dones[i] = done
+
+            self.frames[i, :-1] = self.frames[i, 1:]
+            self.frames[i, -1] = self.get_car_frame(i)
+
+        self.done = bool(self.dones.all())
+        return self.get_state(), rewards, self.dones.copy()
+
+    def get_state(self):
+        return self.frames.reshape(self.num_cars, -1).copy()
+
+    def draw(self, surface):
+        surface.fill(BLACK)
+        self.track.draw(surface)
+
+        # Sensors are only drawn for the first car to keep the view readable.
+        angles = math.radians(self.car.angle) + self.car.sensor_offsets
+        ends = zip((self.car.x + self.car.sensor_length * np.sin(angles)).tolist(),
+                   (self.car.y - self.car.sensor_length * np.cos(angles)).tolist())
+        sensor_lines = [((self.car.x, self.car.y), end) for end in ends]
+        for i, car in enumerate(self.cars):
+            if not self.dones[i]:
+                car.draw(surface, sensor_lines if i == 0 else None)
+
+        font = pygame.font.SysFont(None, 24)
+        track_text = font.render(f"Track: {self.track.track_type.value}", True, WHITE)
+        surface.blit(track_text, (10, 10))
+        cars_text = font.render(f"Cars: {self.num_cars - int(self.dones.sum())} / {self.num_cars}", True, WHITE)
+        surface.blit(cars_text, (10, 40))
+        steps_text = font.render(f"Steps: {self.episode_steps}", True, WHITE)
+        surface.blit(steps_text, (10, 70))
+        crash_text = font.render(f"Car-car collisions: {self.car_collisions}", True, WHITE)
+        surface.blit(crash_text, (10, 100))
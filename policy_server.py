@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import struct
+import asyncio
+from collections import deque
+import numpy as np
+from dqn_network import load_policy
+from framing import HEADER, OP_ERROR, FramedClient, FramedServer
+
+OP_ACT = 1
+OP_STATS = 2
+OP_SHUTDOWN = 3
+ACT_REQUEST = struct.Struct('<f')
+ACT_REPLY = struct.Struct('<ffBB')
+
+class PolicyServer(FramedServer):
+    server_name = "Policy server"
+    default_port = 5555
+
+    def __init__(self, model_path, state_size=24, max_batch=64, max_delay=0.002, reload_interval=1.0):
+        super().__init__()
+        self.model_path = model_path
+        self.state_size = state_size
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.reload_interval = reload_interval
+        self.policy = load_policy(model_path, state_size)
+        self.model_mtime = os.path.getmtime(model_path)
+        self.queue = None
+        self.connections = 0
+
+        self.start_time = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.reloads = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=10000)
+        self.batch_sizes = deque(maxlen=10000)
+
+    async def start(self, socket_path=None, host='127.0.0.1', port=None):
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._batch_loop()),
+                      asyncio.create_task(self._reload_loop())]
+        return await super().start(socket_path, host, port)
+
+    async def close(self):
+        await super().close()
+        for task in self.tasks:
+            task.cancel()
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                length, op, request_id = HEADER.unpack(header)
+                payload = await reader.readexactly(length) if length else b''
+                received = time.perf_counter()
+
+                if op == OP_ACT:
+                    # Checked before np.frombuffer, which raises on a payload
+                    # that is not whole floats.
+                    expected = ACT_REQUEST.size + 4 * self.policy.input_dim
+                    if length != expected:
+                        self._send(writer, OP_ERROR, request_id,
+                                   f"Expected a {expected} byte ACT payload, got {length}".encode())
+                        await writer.drain()
+                        continue
+                    state = np.frombuffer(payload, dtype=np.float32, offset=ACT_REQUEST.size)
+                    epsilon, = ACT_REQUEST.unpack_from(payload)
+                    future = asyncio.get_running_loop().create_future()
+                    # Clients may pipeline requests; replies carry the request id.
+                    future.add_done_callback(
+                        lambda f, request_id=request_id, received=received:
+                            self._reply_act(writer, request_id, received, f))
+                    self.queue.put_nowait((state, epsilon, future))
+                elif op == OP_STATS:
+                    self._send(writer, OP_STATS, request_id, json.dumps(self.stats()).encode())
+                elif op == OP_SHUTDOWN:
+                    self._send(writer, OP_SHUTDOWN, request_id)
+                    await writer.drain()
+                    self.stopped.set()
+                    break
+                else:
+                    self._send(writer, OP_ERROR, request_id, f"Unknown op {op}".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _reply_act(self, writer, request_id, received, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.errors += 1
+            self._send(writer, OP_ERROR, request_id, str(future.exception()).encode())
+            return
+        action, (steer_idx, accel_idx) = future.result()
+        self._send(writer, OP_ACT, request_id,
+                   ACT_REPLY.pack(action['steer'], action['accelerate'], steer_idx, accel_idx))
+        self.latencies.append(time.perf_counter() - received)
+        self.requests += 1
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # Wait up to max_delay for more requests to share the forward pass,
+            # but not once every connected client already has one queued.
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch and len(batch) < self.connections:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self.queue.get_nowait())
+
+            states = np.stack([state for state, _, _ in batch])
+            epsilons = [epsilon for _, epsilon, _ in batch]
+            try:
+                results = self.policy.act_batch(states, epsilons)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+
+    async def _reload_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                mtime = os.path.getmtime(self.model_path)
+            except OSError:
+                continue
+            if mtime == self.model_mtime:
+                continue
+            # Load off the event loop so requests keep being served by the
+            # old policy; the swap happens between two batches.
+            try:
+                policy = await loop.run_in_executor(None, load_policy, self.model_path, self.state_size)
+            except Exception as e:
+                print(f"Failed to reload {self.model_path}: {e}")
+                continue
+            self.policy = policy
+            self.model_mtime = mtime
+            self.reloads += 1
+            print(f"Reloaded policy from {self.model_path}")
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'reloads': self.reloads,
+            'errors': self.errors,
+            'requests_per_sec': self.requests / elapsed if elapsed > 0 else 0.0,
+            'avg_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'latency_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0
+        }
+
+class PolicyClient(FramedClient):
+    server_name = "Policy server"
+    default_port = 5555
+
+    def act(self, state, epsilon=0.0):
+        payload = ACT_REQUEST.pack(epsilon) + np.asarray(state, dtype=np.float32).tobytes()
+        steer, accel, steer_idx, accel_idx = ACT_REPLY.unpack(self._request(OP_ACT, payload))
+        return {'steer': steer, 'accelerate': accel}, [steer_idx, accel_idx]
+
+    def stats(self):
+        return json.loads(self._request(OP_STATS).decode())
+
+    def shutdown_server(self):
+        self._request(OP_SHUTDOWN)
+
+    def close(self):
+        self.sock.close()
+
+def serve_policy(model_path='models/best_model.pt', socket_path=None, host='127.0.0.1', port=5555,
+                 max_batch=64, max_delay=0.002):
+    if not os.path.exists(model_path):
+        print(f"Model file {model_path} not found")
+        return
+    server = PolicyServer(model_path, max_batch=max_batch, max_delay=max_delay)
+    asyncio.run(server.serve_forever(socket_path, host, port))
+    print(f"\nServer stats: {server.stats()}")
+
+if __name__ == "__main__":
+    serve_policy()
@@ -0,0 +1,204 @@
+import math
+import numpy as np
+from utils import ray_segment_fractions
+
+# Boundary pieces with closed-form queries. intersect() takes segments
+# starting at (x, y) along (dx, dy), all broadcastable arrays, and returns
+# the first hit as a fraction of the segment, inf where there is none;
+# intersect_many() does the same against a packed array of primitives.
+
+class LineSegment:
+    def __init__(self, x1, y1, x2, y2):
+        self.start = (x1, y1)
+        self.end = (x2, y2)
+
+    def intersect(self, x, y, dx, dy):
+        return LineSegment.intersect_many(np.array([self.start + self.end]), x, y, dx, dy)[..., 0]
+
+    @staticmethod
+    def intersect_many(lines, x, y, dx, dy):
+        # lines is (M, 4); the trailing axis of the result runs over lines.
+        x, y, dx, dy = (np.asarray(v, dtype=np.float64)[..., None] for v in (x, y, dx, dy))
+        return ray_segment_fractions(x, y, dx, dy, *lines.T)
+
+    def distance(self, x, y):
+        x1, y1 = self.start
+        dx = self.end[0] - x1
+        dy = self.end[1] - y1
+        length_sq = dx * dx + dy * dy
+        t = 0.0 if length_sq < 1e-12 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length_sq))
+        return math.hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+    def tessellate(self, max_error):
+        return [self.start]
+
+class EllipticalArc:
+    # Axis-aligned; angles are the ellipse parameter in radians, and the arc
+    # runs from start through a non-negative sweep in that parameter.
+    def __init__(self, cx, cy, rx, ry, start=0.0, sweep=2 * math.pi):
+        self.center = (cx, cy)
+        self.rx = rx
+        self.ry = ry
+        self.start = start
+        self.sweep = sweep
+
+    def contains_angle(self, angle):
+        if self.sweep >= 2 * math.pi:
+            return np.ones(np.shape(angle), dtype=bool)
+        return (angle - self.start) % (2 * math.pi) <= self.sweep + 1e-12
+
+    def intersect(self, x, y, dx, dy):
+        arc = np.array([self.center + (self.rx, self.ry, self.start, self.sweep)])
+        return EllipticalArc.intersect_many(arc, x, y, dx, dy)[..., 0]
+
+    @staticmethod
+    def intersect_many(arcs, x, y, dx, dy):
+        # arcs is (M, 6) of cx, cy, rx, ry, start, sweep. In coordinates
+        # scaled to the unit circle the hit is a quadratic.
+        cx, cy, rx, ry, start, sweep = arcs.T
+        x, y, dx, dy = (np.asarray(v, dtype=np.float64)[..., None] for v in (x, y, dx, dy))
+        ox = (x - cx) / rx
+        oy = (y - cy) / ry
+        ux = dx / rx
+        uy = dy / ry
+        a = ux * ux + uy * uy
+        b = 2 * (ox * ux + oy * uy)
+        c = ox * ox + oy * oy - 1
+        discriminant = b * b - 4 * a * c
+        root = np.sqrt(np.maximum(discriminant, 0.0))
+        full = sweep >= 2 * math.pi
+        best = np.full(np.broadcast(ox, ux).shape, np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for t in ((-b - root) / (2 * a), (-b + root) / (2 * a)):
+                hit = (discriminant >= 0) & (t >= 0) & (t <= 1)
+                if not full.all():
+                    angle = np.arctan2(oy + t * uy, ox + t * ux)
+                    hit &= full | ((angle - start) % (2 * math.pi) <= sweep + 1e-12)
+                best = np.where(hit & (t < best), t, best)
+        return best
+
+    def point(self, angle):
+        return (self.center[0] + self.rx * math.cos(angle), self.center[1] + self.ry * math.sin(angle))
+
+    def distance(self, x, y):
+        # Distance to the whole ellipse, which for a partial arc is a lower
+        # bound; that is all the collision culling needs. The nearest point
+        # has no closed form; it is found by bisecting for the root of
+        # Eberly's one-dimensional equation, with the query point folded
+        # into the first quadrant.
+        cx, cy = self.center
+        px = abs(x - cx)
+        py = abs(y - cy)
+        a, b = self.rx, self.ry
+        if a < b:
+            a, b, px, py = b, a, py, px
+        if py > 0:
+            if px > 0:
+                z0 = px / a
+                z1 = py / b
+                g = z0 * z0 + z1 * z1 - 1
+                ratio = (a / b) ** 2
+                n0 = ratio * z0
+                s0 = z1 - 1
+                s1 = 0.0 if g < 0 else math.hypot(n0, z1) - 1
+                s = 0.0
+                for _ in range(200):
+                    s = (s0 + s1) / 2
+                    if s == s0 or s == s1:
+                        break
+                    g = (n0 / (s + ratio)) ** 2 + (z1 / (s + 1)) ** 2 - 1
+                    if g > 0:
+                        s0 = s
+                    elif g < 0:
+                        s1 = s
+                    else:
+                        break
+                qx = ratio * px / (s + ratio)
+                qy = py / (s + 1)
+            else:
+                qx, qy = 0.0, b
+        else:
+            numerator = a * px
+            denominator = a * a - b * b
+            if numerator < denominator:
+                ratio = numerator / denominator
+                qx, qy = a * ratio, b * math.sqrt(1 - ratio * ratio)
+            else:
+                qx, qy = a, 0.0
+        return math.hypot(qx - px, qy - py)
+
+    def tessellate(self, max_error):
+        # A chord strays from the curve by at most max(rx, ry) * (1 - cos(step / 2))
+        # for a step of the ellipse parameter. The end point is left to the
+        # next piece.
+        radius = max(self.rx, self.ry)
+        step = 2 * math.acos(max(1 - max_error / radius, -1.0))
+        count = max(int(math.ceil(self.sweep / step)), 1)
+        if self.sweep >= 2 * math.pi:
+            count = max(count, 3)
+        return [self.point(self.start + self.sweep * i / count) for i in range(count)]
+
+class CircularArc(EllipticalArc):
+    def __init__(self, cx, cy, radius, start=0.0, sweep=2 * math.pi):
+        super().__init__(cx, cy, radius, radius, start, sweep)
+
+    def distance(self, x, y):
+        cx, cy = self.center
+        angle = math.atan2(y - cy, x - cx)
+        if self.contains_angle(angle):
+            return abs(math.hypot(x - cx, y - cy) - self.rx)
+        end = self.start + self.sweep
+        return min(math.hypot(x - ex, y - ey) for ex, ey in (self.point(self.start), self.point(end)))
+
+def offset_polygon(vertices, distance):
+    # Pieces for a convex polygon offset by distance, outward when positive,
+    # running counterclockwise in (x, y). Outward the shifted edges are
+    # joined by arcs around each vertex; inward they meet where the shifted
+    # edges cross, as long as no edge is shorter than the offset eats.
+    vertices = np.asarray(vertices, dtype=np.float64)
+    x, y = vertices[:, 0], vertices[:, 1]
+    if np.dot(x, np.roll(y, -1)) < np.dot(y, np.roll(x, -1)):
+        vertices = vertices[::-1]
+    edges = np.roll(vertices, -1, axis=0) - vertices
+    edges /= np.hypot(edges[:, 0], edges[:, 1])[:, None]
+    normals = np.column_stack((edges[:, 1], -edges[:, 0]))
+    previous = np.roll(normals, 1, axis=0)
+    if distance < 0:
+        corners = vertices + distance * (previous + normals) / (1 + (previous * normals).sum(axis=1))[:, None]
+        return [LineSegment(*corners[i], *corners[(i + 1) % len(corners)]) for i in range(len(corners))]
+
+    pieces = []
+    for i, (x, y) in enumerate(vertices):
+        before = math.atan2(previous[i, 1], previous[i, 0])
+        after = math.atan2(normals[i, 1], normals[i, 0])
+        pieces.append(CircularArc(x, y, distance, before, (after - before) % (2 * math.pi)))
+        x1, y1 = vertices[i] + distance * normals[i]
+        x2, y2 = vertices[(i + 1) % len(vertices)] + distance * normals[i]
+        pieces.append(LineSegment(x1, y1, x2, y2))
+    return pieces
+
+def tessellate_primitives(primitives, max_error):
+    # A closed polyline within max_error of pieces that run end to end.
+    points = []
+    for primitive in primitives:
+        points.extend(primitive.tessellate(max_error))
+    return [(float(x), float(y)) for x, y in points]
+
+def pack_primitives(primitives):
+    # Lines and arcs as flat arrays so a whole ray fan is tested against
+    # each kind in one pass instead of one call per primitive.
+    lines = [p.start + p.end for p in primitives if isinstance(p, LineSegment)]
+    arcs = [p.center + (p.rx, p.ry, p.start, p.sweep) for p in primitives if isinstance(p, EllipticalArc)]
+    return (np.array(lines, dtype=np.float64).reshape(-1, 4),
+            np.array(arcs, dtype=np.float64).reshape(-1, 6))
+
+def nearest_hits(packed, x, y, dx, dy):
+    # Nearest hit along each ray from (x, y), as a fraction of the ray and
+    # 1.0 where nothing is hit.
+    lines, arcs = packed
+    hits = np.ones(np.shape(dx))
+    if len(lines):
+        hits = np.minimum(hits, LineSegment.intersect_many(lines, x, y, dx, dy).min(axis=1))
+    if len(arcs):
+        hits = np.minimum(hits, EllipticalArc.intersect_many(arcs, x, y, dx, dy).min(axis=1))
+    return hits
@@ -0,0 +1,280 @@
+import numpy as np
+import torch
+from collections import deque
+from constants import device
+
+class ReplayStorage:
+    def __init__(self, capacity, state_size, state_dtype=np.float32, obs_capacity=None, frame_stack=1):
+        if obs_capacity is None:
+            obs_capacity = 2 * capacity
+        self.capacity = capacity
+        self.obs_capacity = obs_capacity
+        self.state_size = state_size
+        self.frame_stack = frame_stack
+        self.frame_size = state_size // frame_stack
+        self.state_dtype = np.dtype(state_dtype)
+        # Each frame is stored once; transitions point at the newest frame of
+        # their state and stacks are rebuilt from the frames before it.
+        # float16 halves observation RAM again.
+        self.obs = np.zeros((obs_capacity, self.frame_size), dtype=self.state_dtype)
+        # steer_idx | accel_idx | reward | done | discount, always float32
+        self.scalars = np.zeros((capacity, 5), dtype=np.float32)
+        # state row | bootstrap row in obs
+        self.obs_rows = np.zeros((capacity, 2), dtype=np.int64)
+        self.obs_tensor = torch.from_numpy(self.obs)
+        self.scalars_tensor = torch.from_numpy(self.scalars)
+        self.obs_rows_tensor = torch.from_numpy(self.obs_rows)
+
+class ReplayBuffer:
+    def __init__(self, capacity, state_size, storage=None, offset=0, obs_capacity=None, obs_offset=0,
+                 frame_stack=1):
+        if obs_capacity is None:
+            obs_capacity = capacity + capacity // 8 + 2 * frame_stack
+        if storage is None:
+            storage = ReplayStorage(capacity, state_size, obs_capacity=obs_capacity, frame_stack=frame_stack)
+        self.capacity = capacity
+        self.state_size = state_size
+        self.frame_stack = storage.frame_stack
+        self.frame_size = storage.frame_size
+        self.offset = offset
+        self.obs_capacity = obs_capacity
+        self.obs_offset = obs_offset
+        self.obs = storage.obs[obs_offset:obs_offset + obs_capacity]
+        self.scalars = storage.scalars[offset:offset + capacity]
+        self.obs_rows = storage.obs_rows[offset:offset + capacity]
+        # Absolute frame number of each transition's newest state frame.
+        # Transitions are added in stream order, so these only grow around
+        # the ring; the frame_stack - 1 frames before each must stay live.
+        self.obs_ids = np.zeros(capacity, dtype=np.int64)
+        self.obs_count = 0
+        self.history = self.frame_stack - 1
+        self.last_obs = np.zeros(state_size, dtype=np.float32)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def start(self):
+        return (self.position - self.size) % self.capacity
+
+    def states(self):
+        positions = (self.start() + np.arange(self.size)) % self.capacity
+        back = np.arange(self.history, -1, -1)
+        rows = (self.obs_ids[positions][:, None] - back) % self.obs_capacity
+        return self.obs[rows].reshape(self.size, self.state_size)
+
+    def _write_obs(self, frame):
+        obs_id = self.obs_count
+        self.obs[obs_id % self.obs_capacity] = frame
+        self.obs_count += 1
+
+        # Drop the oldest transitions once their frames get overwritten.
+        oldest_valid = self.obs_count - self.obs_capacity
+        while self.size and self.obs_ids[self.start()] - self.history < oldest_valid:
+            self.size -= 1
+        return obs_id
+
+    def add_observation(self, obs):
+        if self.obs_count and np.array_equal(obs, self.last_obs):
+            return self.obs_count - 1
+
+        # A stack that is the previous one shifted by k frames only adds its
+        # newest k, as a step does and as an n-step bootstrap state does
+        # after its priority transition's state; anything else (episode
+        # starts, isolated priority transitions) is unpacked in full.
+        f = self.frame_size
+        new_frames = self.frame_stack
+        if self.obs_count:
+            for k in range(1, self.frame_stack):
+                if np.array_equal(obs[:-k * f], self.last_obs[k * f:]):
+                    new_frames = k
+                    break
+        for k in range(self.frame_stack - new_frames, self.frame_stack):
+            obs_id = self._write_obs(obs[k * f:(k + 1) * f])
+        self.last_obs[:] = obs
+        return obs_id
+
+    def add_transition(self, state_id, action_idx, reward, next_id, done, discount):
+        if state_id - self.history < self.obs_count - self.obs_capacity:
+            return False
+
+        self.obs_ids[self.position] = state_id
+        obs_rows = self.obs_rows[self.position]
+        obs_rows[0] = self.obs_offset + state_id % self.obs_capacity
+        obs_rows[1] = self.obs_offset + next_id % self.obs_capacity
+        scalars = self.scalars[self.position]
+        scalars[0] = action_idx[0]
+        scalars[1] = action_idx[1]
+        scalars[2] = reward
+        scalars[3] = done
+        scalars[4] = discount
+
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return True
+
+    def add(self, state, action_idx, reward, next_state, done, discount=1.0):
+        state_id = self.add_observation(state)
+        next_id = self.add_observation(next_state)
+        return self.add_transition(state_id, action_idx, reward, next_id, done, discount)
+
+class NStepBuilder:
+    def __init__(self, n, gamma):
+        self.n = n
+        self.gamma = gamma
+        self.window = deque()
+        self.reward_sum = 0.0
+        self.emitted = 0
+        self.last_next_state = None
+
+    def reset(self):
+        self.window.clear()
+        self.reward_sum = 0.0
+        self.last_next_state = None
+
+    def flush(self):
+        # For episodes that stop without a done flag: what is left of the
+        # window bootstraps from the last next_state, as after a time limit.
+        transitions = []
+        while self.window:
+            transitions.append(self._emit(self.last_next_state, False))
+        self.reset()
+        return transitions
+
+    def push(self, state, action_idx, reward, next_state, done, truncated=False):
+        self.reward_sum += self.gamma ** len(self.window) * reward
+        self.window.append((state, action_idx, reward))
+        self.last_next_state = next_state
+
+        transitions = []
+        if done:
+            # Hitting max_steps is a time limit, not a terminal state, so
+            # those returns still bootstrap from next_state.
+            terminal = not truncated
+            while self.window:
+                transitions.append(self._emit(next_state, terminal))
+            self.reward_sum = 0.0
+        elif len(self.window) == self.n:
+            transitions.append(self._emit(next_state, False))
+        return transitions
+
+    def _emit(self, bootstrap_state, terminal):
+        state, action_idx, reward = self.window[0]
+        transition = (state, action_idx, self.reward_sum, bootstrap_state, terminal,
+                      self.gamma ** len(self.window))
+        self.window.popleft()
+        self.emitted += 1
+
+        # Slide the discounted sum in O(1); re-summing every n emissions keeps
+        # the repeated division from accumulating rounding error.
+        if self.emitted % self.n == 0:
+            self.reward_sum = sum(self.gamma ** i * r for i, (_, _, r) in enumerate(self.window))
+        else:
+            self.reward_sum = (self.reward_sum - reward) / self.gamma
+        return transition
+
+class ReplayBatch:
+    def __init__(self, batch_size, storage, split, num_minibatches=1):
+        s = storage.state_size
+        frame_stack = storage.frame_stack
+        total = batch_size * num_minibatches
+        pin = device.type == 'cuda'
+        state_dtype = storage.obs_tensor.dtype
+
+        self.batch_size = batch_size
+        self.split = split
+        self.num_minibatches = num_minibatches
+        self.frame_stack = frame_stack
+        self.state_staging = torch.zeros((total, 2 * s), dtype=state_dtype, pin_memory=pin)
+        self.obs_staging = self.state_staging.view(total * 2 * frame_stack, storage.frame_size)
+        self.scalar_staging = torch.zeros((total, 5), pin_memory=pin)
+        self.obs_rows = torch.zeros((total, 2), dtype=torch.long)
+        self.indices = torch.zeros(total, dtype=torch.long)
+        self.uniform = torch.zeros(total, dtype=torch.float64)
+        self.limits = torch.zeros(total, dtype=torch.float64)
+        self.starts = torch.zeros(total, dtype=torch.long)
+        self.capacities = torch.ones(total, dtype=torch.long)
+        self.offsets = torch.zeros(total, dtype=torch.long)
+        self.obs_offsets = torch.zeros(total, dtype=torch.long)
+        self.obs_capacities = torch.ones(total, dtype=torch.long)
+        # Frame rows of a stack are the newest row minus these, wrapped
+        # around the ring of the buffer each row was sampled from.
+        self.stack_back = torch.arange(frame_stack - 1, -1, -1)
+        self.stack_rows = torch.zeros((total, 2, frame_stack), dtype=torch.long)
+        self.obs_offset_col = self.obs_offsets.view(total, 1, 1)
+        self.obs_capacity_col = self.obs_capacities.view(total, 1, 1)
+
+        # Every minibatch is [regular rows | priority rows]; the sampling
+        # bounds for both parts of all minibatches live in one tensor so a
+        # whole super-batch is drawn with single ops.
+        bounds = (self.limits, self.starts, self.capacities, self.offsets,
+                  self.obs_offsets, self.obs_capacities)
+        self.head_bounds = [t.view(num_minibatches, batch_size)[:, :split] for t in bounds]
+        self.tail_bounds = [t.view(num_minibatches, batch_size)[:, split:] for t in bounds]
+
+        if device.type == 'cpu' and state_dtype == torch.float32:
+            self.state_rows = self.state_staging
+        else:
+            self.state_rows = torch.zeros((total, 2 * s), device=device)
+        if device.type == 'cpu':
+            self.scalar_rows = self.scalar_staging
+        else:
+            self.scalar_rows = torch.zeros((total, 5), device=device)
+        self.actions = torch.zeros((total, 2), dtype=torch.long, device=device)
+        self.action_floats = self.scalar_rows[:, 0:2]
+
+        self.minibatches = []
+        for k in range(num_minibatches):
+            state_rows = self.state_rows[k * batch_size:(k + 1) * batch_size]
+            scalar_rows = self.scalar_rows[k * batch_size:(k + 1) * batch_size]
+            actions = self.actions[k * batch_size:(k + 1) * batch_size]
+            self.minibatches.append({
+                'states': state_rows[:, :s],
+                'next_states': state_rows[:, s:],
+                'rewards': scalar_rows[:, 2],
+                'dones': scalar_rows[:, 3],
+                'discounts': scalar_rows[:, 4],
+                'steer_actions': actions[:, 0:1],
+                'accel_actions': actions[:, 1:2]
+            })
+
+    def _set_bounds(self, bounds, buffer):
+        limits, starts, capacities, offsets, obs_offsets, obs_capacities = bounds
+        limits.fill_(len(buffer))
+        starts.fill_(buffer.start())
+        capacities.fill_(buffer.capacity)
+        offsets.fill_(buffer.offset)
+        obs_offsets.fill_(buffer.obs_offset)
+        obs_capacities.fill_(buffer.obs_capacity)
+
+    def sample(self, storage, memory, priority_memory):
+        use_priority = len(priority_memory) >= self.batch_size - self.split
+        self._set_bounds(self.head_bounds, memory)
+        self._set_bounds(self.tail_bounds, priority_memory if use_priority else memory)
+
+        # Live transitions occupy [start, start + size) of each ring.
+        torch.rand(self.uniform.shape, dtype=torch.float64, out=self.uniform)
+        self.uniform.mul_(self.limits)
+        self.indices.copy_(self.uniform)
+        self.indices.add_(self.starts)
+        self.indices.remainder_(self.capacities)
+        self.indices.add_(self.offsets)
+        torch.index_select(storage.scalars_tensor, 0, self.indices, out=self.scalar_staging)
+        torch.index_select(storage.obs_rows_tensor, 0, self.indices, out=self.obs_rows)
+        if self.frame_stack == 1:
+            torch.index_select(storage.obs_tensor, 0, self.obs_rows.view(-1), out=self.obs_staging)
+            return
+
+        torch.sub(self.obs_rows.unsqueeze(-1), self.stack_back, out=self.stack_rows)
+        self.stack_rows.sub_(self.obs_offset_col)
+        self.stack_rows.remainder_(self.obs_capacity_col)
+        self.stack_rows.add_(self.obs_offset_col)
+        torch.index_select(storage.obs_tensor, 0, self.stack_rows.view(-1), out=self.obs_staging)
+
+    def transfer(self):
+        if self.state_rows is not self.state_staging:
+            self.state_rows.copy_(self.state_staging, non_blocking=True)
+        if self.scalar_rows is not self.scalar_staging:
+            self.scalar_rows.copy_(self.scalar_staging, non_blocking=True)
+        self.actions.copy_(self.action_floats)
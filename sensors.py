@@ -0,0 +1,48 @@
+import numpy as np
+
+DEFAULT_SENSOR_ANGLES = [-90, -75, -60, -45, -30, -20, -10, 0, 10, 20, 30, 45, 60, 75, 90]
+DEFAULT_SENSOR_RANGE = 120
+# speed, avg speed, sin, cos, front avg, left-right balance, close flag,
+# front flag, stuck
+FRAME_EXTRAS = 9
+
+def sensor_angles(sensor_config=None):
+    if not sensor_config or not sensor_config.get('num_rays'):
+        return list(DEFAULT_SENSOR_ANGLES)
+    fov = sensor_config.get('fov', 180.0)
+    # A full circle would otherwise cast its first and last ray both straight back.
+    return np.linspace(-fov / 2, fov / 2, sensor_config['num_rays'], endpoint=fov < 360).tolist()
+
+def sensor_range(sensor_config=None):
+    if not sensor_config:
+        return DEFAULT_SENSOR_RANGE
+    return sensor_config.get('range', DEFAULT_SENSOR_RANGE)
+
+def _nearest(angles, target):
+    return int(np.argmin(np.abs(angles - target)))
+
+def _rays(angles, mask, fallback_mask, fallback):
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        idx = np.flatnonzero(fallback_mask)
+    if len(idx) == 0:
+        idx = np.array([fallback])
+    return idx.tolist()
+
+def observation_layout(sensor_config=None):
+    # Every index the features and the safety rules use is derived from the
+    # ray angles, so the stock 15-ray model keeps its original layout.
+    angles = np.asarray(sensor_angles(sensor_config), dtype=np.float64)
+    num_rays = len(angles)
+    front = _nearest(angles, 0.0)
+    return {
+        'num_rays': num_rays,
+        'front': front,
+        'left_probe': _nearest(angles, -20.0),
+        'right_probe': _nearest(angles, 20.0),
+        'front_window': _rays(angles, np.abs(angles) <= 10.0, np.abs(angles) <= np.abs(angles).min(), front),
+        'left_rays': _rays(angles, angles <= -30.0, angles < 0, front),
+        'right_rays': _rays(angles, angles >= 30.0, angles > 0, front),
+        'balance': num_rays + 5,
+        'frame_size': num_rays + FRAME_EXTRAS
+    }
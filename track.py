@@ -1,376 +1,566 @@
-import pygame
-import math
-from constants import *
-from utils import line_intersection, smooth_track_points
-
-class Track:
-    def __init__(self, track_type=TrackType.OVAL, track_width=140):
-        self.track_width = max(track_width, 120) 
-        self.inner_points = []
-        self.outer_points = []
-        self.centerline = []
-        self.track_type = track_type
-        self.start_position = None
-        self.start_angle = 0
-        self.track_length = 0
-        
-        self.generate_track()
-        
-    def generate_track(self):
-        if self.track_type == TrackType.OVAL:
-            self.create_oval_track()
-        elif self.track_type == TrackType.RECTANGLE:
-            self.create_rectangle_track()
-        elif self.track_type == TrackType.L_TRACK:
-            self.create_l_track()
-        elif self.track_type == TrackType.U_TRACK:
-            self.create_u_track()
-        elif self.track_type == TrackType.SIMPLE_CURVE:
-            self.create_simple_curve_track()
-        elif self.track_type == TrackType.DOUBLE_LOOP:
-            self.create_double_loop_track()
-        elif self.track_type == TrackType.TEST_TRACK:
-            self.create_test_track()
-            
-        self.track_length = self.calculate_track_length()
-            
-    def create_oval_track(self):
-        cx, cy = WIDTH/2, HEIGHT/2
-        rx, ry = 200, 120
-        
-        num_points = 80
-        for i in range(num_points):
-            angle = 2 * math.pi * i / num_points
-            x = cx + rx * math.cos(angle)
-            y = cy + ry * math.sin(angle)
-            self.centerline.append((x, y))
-            
-        self.centerline = smooth_track_points(self.centerline)
-        self.generate_boundaries()
-        self.start_position = (cx + rx, cy)
-        self.start_angle = 90
-        
-    def create_rectangle_track(self):
-        margin = 150
-        corners = [
-            (margin, margin),
-            (WIDTH - margin, margin),
-            (WIDTH - margin, HEIGHT - margin),
-            (margin, HEIGHT - margin)
-        ]
-        
-        corner_radius = 50
-        points = []
-        
-        for i in range(len(corners)):
-            curr = corners[i]
-            next_corner = corners[(i + 1) % len(corners)]
-            prev_corner = corners[(i - 1) % len(corners)]
-            
-            to_next = (next_corner[0] - curr[0], next_corner[1] - curr[1])
-            from_prev = (curr[0] - prev_corner[0], curr[1] - prev_corner[1])
-            
-            len_next = math.sqrt(to_next[0]**2 + to_next[1]**2)
-            len_prev = math.sqrt(from_prev[0]**2 + from_prev[1]**2)
-            
-            to_next = (to_next[0]/len_next, to_next[1]/len_next)
-            from_prev = (from_prev[0]/len_prev, from_prev[1]/len_prev)
-            
-            for j in range(20):
-                t = j / 20.0
-                angle = math.pi/2 * t
-                
-                x = curr[0] - from_prev[0] * corner_radius * (1 - t) + to_next[0] * corner_radius * t
-                y = curr[1] - from_prev[1] * corner_radius * (1 - t) + to_next[1] * corner_radius * t
-                
-                points.append((x, y))
-                
-            for j in range(10):
-                t = j / 10.0
-                x = curr[0] + to_next[0] * corner_radius + to_next[0] * (len_next - 2*corner_radius) * t
-                y = curr[1] + to_next[1] * corner_radius + to_next[1] * (len_next - 2*corner_radius) * t
-                points.append((x, y))
-                
-        self.centerline = smooth_track_points(points)
-        self.generate_boundaries()
-        self.start_position = ((corners[0][0] + corners[1][0])/2, corners[0][1])
-        self.start_angle = 0
-        
-    def create_l_track(self):
-        waypoints = [
-            (150, 400),
-            (150, 200),
-            (150, 150), 
-            (200, 150),
-            (400, 150),
-            (600, 150),
-            (650, 150),
-            (650, 200),
-            (650, 400),
-            (600, 400), 
-            (400, 400),
-            (200, 400)
-        ]
-        
-        self.centerline = []
-        for i in range(len(waypoints)):
-            p1 = waypoints[i]
-            p2 = waypoints[(i + 1) % len(waypoints)]
-            
-            for t in range(10):
-                ratio = t / 10.0
-                x = p1[0] * (1 - ratio) + p2[0] * ratio
-                y = p1[1] * (1 - ratio) + p2[1] * ratio
-                self.centerline.append((x, y))
-                
-        self.centerline = smooth_track_points(self.centerline, 0.2)
-        self.generate_boundaries()
-        self.start_position = waypoints[0]
-        self.start_angle = -90
-        
-    def create_u_track(self):
-        points = []
-        
-        left_x = 200
-        right_x = 600
-        top_y = 150
-        bottom_y = 450
-        
-        num_vertical = 30
-        for i in range(num_vertical):
-            x = left_x
-            y = bottom_y - i * ((bottom_y - top_y) / num_vertical)
-            points.append((x, y))
-        
-        curve_points = 30
-        for i in range(curve_points):
-            t = i / (curve_points - 1)
-            angle = math.pi - t * math.pi 
-            x = (left_x + right_x) / 2 + ((right_x - left_x) / 2) * math.cos(angle)
-            y = top_y
-            points.append((x, y))
-        
-        for i in range(num_vertical):
-            x = right_x
-            y = top_y + i * ((bottom_y - top_y) / num_vertical)
-            points.append((x, y))
-        
-        points.append((right_x, bottom_y + 50))
-        points.append((left_x, bottom_y + 50))
-        
-        self.centerline = points
-        self.generate_boundaries()
-        self.start_position = (left_x, bottom_y - 50)
-        self.start_angle = -90
-        
-    def create_simple_curve_track(self):
-        points = []
-        
-        num_points = 80
-        for i in range(num_points):
-            t = 2 * math.pi * i / num_points
-            
-            r = 180 + 40 * math.sin(3 * t)
-            x = WIDTH/2 + r * math.cos(t)
-            y = HEIGHT/2 + 0.8 * r * math.sin(t)
-            
-            points.append((x, y))
-            
-        self.centerline = smooth_track_points(points, 0.2)
-        self.generate_boundaries()
-        self.start_position = (WIDTH/2 + 220, HEIGHT/2)
-        self.start_angle = 90
-        
-    def create_double_loop_track(self):
-        points = []
-
-        center_x = WIDTH // 2
-        center_y = HEIGHT // 2
-        radius = 90
-        separation = 2 * radius + 40  
-
-        left_center_x = center_x - separation // 2
-        right_center_x = center_x + separation // 2
-
-        for i in range(45, 405): 
-            angle = math.radians(i)
-            x = left_center_x + radius * math.cos(angle)
-            y = center_y + radius * math.sin(angle)
-            points.append((x, y))
-
-        for i in range(15):
-            t = i / 14
-            x = (1 - t) * (left_center_x + radius) + t * (right_center_x - radius)
-            y = center_y
-            points.append((x, y))
-
-        for i in range(45, 405): 
-            angle = math.radians(-i)
-            x = right_center_x + radius * math.cos(angle)
-            y = center_y + radius * math.sin(angle)
-            points.append((x, y))
-
-        for i in range(15):
-            t = i / 14
-            x = (1 - t) * (right_center_x - radius) + t * (left_center_x + radius)
-            y = center_y
-            points.append((x, y))
-
-        self.centerline = smooth_track_points(points, 0.1)
-        self.generate_boundaries()
-
-        self.start_position = (left_center_x, center_y + radius)
-        self.start_angle = -math.pi / 2
-        
-    def create_test_track(self):
-        cx, cy = WIDTH/2, HEIGHT/2
-        radius = 150
-        
-        num_points = 60
-        for i in range(num_points):
-            angle = 2 * math.pi * i / num_points
-            x = cx + radius * math.cos(angle)
-            y = cy + radius * math.sin(angle)
-            self.centerline.append((x, y))
-            
-        self.centerline = smooth_track_points(self.centerline)
-        self.generate_boundaries()
-        self.start_position = (cx + radius, cy)
-        self.start_angle = 90
-        
-    def generate_boundaries(self):
-        self.inner_points = []
-        self.outer_points = []
-        
-        if len(self.centerline) < 3:
-            return
-            
-        min_width = 120 
-        actual_width = max(self.track_width, min_width)
-            
-        for i in range(len(self.centerline)):
-            p1 = self.centerline[i]
-            p2 = self.centerline[(i + 1) % len(self.centerline)]
-            p0 = self.centerline[(i - 1) % len(self.centerline)]
-            
-            dx1 = p2[0] - p1[0]
-            dy1 = p2[1] - p1[1]
-            dx2 = p1[0] - p0[0]
-            dy2 = p1[1] - p0[1]
-            
-            dx = (dx1 + dx2) / 2
-            dy = (dy1 + dy2) / 2
-            
-            length = math.sqrt(dx*dx + dy*dy)
-            
-            if length > 0.001:  
-                dx /= length
-                dy /= length
-                
-                nx, ny = -dy, dx
-                
-                inner_x = p1[0] - nx * actual_width/2
-                inner_y = p1[1] - ny * actual_width/2
-                outer_x = p1[0] + nx * actual_width/2
-                outer_y = p1[1] + ny * actual_width/2
-                
-                margin = 30
-                inner_x = max(margin, min(WIDTH - margin, inner_x))
-                inner_y = max(margin, min(HEIGHT - margin, inner_y))
-                outer_x = max(margin, min(WIDTH - margin, outer_x))
-                outer_y = max(margin, min(HEIGHT - margin, outer_y))
-                
-                self.inner_points.append((inner_x, inner_y))
-                self.outer_points.append((outer_x, outer_y))
-                
-        self.inner_points = smooth_track_points(self.inner_points, 0.2)
-        self.outer_points = smooth_track_points(self.outer_points, 0.2)
-        
-        self.verify_track_width(min_width * 0.9) 
-        
-    def verify_track_width(self, min_width):
-        if len(self.inner_points) != len(self.outer_points):
-            return
-            
-        for i in range(len(self.inner_points)):
-            inner = self.inner_points[i]
-            outer = self.outer_points[i]
-            
-            width = math.sqrt((outer[0] - inner[0])**2 + (outer[1] - inner[1])**2)
-            
-            if width < min_width:
-                dx = outer[0] - inner[0]
-                dy = outer[1] - inner[1]
-                
-                if width > 0:
-                    dx /= width
-                    dy /= width
-                    
-                    adjustment = (min_width - width) / 2
-                    self.inner_points[i] = (inner[0] - dx * adjustment, inner[1] - dy * adjustment)
-                    self.outer_points[i] = (outer[0] + dx * adjustment, outer[1] + dy * adjustment)
-                
-    def calculate_track_length(self):
-        total_length = 0
-        for i in range(len(self.centerline)):
-            p1 = self.centerline[i]
-            p2 = self.centerline[(i + 1) % len(self.centerline)]
-            dist = math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-            total_length += dist
-        return total_length
-                                        
-    def check_collision(self, car_corners):
-        for corner in car_corners:
-            if corner[0] < 0 or corner[0] > WIDTH or corner[1] < 0 or corner[1] > HEIGHT:
-                return True
-                
-        car_edges = []
-        for i in range(len(car_corners)):
-            car_edges.append([car_corners[i], car_corners[(i + 1) % len(car_corners)]])
-            
-        for car_edge in car_edges:
-            for i in range(len(self.inner_points)):
-                inner_segment = [
-                    self.inner_points[i],
-                    self.inner_points[(i + 1) % len(self.inner_points)]
-                ]
-                outer_segment = [
-                    self.outer_points[i],
-                    self.outer_points[(i + 1) % len(self.outer_points)]
-                ]
-                
-                if line_intersection(car_edge, inner_segment) or \
-                   line_intersection(car_edge, outer_segment):
-                    return True
-                    
-        return False
-        
-    def draw(self, surface):
-        if len(self.outer_points) > 2 and len(self.inner_points) > 2:
-            track_polygon = self.outer_points + self.inner_points[::-1]
-            pygame.draw.polygon(surface, GRAY, track_polygon)
-            
-            if len(self.centerline) > 1:
-                for i in range(0, len(self.centerline), 5):
-                    if i + 1 < len(self.centerline):
-                        pygame.draw.line(surface, DARK_GRAY, 
-                                       (int(self.centerline[i][0]), int(self.centerline[i][1])),
-                                       (int(self.centerline[i+1][0]), int(self.centerline[i+1][1])), 1)
-            
-        if len(self.inner_points) > 1:
-            pygame.draw.lines(surface, WHITE, True, 
-                            [(int(x), int(y)) for x, y in self.inner_points], 3)
-        if len(self.outer_points) > 1:
-            pygame.draw.lines(surface, WHITE, True, 
-                            [(int(x), int(y)) for x, y in self.outer_points], 3)
-            
-        if self.start_position:
-            start_x, start_y = int(self.start_position[0]), int(self.start_position[1])
-            pattern_size = 10
-            for i in range(-3, 4):
-                for j in range(-3, 4):
-                    if (i + j) % 2 == 0:
-                        rect = pygame.Rect(start_x + i * pattern_size - pattern_size//2,
-                                         start_y + j * pattern_size - pattern_size//2,
-                                         pattern_size, pattern_size)
-                        pygame.draw.rect(surface, GREEN if j < 0 else WHITE, rect)
\ No newline at end of file
+import pygame
+import math
+import random
+import numpy as np
+from collections import OrderedDict
+from constants import *
+from utils import (line_intersection, smooth_track_points, points_to_list, catmull_rom_closed,
+                   polyline_self_intersects, polylines_intersect, min_turn_radius, polygon_area,
+                   simplify_closed_polyline)
+from primitives import EllipticalArc, CircularArc, offset_polygon, tessellate_primitives, pack_primitives
+
+# Track types built from straights and round bends, which a few lines and
+# arcs cover.
+ANALYTIC_TRACK_TYPES = (TrackType.OVAL, TrackType.RECTANGLE, TrackType.TEST_TRACK)
+
+class Track:
+    def __init__(self, track_type=TrackType.OVAL, track_width=140, seed=None, max_error=TRACK_MAX_ERROR,
+                 analytic=False):
+        self.track_width = max(track_width, 120) 
+        self.seed = 0 if seed is None else seed
+        self.inner_points = []
+        self.outer_points = []
+        self.centerline = []
+        self.track_type = track_type
+        self.start_position = None
+        self.start_angle = 0
+        self.track_length = 0
+        self.spawn_poses = {}
+        self.boundary_segments = None
+        self.centerline_array = None
+        self.occupancy_mask = None
+        self.generated_boundaries = None
+        self.max_error = max_error
+        self.simplification = None
+        self.analytic = analytic
+        self.boundary_primitives = None
+        self.primitive_arrays = None
+        self.outline = None
+        
+        self.generate_track()
+        
+    def generate_track(self):
+        if self.track_type == TrackType.OVAL:
+            self.create_oval_track()
+        elif self.track_type == TrackType.RECTANGLE:
+            self.create_rectangle_track()
+        elif self.track_type == TrackType.L_TRACK:
+            self.create_l_track()
+        elif self.track_type == TrackType.U_TRACK:
+            self.create_u_track()
+        elif self.track_type == TrackType.SIMPLE_CURVE:
+            self.create_simple_curve_track()
+        elif self.track_type == TrackType.DOUBLE_LOOP:
+            self.create_double_loop_track()
+        elif self.track_type == TrackType.TEST_TRACK:
+            self.create_test_track()
+        elif self.track_type == TrackType.PROCEDURAL:
+            self.create_procedural_track()
+            
+        # Before simplification the boundaries still pair up point for
+        # point, which the occupancy raster relies on.
+        if len(self.inner_points) == len(self.outer_points) > 2:
+            self.generated_boundaries = (np.asarray(self.inner_points, dtype=np.float64),
+                                         np.asarray(self.outer_points, dtype=np.float64))
+        if self.analytic and self.track_type in ANALYTIC_TRACK_TYPES:
+            self.build_primitives()
+        if self.max_error:
+            self.simplify_boundaries(self.max_error)
+        self.track_length = self.calculate_track_length()
+            
+    def create_oval_track(self):
+        cx, cy = WIDTH/2, HEIGHT/2
+        rx, ry = 200, 120
+        
+        num_points = 80
+        angles = 2 * np.pi * np.arange(num_points) / num_points
+        points = np.column_stack((cx + rx * np.cos(angles), cy + ry * np.sin(angles)))
+            
+        self.centerline = smooth_track_points(points)
+        self.generate_boundaries()
+        self.outline = ('ellipse', (cx, cy, rx, ry))
+        self.start_position = (cx + rx, cy)
+        self.start_angle = 90
+        
+    def create_rectangle_track(self):
+        margin = 150
+        corners = [
+            (margin, margin),
+            (WIDTH - margin, margin),
+            (WIDTH - margin, HEIGHT - margin),
+            (margin, HEIGHT - margin)
+        ]
+        
+        corner_radius = 50
+        points = []
+        chamfers = []
+        corner_t = (np.arange(20) / 20.0)[:, None]
+        straight_t = (np.arange(10) / 10.0)[:, None]
+        
+        for i in range(len(corners)):
+            curr = corners[i]
+            next_corner = corners[(i + 1) % len(corners)]
+            prev_corner = corners[(i - 1) % len(corners)]
+            
+            to_next = (next_corner[0] - curr[0], next_corner[1] - curr[1])
+            from_prev = (curr[0] - prev_corner[0], curr[1] - prev_corner[1])
+            
+            len_next = math.sqrt(to_next[0]**2 + to_next[1]**2)
+            len_prev = math.sqrt(from_prev[0]**2 + from_prev[1]**2)
+            
+            curr = np.array(curr, dtype=np.float64)
+            to_next = np.array(to_next) / len_next
+            from_prev = np.array(from_prev) / len_prev
+            
+            chamfers.extend((curr - from_prev * corner_radius, curr + to_next * corner_radius))
+            points.append(curr - from_prev * corner_radius * (1 - corner_t) + to_next * corner_radius * corner_t)
+            points.append(curr + to_next * corner_radius + to_next * (len_next - 2*corner_radius) * straight_t)
+                
+        self.centerline = smooth_track_points(np.concatenate(points))
+        self.generate_boundaries()
+        self.outline = ('polygon', chamfers)
+        self.start_position = ((corners[0][0] + corners[1][0])/2, corners[0][1])
+        self.start_angle = 0
+        
+    def create_l_track(self):
+        waypoints = [
+            (150, 400),
+            (150, 200),
+            (150, 150), 
+            (200, 150),
+            (400, 150),
+            (600, 150),
+            (650, 150),
+            (650, 200),
+            (650, 400),
+            (600, 400), 
+            (400, 400),
+            (200, 400)
+        ]
+        
+        p1 = np.array(waypoints, dtype=np.float64)[:, None, :]
+        p2 = np.roll(p1, -1, axis=0)
+        ratio = (np.arange(10) / 10.0)[None, :, None]
+        points = (p1 * (1 - ratio) + p2 * ratio).reshape(-1, 2)
+                
+        self.centerline = smooth_track_points(points, 0.2)
+        self.generate_boundaries()
+        self.start_position = waypoints[0]
+        self.start_angle = -90
+        
+    def create_u_track(self):
+        left_x = 200
+        right_x = 600
+        top_y = 150
+        bottom_y = 450
+        
+        num_vertical = 30
+        steps = np.arange(num_vertical) * ((bottom_y - top_y) / num_vertical)
+        left_side = np.column_stack((np.full(num_vertical, left_x), bottom_y - steps))
+        
+        curve_points = 30
+        t = np.arange(curve_points) / (curve_points - 1)
+        angles = math.pi - t * math.pi
+        top_side = np.column_stack(((left_x + right_x) / 2 + ((right_x - left_x) / 2) * np.cos(angles),
+                                    np.full(curve_points, top_y)))
+        
+        right_side = np.column_stack((np.full(num_vertical, right_x), top_y + steps))
+        
+        bottom_side = np.array([(right_x, bottom_y + 50), (left_x, bottom_y + 50)], dtype=np.float64)
+        
+        self.centerline = np.concatenate((left_side, top_side, right_side, bottom_side))
+        self.generate_boundaries()
+        self.start_position = (left_x, bottom_y - 50)
+        self.start_angle = -90
+        
+    def create_simple_curve_track(self):
+        num_points = 80
+        t = 2 * np.pi * np.arange(num_points) / num_points
+        
+        r = 180 + 40 * np.sin(3 * t)
+        points = np.column_stack((WIDTH/2 + r * np.cos(t), HEIGHT/2 + 0.8 * r * np.sin(t)))
+            
+        self.centerline = smooth_track_points(points, 0.2)
+        self.generate_boundaries()
+        self.start_position = (WIDTH/2 + 220, HEIGHT/2)
+        self.start_angle = 90
+        
+    def create_double_loop_track(self):
+        center_x = WIDTH // 2
+        center_y = HEIGHT // 2
+        radius = 90
+        separation = 2 * radius + 40  
+
+        left_center_x = center_x - separation // 2
+        right_center_x = center_x + separation // 2
+
+        angles = np.radians(np.arange(45, 405))
+        t = np.arange(15) / 14
+        center_row = np.full(len(t), center_y)
+
+        left_loop = np.column_stack((left_center_x + radius * np.cos(angles),
+                                     center_y + radius * np.sin(angles)))
+        to_right = np.column_stack(((1 - t) * (left_center_x + radius) + t * (right_center_x - radius),
+                                    center_row))
+        right_loop = np.column_stack((right_center_x + radius * np.cos(-angles),
+                                      center_y + radius * np.sin(-angles)))
+        to_left = np.column_stack(((1 - t) * (right_center_x - radius) + t * (left_center_x + radius),
+                                   center_row))
+
+        points = np.concatenate((left_loop, to_right, right_loop, to_left))
+        self.centerline = smooth_track_points(points, 0.1)
+        self.generate_boundaries()
+
+        self.start_position = (left_center_x, center_y + radius)
+        self.start_angle = -math.pi / 2
+        
+    def create_test_track(self):
+        cx, cy = WIDTH/2, HEIGHT/2
+        radius = 150
+        
+        num_points = 60
+        angles = 2 * np.pi * np.arange(num_points) / num_points
+        points = np.column_stack((cx + radius * np.cos(angles), cy + radius * np.sin(angles)))
+            
+        self.centerline = smooth_track_points(points)
+        self.generate_boundaries()
+        self.outline = ('ellipse', (cx, cy, radius, radius))
+        self.start_position = (cx + radius, cy)
+        self.start_angle = 90
+        
+    def create_procedural_track(self, max_attempts=20):
+        rng = np.random.default_rng(self.seed)
+        
+        cx, cy = WIDTH/2, HEIGHT/2
+        half_width = max(self.track_width, 120) / 2
+        margin = 40
+        max_rx = WIDTH/2 - margin - half_width
+        max_ry = HEIGHT/2 - margin - half_width
+        
+        for attempt in range(max_attempts):
+            roughness = 1.0 - attempt / max_attempts
+            
+            # Random radii at evenly spaced control angles, interpolated with a
+            # periodic spline in polar form, give a smooth star-shaped loop that
+            # can never cross itself.
+            num_controls = int(rng.integers(4, 9))
+            radii = 0.8 + rng.uniform(-0.15, 0.15, num_controls) * roughness
+            samples_per_segment = int(math.ceil(120 / num_controls))
+            radius_curve = catmull_rom_closed(np.column_stack((radii, np.zeros(num_controls))),
+                                              samples_per_segment)[:, 0]
+            
+            phase = rng.uniform(0, 2 * np.pi)
+            angles = phase + 2 * np.pi * np.arange(len(radius_curve)) / len(radius_curve)
+            rx = max_rx * rng.uniform(0.9, 1.0)
+            ry = max_ry * rng.uniform(0.9, 1.0)
+            centerline = np.column_stack((cx + rx * radius_curve * np.cos(angles),
+                                          cy + ry * radius_curve * np.sin(angles)))
+            
+            if np.any(centerline[:, 0] < margin + half_width) or np.any(centerline[:, 0] > WIDTH - margin - half_width) or \
+               np.any(centerline[:, 1] < margin + half_width) or np.any(centerline[:, 1] > HEIGHT - margin - half_width):
+                continue
+            if min_turn_radius(centerline) < half_width * 1.1:
+                continue
+                
+            self.centerline = centerline
+            self.generate_boundaries()
+            
+            if polyline_self_intersects(self.inner_points) or polyline_self_intersects(self.outer_points) or \
+               polylines_intersect(self.inner_points, self.outer_points):
+                continue
+            break
+        else:
+            angles = 2 * np.pi * np.arange(120) / 120
+            self.centerline = np.column_stack((cx + 0.8 * max_rx * np.cos(angles),
+                                               cy + 0.8 * max_ry * np.sin(angles)))
+            self.generate_boundaries()
+            
+        start = np.array(self.centerline[0])
+        heading = np.array(self.centerline[1]) - start
+        self.start_position = (float(start[0]), float(start[1]))
+        self.start_angle = math.degrees(math.atan2(heading[0], -heading[1]))
+        
+    def generate_boundaries(self):
+        centerline = np.asarray(self.centerline, dtype=np.float64)
+        self.centerline = points_to_list(centerline)
+        self.inner_points = []
+        self.outer_points = []
+        
+        if len(centerline) < 3:
+            return
+            
+        min_width = 120 
+        actual_width = max(self.track_width, min_width)
+        
+        to_next = np.roll(centerline, -1, axis=0) - centerline
+        from_prev = centerline - np.roll(centerline, 1, axis=0)
+        direction = (to_next + from_prev) / 2
+        
+        length = np.sqrt(direction[:, 0] * direction[:, 0] + direction[:, 1] * direction[:, 1])
+        valid = length > 0.001
+        
+        direction = direction[valid] / length[valid, None]
+        normals = np.column_stack((-direction[:, 1], direction[:, 0]))
+        points = centerline[valid]
+        
+        margin = 30
+        low = (margin, margin)
+        high = (WIDTH - margin, HEIGHT - margin)
+        inner = np.clip(points - normals * actual_width/2, low, high)
+        outer = np.clip(points + normals * actual_width/2, low, high)
+                
+        inner = smooth_track_points(inner, 0.2)
+        outer = smooth_track_points(outer, 0.2)
+        
+        inner, outer = self.verify_track_width(min_width * 0.9, inner, outer)
+        self.inner_points = points_to_list(inner)
+        self.outer_points = points_to_list(outer)
+        
+    def verify_track_width(self, min_width, inner=None, outer=None):
+        if inner is None or outer is None:
+            inner, outer = self.verify_track_width(min_width, self.inner_points, self.outer_points)
+            self.inner_points = points_to_list(inner)
+            self.outer_points = points_to_list(outer)
+            return inner, outer
+            
+        inner = np.array(inner, dtype=np.float64)
+        outer = np.array(outer, dtype=np.float64)
+        
+        if len(inner) != len(outer) or len(inner) == 0:
+            return inner, outer
+            
+        delta = outer - inner
+        width = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+        narrow = (width < min_width) & (width > 0)
+        
+        if np.any(narrow):
+            direction = delta[narrow] / width[narrow, None]
+            adjustment = ((min_width - width[narrow]) / 2)[:, None]
+            inner[narrow] = inner[narrow] - direction * adjustment
+            outer[narrow] = outer[narrow] + direction * adjustment
+            
+        return inner, outer
+                
+    def build_primitives(self):
+        # The generator's own shape offset by half the track width: the
+        # oval's ellipse by its radii, the test track's circle and the
+        # rectangle's chamfered outline exactly. The polylines are
+        # re-tessellated from the pieces, so drawing, the occupancy raster
+        # and the polyline sensing paths see the same track. As on the
+        # generated track, inner_points lies on the -normal side, outside.
+        half_width = self.track_width / 2
+        kind, shape = self.outline
+        if kind == 'ellipse':
+            cx, cy, rx, ry = shape
+            arc = CircularArc if rx == ry else EllipticalArc
+            outside = [arc(cx, cy, rx + half_width, ry + half_width)]
+            inside = [arc(cx, cy, rx - half_width, ry - half_width)]
+        else:
+            outside = offset_polygon(shape, half_width)
+            inside = offset_polygon(shape, -half_width)
+        max_error = self.max_error or TRACK_MAX_ERROR
+        self.inner_points = tessellate_primitives(outside, max_error)
+        self.outer_points = tessellate_primitives(inside, max_error)
+        self.boundary_primitives = outside + inside
+        self.primitive_arrays = pack_primitives(self.boundary_primitives)
+        self.generated_boundaries = None
+        self.boundary_segments = None
+        self.occupancy_mask = None
+        return self.boundary_primitives
+        
+    def simplify_boundaries(self, max_error):
+        # The generators sample every shape at a fixed rate, so straights
+        # carry as many segments as hairpins. Sensing and collision cost
+        # scale with the segment count, so each boundary is re-tessellated
+        # to the fewest vertices within max_error of the original.
+        before = len(self.inner_points) + len(self.outer_points)
+        max_deviation = 0.0
+        simplified = []
+        for points in (self.inner_points, self.outer_points):
+            kept, deviation = simplify_closed_polyline(points, max_error)
+            simplified.append([points[i] for i in kept])
+            max_deviation = max(max_deviation, deviation)
+        self.inner_points, self.outer_points = simplified
+        
+        self.boundary_segments = None
+        self.occupancy_mask = None
+        self.simplification = {
+            'segments_before': before,
+            'segments_after': len(self.inner_points) + len(self.outer_points),
+            'max_deviation': max_deviation
+        }
+        return self.simplification
+        
+    def calculate_track_length(self):
+        if len(self.centerline) == 0:
+            return 0
+        points = np.asarray(self.centerline, dtype=np.float64)
+        delta = np.roll(points, -1, axis=0) - points
+        return float(np.sum(np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)))
+                                        
+    def get_spawn_poses(self, spacing=25.0):
+        if spacing in self.spawn_poses:
+            return self.spawn_poses[spacing]
+            
+        points = np.asarray(self.centerline, dtype=np.float64)
+        delta = np.roll(points, -1, axis=0) - points
+        seg_lengths = np.sqrt(delta[:, 0]**2 + delta[:, 1]**2)
+        cumulative = np.concatenate([[0.0], np.cumsum(seg_lengths)])
+        
+        # Evenly spaced by arc length, facing along the centerline's order.
+        distances = np.arange(0.0, cumulative[-1], spacing)
+        seg_idx = np.clip(np.searchsorted(cumulative, distances, side='right') - 1, 0, len(points) - 1)
+        t = (distances - cumulative[seg_idx]) / np.maximum(seg_lengths[seg_idx], 1e-9)
+        positions = points[seg_idx] + delta[seg_idx] * t[:, None]
+        angles = np.degrees(np.arctan2(delta[seg_idx, 0], -delta[seg_idx, 1]))
+        
+        poses = np.column_stack([positions, angles, distances])
+        self.spawn_poses[spacing] = poses
+        return poses
+        
+    def get_boundary_segments(self):
+        if self.boundary_segments is None:
+            segments = []
+            for points in (self.inner_points, self.outer_points):
+                if len(points) < 2:
+                    continue
+                points = np.asarray(points, dtype=np.float64)
+                segments.append(np.hstack([points, np.roll(points, -1, axis=0)]))
+            segments = np.vstack(segments) if segments else np.zeros((0, 4))
+            lows = np.minimum(segments[:, 0:2], segments[:, 2:4])
+            highs = np.maximum(segments[:, 0:2], segments[:, 2:4])
+            self.boundary_segments = (segments, lows, highs)
+        return self.boundary_segments
+        
+    def get_centerline_array(self):
+        if self.centerline_array is None:
+            self.centerline_array = np.asarray(self.centerline, dtype=np.float64).reshape(-1, 2)
+        return self.centerline_array
+        
+    def get_occupancy_mask(self):
+        # Drivable area rasterized once, one cell per pixel, indexed [y, x].
+        if self.occupancy_mask is None:
+            surface = pygame.Surface((WIDTH, HEIGHT))
+            surface.fill(BLACK)
+            if self.generated_boundaries is not None and polylines_intersect(*self.generated_boundaries):
+                # The boundaries cross each other, as DOUBLE_LOOP's overlapping
+                # offsets do, so they do not bound a ring; the drivable area
+                # is the union of the quads between matching boundary points.
+                inner, outer = self.generated_boundaries
+                quads = np.stack([inner, np.roll(inner, -1, axis=0), np.roll(outer, -1, axis=0), outer], axis=1)
+                for quad in quads.tolist():
+                    pygame.draw.polygon(surface, WHITE, quad)
+            elif len(self.outer_points) > 2 and len(self.inner_points) > 2:
+                # Filling the enclosing boundary and clearing the enclosed one
+                # avoids the unfilled seam a single outer + reversed inner
+                # polygon leaves at the start line. Unlike the quads, it also
+                # leaves out the loops an offset folds into at tight corners,
+                # which lie behind the wall the rays see.
+                boundaries = sorted([self.inner_points, self.outer_points], key=polygon_area)
+                pygame.draw.polygon(surface, WHITE, boundaries[1])
+                pygame.draw.polygon(surface, BLACK, boundaries[0])
+            self.occupancy_mask = np.ascontiguousarray(pygame.surfarray.array_red(surface).T > 0)
+        return self.occupancy_mask
+        
+    def check_collision(self, car_corners):
+        for corner in car_corners:
+            if corner[0] < 0 or corner[0] > WIDTH or corner[1] < 0 or corner[1] > HEIGHT:
+                return True
+                
+        if self.boundary_primitives is not None:
+            return self.check_collision_analytic(car_corners)
+            
+        car_edges = []
+        for i in range(len(car_corners)):
+            car_edges.append([car_corners[i], car_corners[(i + 1) % len(car_corners)]])
+            
+        # Boundaries are walked separately since simplification leaves them
+        # with different vertex counts.
+        for car_edge in car_edges:
+            for points in (self.inner_points, self.outer_points):
+                for i in range(len(points)):
+                    segment = [points[i], points[(i + 1) % len(points)]]
+                    if line_intersection(car_edge, segment):
+                        return True
+                    
+        return False
+        
+    def check_collision_analytic(self, car_corners):
+        corners = np.asarray(car_corners, dtype=np.float64)
+        center_x, center_y = corners.mean(axis=0)
+        reach = float(np.sqrt(((corners - (center_x, center_y)) ** 2).sum(axis=1)).max())
+        edges = np.roll(corners, -1, axis=0) - corners
+        for primitive in self.boundary_primitives:
+            # A boundary further from the centre than the corners cannot
+            # cross any edge.
+            if primitive.distance(center_x, center_y) > reach:
+                continue
+            if np.any(np.isfinite(primitive.intersect(corners[:, 0], corners[:, 1], edges[:, 0], edges[:, 1]))):
+                return True
+        return False
+        
+    def draw(self, surface):
+        if len(self.outer_points) > 2 and len(self.inner_points) > 2:
+            track_polygon = self.outer_points + self.inner_points[::-1]
+            pygame.draw.polygon(surface, GRAY, track_polygon)
+            
+            if len(self.centerline) > 1:
+                for i in range(0, len(self.centerline), 5):
+                    if i + 1 < len(self.centerline):
+                        pygame.draw.line(surface, DARK_GRAY, 
+                                       (int(self.centerline[i][0]), int(self.centerline[i][1])),
+                                       (int(self.centerline[i+1][0]), int(self.centerline[i+1][1])), 1)
+            
+        if len(self.inner_points) > 1:
+            pygame.draw.lines(surface, WHITE, True, 
+                            [(int(x), int(y)) for x, y in self.inner_points], 3)
+        if len(self.outer_points) > 1:
+            pygame.draw.lines(surface, WHITE, True, 
+                            [(int(x), int(y)) for x, y in self.outer_points], 3)
+            
+        if self.start_position:
+            start_x, start_y = int(self.start_position[0]), int(self.start_position[1])
+            pattern_size = 10
+            for i in range(-3, 4):
+                for j in range(-3, 4):
+                    if (i + j) % 2 == 0:
+                        rect = pygame.Rect(start_x + i * pattern_size - pattern_size//2,
+                                         start_y + j * pattern_size - pattern_size//2,
+                                         pattern_size, pattern_size)
+                        pygame.draw.rect(surface, GREEN if j < 0 else WHITE, rect)
+
+class TrackPool:
+    def __init__(self, capacity=32, num_tracks=None, track_width=140, base_seed=0):
+        self.capacity = capacity
+        self.num_tracks = num_tracks
+        self.track_width = track_width
+        self.base_seed = base_seed
+        self.next_seed = base_seed
+        self.tracks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, seed):
+        track = self.tracks.get(seed)
+        if track is not None:
+            self.tracks.move_to_end(seed)
+            self.hits += 1
+            return track
+            
+        self.misses += 1
+        track = Track(TrackType.PROCEDURAL, track_width=self.track_width, seed=seed)
+        self.tracks[seed] = track
+        if len(self.tracks) > self.capacity:
+            self.tracks.popitem(last=False)
+        return track
+        
+    def sample(self):
+        if self.num_tracks is None:
+            seed = self.next_seed
+            self.next_seed += 1
+        else:
+            seed = self.base_seed + random.randrange(self.num_tracks)
+        return self.get(seed)
+        
+    def __len__(self):
+        return len(self.tracks)
\ No newline at end of file
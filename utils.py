@@ -1,39 +1,247 @@
-def line_intersection(line1, line2):
-    x1, y1, x2, y2 = line1[0][0], line1[0][1], line1[1][0], line1[1][1]
-    x3, y3, x4, y4 = line2[0][0], line2[0][1], line2[1][0], line2[1][1]
-    
-    denominator = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
-    
-    if abs(denominator) < 1e-10:
-        return None
-    
-    ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denominator
-    ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denominator
-    
-    if ua < 0 or ua > 1 or ub < 0 or ub > 1:
-        return None
-        
-    x = x1 + ua * (x2 - x1)
-    y = y1 + ua * (y2 - y1)
-    
-    return (x, y)
-
-def smooth_track_points(points, smoothing_factor=0.2):
-    if len(points) < 3:
-        return points
-        
-    smoothed = []
-    for i in range(len(points)):
-        prev_idx = (i - 1) % len(points)
-        next_idx = (i + 1) % len(points)
-        
-        x = (points[prev_idx][0] * smoothing_factor + 
-             points[i][0] * (1 - 2 * smoothing_factor) + 
-             points[next_idx][0] * smoothing_factor)
-        y = (points[prev_idx][1] * smoothing_factor + 
-             points[i][1] * (1 - 2 * smoothing_factor) + 
-             points[next_idx][1] * smoothing_factor)
-        
-        smoothed.append((x, y))
-    
-    return smoothed
\ No newline at end of file
+import math
+import numpy as np
+
+def line_intersection(line1, line2):
+    x1, y1, x2, y2 = line1[0][0], line1[0][1], line1[1][0], line1[1][1]
+    x3, y3, x4, y4 = line2[0][0], line2[0][1], line2[1][0], line2[1][1]
+    
+    denominator = (y4 - y3) * (x2 - x1) - (x4 - x3) * (y2 - y1)
+    
+    if abs(denominator) < 1e-10:
+        return None
+    
+    ua = ((x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)) / denominator
+    ub = ((x2 - x1) * (y1 - y3) - (y2 - y1) * (x1 - x3)) / denominator
+    
+    if ua < 0 or ua > 1 or ub < 0 or ub > 1:
+        return None
+        
+    x = x1 + ua * (x2 - x1)
+    y = y1 + ua * (y2 - y1)
+    
+    return (x, y)
+
+def smooth_track_points(points, smoothing_factor=0.2):
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return points
+        
+    return (np.roll(points, 1, axis=0) * smoothing_factor + 
+            points * (1 - 2 * smoothing_factor) + 
+            np.roll(points, -1, axis=0) * smoothing_factor)
+
+def points_to_list(points):
+    return [tuple(point) for point in np.asarray(points, dtype=np.float64).tolist()]
+
+def point_segment_distance(point, seg_start, seg_end):
+    px, py = point
+    x1, y1 = seg_start
+    x2, y2 = seg_end
+    
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+    
+    if length_sq < 1e-12:
+        return math.sqrt((px - x1)**2 + (py - y1)**2)
+        
+    t = ((px - x1) * dx + (py - y1) * dy) / length_sq
+    t = max(0.0, min(1.0, t))
+    
+    closest_x = x1 + t * dx
+    closest_y = y1 + t * dy
+    
+    return math.sqrt((px - closest_x)**2 + (py - closest_y)**2)
+
+def catmull_rom_closed(control_points, samples_per_segment=10):
+    control_points = np.asarray(control_points, dtype=np.float64)
+    p0 = np.roll(control_points, 1, axis=0)[:, None, :]
+    p1 = control_points[:, None, :]
+    p2 = np.roll(control_points, -1, axis=0)[:, None, :]
+    p3 = np.roll(control_points, -2, axis=0)[:, None, :]
+    
+    t = (np.arange(samples_per_segment) / samples_per_segment)[None, :, None]
+    t2 = t * t
+    t3 = t2 * t
+    
+    points = 0.5 * (2 * p1 +
+                    (p2 - p0) * t +
+                    (2 * p0 - 5 * p1 + 4 * p2 - p3) * t2 +
+                    (3 * p1 - p0 - 3 * p2 + p3) * t3)
+    return points.reshape(-1, 2)
+
+def segment_crossings(a_start, a_end, b_start, b_end):
+    a_start = np.asarray(a_start, dtype=np.float64)[:, None, :]
+    a_end = np.asarray(a_end, dtype=np.float64)[:, None, :]
+    b_start = np.asarray(b_start, dtype=np.float64)[None, :, :]
+    b_end = np.asarray(b_end, dtype=np.float64)[None, :, :]
+    
+    def orientation(p, q, r):
+        return ((q[..., 0] - p[..., 0]) * (r[..., 1] - p[..., 1]) -
+                (q[..., 1] - p[..., 1]) * (r[..., 0] - p[..., 0]))
+    
+    d1 = orientation(b_start, b_end, a_start)
+    d2 = orientation(b_start, b_end, a_end)
+    d3 = orientation(a_start, a_end, b_start)
+    d4 = orientation(a_start, a_end, b_end)
+    
+    return (d1 * d2 < 0) & (d3 * d4 < 0)
+
+def polyline_self_intersects(points):
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n < 4:
+        return False
+        
+    ends = np.roll(points, -1, axis=0)
+    crossings = segment_crossings(points, ends, points, ends)
+    
+    idx = np.arange(n)
+    gap = np.abs(idx[:, None] - idx[None, :])
+    neighbours = (gap <= 1) | (gap == n - 1)
+    
+    return bool(np.any(crossings & ~neighbours))
+
+def polylines_intersect(points_a, points_b):
+    points_a = np.asarray(points_a, dtype=np.float64)
+    points_b = np.asarray(points_b, dtype=np.float64)
+    crossings = segment_crossings(points_a, np.roll(points_a, -1, axis=0),
+                                  points_b, np.roll(points_b, -1, axis=0))
+    return bool(np.any(crossings))
+
+def min_turn_radius(points):
+    points = np.asarray(points, dtype=np.float64)
+    prev_points = np.roll(points, 1, axis=0)
+    next_points = np.roll(points, -1, axis=0)
+    
+    a = np.hypot(*(points - prev_points).T)
+    b = np.hypot(*(next_points - points).T)
+    c = np.hypot(*(next_points - prev_points).T)
+    cross = np.abs((points[:, 0] - prev_points[:, 0]) * (next_points[:, 1] - prev_points[:, 1]) -
+                   (points[:, 1] - prev_points[:, 1]) * (next_points[:, 0] - prev_points[:, 0]))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = np.where(cross > 1e-9, a * b * c / (2 * cross), np.inf)
+    return float(np.min(radius))
+
+
+def polygon_area(points):
+    points = np.asarray(points, dtype=np.float64)
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+
+def crop_grid(size, scale):
+    # Cell centres in the car's frame: rows run from ahead to behind, columns
+    # from left to right, with the car in the middle.
+    offsets = ((np.arange(size) - size / 2 + 0.5) * scale).astype(np.float32)
+    forward = np.repeat(-offsets[:, None], size, axis=1)
+    lateral = np.repeat(offsets[None, :], size, axis=0)
+    return forward, lateral
+
+def egocentric_crops(mask, poses, size=64, scale=1.0, grid=None, chunk_size=16):
+    poses = np.asarray(poses, dtype=np.float32).reshape(-1, 3)
+    if grid is None:
+        grid = crop_grid(size, scale)
+    if len(poses) > chunk_size:
+        # Larger batches spill the float temporaries out of cache.
+        return np.concatenate([egocentric_crops(mask, poses[i:i + chunk_size], grid=grid)
+                               for i in range(0, len(poses), chunk_size)])
+    forward, lateral = grid
+    
+    # One affine map per car: forward is (sin, -cos) of the heading and
+    # right is (cos, sin), matching Car.update.
+    angles = np.radians(poses[:, 2])[:, None, None]
+    sin = np.sin(angles)
+    cos = np.cos(angles)
+    x = poses[:, 0, None, None] + forward * sin + lateral * cos
+    y = poses[:, 1, None, None] - forward * cos + lateral * sin
+    
+    # Nearest-cell lookup into the flattened raster; anything off the
+    # screen counts as not drivable.
+    height, width = mask.shape
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    cells = y.astype(np.int32) * width + x.astype(np.int32)
+    cells[~inside] = 0
+    crops = mask.reshape(-1).take(cells)
+    crops &= inside
+    return crops
+
+def ray_segment_fractions(x, y, ray_dx, ray_dy, x1, y1, x2, y2):
+    # Elementwise over broadcastable arrays, with the parametrisation of
+    # line_intersection: where the ray from (x, y) along (ray_dx, ray_dy)
+    # crosses the segment (x1, y1)-(x2, y2), as a fraction of the ray, and
+    # inf where it misses.
+    seg_dx = x2 - x1
+    seg_dy = y2 - y1
+    rel_x = x - x1
+    rel_y = y - y1
+    denominator = seg_dy * ray_dx - seg_dx * ray_dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ua = (seg_dx * rel_y - seg_dy * rel_x) / denominator
+        ub = (ray_dx * rel_y - ray_dy * rel_x) / denominator
+    hit = (np.abs(denominator) >= 1e-10) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+    return np.where(hit, ua, np.inf)
+
+def ray_segment_hits(x, y, ray_dx, ray_dy, segments):
+    # Nearest hit along every ray from (x, y) as a fraction of the ray, 1.0
+    # where nothing is hit; segments is (M, 4) of x1, y1, x2, y2.
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    ray_dx = np.asarray(ray_dx, dtype=np.float64)[:, None]
+    ray_dy = np.asarray(ray_dy, dtype=np.float64)[:, None]
+    return ray_segment_fractions(x, y, ray_dx, ray_dy, *segments.T).min(axis=1, initial=1.0)
+
+def convex_polygons_overlap(points_a, points_b):
+    # Separating axis test; the edge normals of both polygons are the only
+    # axes that need checking.
+    points_a = np.asarray(points_a, dtype=np.float64)
+    points_b = np.asarray(points_b, dtype=np.float64)
+    for points in (points_a, points_b):
+        edges = np.roll(points, -1, axis=0) - points
+        axes = np.column_stack([-edges[:, 1], edges[:, 0]])
+        proj_a = points_a @ axes.T
+        proj_b = points_b @ axes.T
+        if np.any((proj_a.max(axis=0) < proj_b.min(axis=0)) | (proj_b.max(axis=0) < proj_a.min(axis=0))):
+            return False
+    return True
+
+def simplify_closed_polyline(points, max_error):
+    # Douglas-Peucker on a closed loop: straights collapse to their end
+    # points while curves keep as many vertices as the error bound needs.
+    # Returns the kept indices and the largest distance from a dropped
+    # vertex to the segment that replaced it.
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n < 4 or max_error <= 0:
+        return np.arange(n), 0.0
+        
+    # Split the loop at the vertex farthest from the first so both halves
+    # are open polylines.
+    far = int(np.argmax(((points - points[0]) ** 2).sum(axis=1)))
+    closed = np.vstack([points, points[:1]])
+    keep = np.zeros(n + 1, dtype=bool)
+    keep[[0, far, n]] = True
+    max_deviation = 0.0
+    
+    stack = [(0, far), (far, n)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a = closed[start]
+        ab = closed[end] - a
+        rel = closed[start + 1:end] - a
+        length_sq = float(ab @ ab)
+        if length_sq > 1e-12:
+            t = np.clip(rel @ ab / length_sq, 0.0, 1.0)
+            rel = rel - t[:, None] * ab
+        distances = np.sqrt((rel ** 2).sum(axis=1))
+        i = int(np.argmax(distances))
+        if distances[i] > max_error:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+        else:
+            max_deviation = max(max_deviation, float(distances[i]))
+            
+    return np.flatnonzero(keep[:n]), max_deviation